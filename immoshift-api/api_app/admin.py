@@ -2,18 +2,50 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib import messages
 from django import forms
-from django.http import HttpResponse
-import csv
 from datetime import datetime
-from django.shortcuts import render, redirect
-from django.urls import path
-from django.utils.text import slugify
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import path, reverse
+from django.views.decorators.http import require_POST
+from django.utils import timezone
 from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.expressions import RawSQL
+from django.contrib.admin.utils import lookup_spawns_duplicates
 from .models import (
-    Testimonial, Article, Training, Paragraph, Ebook, EbookDownload, Author, RGPDContent
+    Testimonial, Article, Training, Paragraph, Ebook, EbookDownload, Author, RGPDContent, EmailOutbox,
+    LinkedInImportJob, NotificationCursor
 )
-from .forms import LinkedInPostImportForm
-from .utils.linkedin_scraper import scrape_linkedin_post, download_image_from_url
+from .forms import LinkedInBulkImportForm, LinkedInPostImportForm
+from .utils.linkedin_import import clean_post_url, create_article, enqueue_import, job_progress
+from .utils.http_client import prune_cache
+from .utils.linkedin_scraper import scrape_linkedin_post, download_images
+from .utils import search
+from .utils.csv_export import get_export_cursor, stream_leads_csv, unique_by_email
+
+class FullTextSearchMixin:
+    """
+    Admin search through the FTS5 index (see utils/search.py) instead of
+    LIKE '%...%' scans. The fields listed in `indexed_search_fields` are
+    covered by the index, the other `search_fields` keep Django's lookup.
+    """
+    search_index_kind = None  # Match index rows of this kind...
+    search_index_parent_kind = None  # ...or the articles/trainings owning them
+    indexed_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        subquery = search.matching_ids_sql(
+            search_term, kind=self.search_index_kind, parent_kind=self.search_index_parent_kind
+        ) if search.is_available() else None
+        if subquery is None:
+            return super().get_search_results(request, queryset, search_term)
+
+        matches = Q(pk__in=RawSQL(*subquery))
+        other_fields = [f for f in self.get_search_fields(request) if f not in self.indexed_search_fields]
+        for field in other_fields:
+            matches |= Q(**{f'{field}__icontains': search_term})
+        may_have_duplicates = any(lookup_spawns_duplicates(self.opts, field) for field in other_fields)
+        return queryset.filter(matches), may_have_duplicates
 
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ('name', 'display_picture')
@@ -56,10 +88,14 @@ class ParagraphInline(admin.StackedInline):
         js = ('js/paragraph_admin.js',)
     
 
-class ArticleAdmin(admin.ModelAdmin):
+class ArticleAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'author', 'is_published', 'published_at', 'display_image')
+    list_select_related = ('author',)
+    query_budget = {'changelist_view': 7}
     list_filter = ('is_published', 'published_at', 'author')
-    search_fields = ('title', 'content', 'author__name')
+    search_fields = ('title', 'excerpt', 'author__name')
+    search_index_parent_kind = 'article'  # Also finds articles by their paragraphs
+    indexed_search_fields = ('title', 'excerpt')
     prepopulated_fields = {'slug': ('title',)}
     date_hierarchy = 'published_at'
     inlines = [ParagraphInline]
@@ -75,7 +111,13 @@ class ArticleAdmin(admin.ModelAdmin):
     def get_urls(self):
         urls = super().get_urls()
         my_urls = [
-            path('import-linkedin/', self.admin_site.admin_view(self.import_linkedin_view), name='article_import_linkedin'),
+            # Not in a request-wide transaction: the write lock isn't held while LinkedIn answers
+            path('import-linkedin/', transaction.non_atomic_requests(self.admin_site.admin_view(self.import_linkedin_view)),
+                 name='article_import_linkedin'),
+            path('import-linkedin/bulk/', self.admin_site.admin_view(require_POST(self.bulk_import_linkedin_view)),
+                 name='article_import_linkedin_bulk'),
+            path('import-linkedin/<int:job_id>/', self.admin_site.admin_view(self.import_linkedin_job_view),
+                 name='article_import_linkedin_job'),
         ]
         return my_urls + urls
     
@@ -92,11 +134,7 @@ class ArticleAdmin(admin.ModelAdmin):
         else:
             form = LinkedInPostImportForm()
         
-        return render(
-            request,
-            'admin/import_linkedin.html',
-            {'form': form, 'title': 'Importer depuis LinkedIn'}
-        )
+        return render(request, 'admin/import_linkedin.html', self.import_linkedin_context(form=form))
     
     def import_from_linkedin(self, request, queryset):
         return redirect('admin:article_import_linkedin')
@@ -104,7 +142,7 @@ class ArticleAdmin(admin.ModelAdmin):
     
     def process_linkedin_import(self, request, linkedin_url):
         # Clean the URL by removing tracking parameters
-        clean_url = linkedin_url.split('?')[0] if '?' in linkedin_url else linkedin_url
+        clean_url = clean_post_url(linkedin_url)
         
         scraped_data = scrape_linkedin_post(clean_url)
         
@@ -112,79 +150,60 @@ class ArticleAdmin(admin.ModelAdmin):
             messages.error(request, f"Erreur lors de l'importation: {scraped_data['error']}")
             return redirect('admin:article_import_linkedin')
         
+        # Both images at once, before the transaction; the avatar only for a new author
+        author_known = Author.objects.filter(name=scraped_data.get('author_name')).exists()
+        author_img, image_file = download_images([
+            None if author_known else scraped_data.get('author_image_url'), scraped_data.get('image_url')
+        ])
+        
         try:
             with transaction.atomic():
-                # Use the LinkedIn author information if available
-                author_name = scraped_data.get('author_name', 'Unknown Author')
-                if author_name == 'Unknown Author':
-                    # Fallback to ImmoShift if no author found
-                    try:
-                        author = Author.objects.get(name="ImmoShift")
-                    except Author.DoesNotExist:
-                        author = Author.objects.create(name="ImmoShift", bio="Contenu importé de LinkedIn")
-                else:
-                    # Try to find existing author by name
-                    try:
-                        author = Author.objects.get(name=author_name)
-                    except Author.DoesNotExist:
-                        # Create new author with LinkedIn data
-                        author = Author(
-                            name=author_name,
-                            bio=scraped_data.get('author_headline', f"Auteur importé depuis LinkedIn")
-                        )
-                        
-                        # Download and attach author image if available
-                        if scraped_data.get('author_image_url'):
-                            author_img = download_image_from_url(scraped_data['author_image_url'])
-                            if author_img:
-                                author.picture = author_img
-                        
-                        author.save()
-                
-                # Create slug and truncate to 50 characters
-                title_slug = slugify(scraped_data['title'])
-                if len(title_slug) > 50:
-                    title_slug = title_slug[:50].rstrip('-')
-                
-                # Create the article
-                article = Article(
-                    title=scraped_data['title'],
-                    slug=title_slug,
-                    excerpt=scraped_data['excerpt'],
-                    author=author,
-                    is_published=True,
-                    source_url=clean_url,
-                    published_at=scraped_data['published_at']
-                )
-                
-                # Download and attach image if available
-                if scraped_data.get('image_url'):
-                    image_file = download_image_from_url(scraped_data['image_url'])
-                    if image_file:
-                        article.image = image_file
-                
-                article.save()
-                
-                # Create paragraph with the full content
-                Paragraph.objects.create(
-                    article=article,
-                    position=1,
-                    title=None,  # No title for the first paragraph
-                    content=scraped_data['content'],
-                    media_type='none'  # No media in the paragraph as we already have the main image
-                )
-                
-                messages.success(request, f"Article '{article.title}' créé avec succès depuis le post LinkedIn de {author.name}.")
+                article = create_article(scraped_data, clean_url, author_img, image_file)
+                messages.success(request, f"Article '{article.title}' créé avec succès depuis le post LinkedIn de {article.author.name}.")
                 return redirect('admin:api_app_article_change', article.id)
                 
         except Exception as e:
             messages.error(request, f"Erreur lors de la création de l'article: {str(e)}")
             return redirect('admin:article_import_linkedin')
+        finally:
+            for downloaded in (author_img, image_file):
+                if downloaded:
+                    downloaded.close()
+            prune_cache()
+    
+    def bulk_import_linkedin_view(self, request):
+        form = LinkedInBulkImportForm(request.POST)
+        if not form.is_valid():
+            return render(request, 'admin/import_linkedin.html', self.import_linkedin_context(bulk_form=form))
+        job = enqueue_import(form.cleaned_data['linkedin_urls'], user=request.user)
+        messages.success(request, f"{job.items.count()} post(s) LinkedIn en attente d'importation.")
+        return redirect('admin:article_import_linkedin_job', job.pk)
+    
+    def import_linkedin_job_view(self, request, job_id):
+        job = get_object_or_404(LinkedInImportJob, pk=job_id)
+        if request.GET.get('format') == 'json':
+            return JsonResponse(job_progress(job))
+        return render(request, 'admin/import_linkedin_job.html', {
+            'title': f"Import LinkedIn #{job.pk}",
+            'job': job,
+            'progress': job_progress(job),
+            'status_url': reverse('admin:article_import_linkedin_job', args=[job.pk]) + '?format=json',
+        })
+    
+    def import_linkedin_context(self, form=None, bulk_form=None):
+        return {
+            'form': form or LinkedInPostImportForm(),
+            'bulk_form': bulk_form or LinkedInBulkImportForm(),
+            'jobs': LinkedInImportJob.objects.annotate(total=Count('items'))[:10],
+            'title': 'Importer depuis LinkedIn',
+        }
 
-class TrainingAdmin(admin.ModelAdmin):
+class TrainingAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'is_active', 'price', 'show_price', 'position', 'display_image')
     list_filter = ('is_active', 'show_price')
-    search_fields = ('title', 'short_description', 'content')
+    search_fields = ('title', 'short_description')
+    search_index_parent_kind = 'training'
+    indexed_search_fields = ('title', 'short_description')
     prepopulated_fields = {'slug': ('title',)}
     list_editable = ('position', 'is_active', 'show_price')
     inlines = [ParagraphInline]
@@ -195,10 +214,14 @@ class TrainingAdmin(admin.ModelAdmin):
         return "Aucune image"
     display_image.short_description = "Image"
 
-class ParagraphAdmin(admin.ModelAdmin):
+class ParagraphAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('__str__', 'position', 'get_media_type')
+    list_select_related = ('article', 'training')  # Used by Paragraph.__str__
+    query_budget = {'changelist_view': 6}
     list_filter = ('article', 'training', 'media_type')
     search_fields = ('title', 'content',)
+    search_index_kind = 'paragraph'
+    indexed_search_fields = ('title', 'content')
     list_editable = ('position',)
     fieldsets = (
         (None, {
@@ -237,7 +260,8 @@ class ParagraphAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 class EbookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'is_active', 'position', 'display_cover', 'download_count')
+    list_display = ('title', 'is_active', 'position', 'display_cover', 'download_total')
+    query_budget = {'changelist_view': 4}
     list_filter = ('is_active',)
     search_fields = ('title', 'description')
     prepopulated_fields = {'slug': ('title',)}
@@ -248,18 +272,15 @@ class EbookAdmin(admin.ModelAdmin):
             return format_html('<img src="{}" width="100" />', obj.cover_image.url)
         return "Aucune image"
     display_cover.short_description = "Couverture"
-    
-    def download_count(self, obj):
-        return obj.downloads.count()
-    download_count.short_description = "Téléchargements"
 
 class EbookDownloadAdmin(admin.ModelAdmin):
     list_display = ('email', 'first_name', 'last_name', 'ebook', 'download_date', 'consent_mailing')
+    query_budget = {'changelist_view': 7}
     list_filter = ('ebook', 'download_date', 'consent_mailing')
     search_fields = ('email', 'first_name', 'last_name')
     date_hierarchy = 'download_date'
     readonly_fields = ('download_date', 'ip_address')
-    actions = ['export_all_emails', 'export_consented_emails']
+    actions = ['export_all_emails', 'export_consented_emails', 'export_unique_emails', 'export_new_emails']
     
     def export_all_emails(self, request, queryset):
         return self.export_emails(request, queryset, include_only_consented=False)
@@ -269,32 +290,43 @@ class EbookDownloadAdmin(admin.ModelAdmin):
         return self.export_emails(request, queryset, include_only_consented=True)
     export_consented_emails.short_description = "Exporter les emails avec consentement sélectionnés"
     
-    def export_emails(self, request, queryset, include_only_consented=False):
+    def export_unique_emails(self, request, queryset):
+        return self.export_emails(request, queryset, unique=True)
+    export_unique_emails.short_description = "Exporter les emails sélectionnés sans doublons (dernier téléchargement)"
+    
+    def export_new_emails(self, request, queryset):
+        """
+        Emails downloaded since this admin's last 'new emails' export, on every
+        ebook: the selection and the filters are ignored, the cursor would skip
+        the rows left out of them
+        """
+        cursor = get_export_cursor(request.user)
+        queryset = EbookDownload.objects.filter(id__gt=cursor.last_id)
+        last_id = queryset.aggregate(last_id=Max('id'))['last_id']
+        if last_id is None:
+            messages.info(request, 'Aucun nouvel email depuis votre dernier export.')
+            return None
+        
+        def move_cursor():
+            NotificationCursor.objects.filter(pk=cursor.pk, last_id__lt=last_id).update(
+                last_id=last_id, last_run_at=timezone.now()
+            )
+        # Rows downloaded during the export are left for the next one
+        return self.export_emails(request, queryset.filter(id__lte=last_id), unique=True,
+                                  status='new', on_complete=move_cursor)
+    export_new_emails.short_description = "Exporter tous les nouveaux emails depuis mon dernier export (hors sélection)"
+    
+    def export_emails(self, request, queryset, include_only_consented=False, unique=False, status=None,
+                      on_complete=None):
         if include_only_consented:
             queryset = queryset.filter(consent_mailing=True)
-            
-        response = HttpResponse(content_type='text/csv')
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        consent_status = 'consented' if include_only_consented else 'all'
-        response['Content-Disposition'] = f'attachment; filename="email_list_{consent_status}_{timestamp}.csv"'
-        
-        writer = csv.writer(response)
-        # CSV Header
-        writer.writerow(['Email', 'Prénom', 'Nom', 'Consentement', 'Date'])
+        if unique:
+            queryset = unique_by_email(queryset)
         
-        # CSV data
-        for obj in queryset:
-            writer.writerow([
-                obj.email,
-                obj.first_name,
-                obj.last_name,
-                'Oui' if obj.consent_mailing else 'Non',
-                obj.download_date.strftime('%Y-%m-%d %H:%M')
-            ])
-        
-        count = queryset.count()
-        messages.success(request, f'{count} email(s) exporté(s) avec succès.')
-        return response
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        consent_status = status or ('consented' if include_only_consented else 'unique' if unique else 'all')
+        messages.success(request, 'Export des emails généré.')
+        return stream_leads_csv(queryset, f'email_list_{consent_status}_{timestamp}.csv', on_complete)
 
 
 class RGPDContentAdmin(admin.ModelAdmin):
@@ -329,6 +361,30 @@ class RGPDContentAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'kind', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('subject',)
+    date_hierarchy = 'created_at'
+    actions = ['retry_emails']
+
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+    recipients.short_description = "Destinataires"
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_emails(self, request, queryset):
+        count = queryset.exclude(status=EmailOutbox.STATUS_SENT).update(
+            status=EmailOutbox.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        messages.success(request, f'{count} email(s) remis en file d\'envoi.')
+    retry_emails.short_description = "Renvoyer les emails sélectionnés"
+
 # Register all models with their admin classes
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Testimonial, TestimonialAdmin)
@@ -338,3 +394,4 @@ admin.site.register(Paragraph, ParagraphAdmin)
 admin.site.register(Ebook, EbookAdmin)
 admin.site.register(EbookDownload, EbookDownloadAdmin)
 admin.site.register(RGPDContent, RGPDContentAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
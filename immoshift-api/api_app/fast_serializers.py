@@ -0,0 +1,270 @@
+"""
+Fast read-only serialization for the public endpoints.
+
+A DRF ModelSerializer is compiled once into a plan of per-field extractors
+that work on `values()` rows, so no model instance, bound field or
+serializer is built per object. The output is the same Python data (and
+therefore the same JSON bytes) as the DRF serializer, which the parity tests
+in tests.py pin down. Enabled with the FAST_SERIALIZATION setting. Serializers
+with fields the compiler does not understand fall back to DRF.
+"""
+import re
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .serializers import SrcsetField
+
+# Fields whose to_representation() returns the database value unchanged
+IDENTITY_FIELDS = {
+    serializers.CharField, serializers.SlugField, serializers.URLField, serializers.EmailField,
+    serializers.IntegerField, serializers.BooleanField,
+}
+
+# Marker for keys DRF leaves out (dotted source through a null relation)
+SKIP = object()
+
+# File names that filepath_to_uri() would return unchanged
+URI_SAFE_NAME = re.compile(r"[A-Za-z0-9_.\-~/!*()']+")
+
+class UnsupportedSerializer(Exception):
+    """The serializer has a field the fast path can't reproduce exactly"""
+
+def field_signature(serializer):
+    """Hashable description of the (possibly sparse) fields of a serializer"""
+    signature = []
+    for name, field in serializer.fields.items():
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer):
+            signature.append((name, field_signature(nested)))
+        else:
+            signature.append(name)
+    return (type(serializer), tuple(signature))
+
+class CompiledSerializer:
+    """Field-to-extractor plan for one serializer, built by `compile_serializer`"""
+
+    def __init__(self, serializer, prefix=''):
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.paths = [f'{prefix}pk']
+        self.plan = []
+        self.nested_many = []
+        self.file_prefixes = []
+        for name, field in serializer.fields.items():
+            self.plan.append((name, self._compile_field(field)))
+
+    def _add_path(self, path):
+        path = self.prefix + path
+        if path not in self.paths:
+            self.paths.append(path)
+        return path
+
+    def _compile_field(self, field):
+        source = field.source
+        if source == '*' or isinstance(field, serializers.SerializerMethodField):
+            raise UnsupportedSerializer(field)
+        parts = source.split('.')
+        try:
+            model_field = self.model._meta.get_field(parts[0])
+        except FieldDoesNotExist:
+            raise UnsupportedSerializer(field)
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if model_field.one_to_many and isinstance(field, serializers.ListSerializer):
+            child = CompiledSerializer(nested)
+            fk_path = model_field.field.attname
+            key = self._add_path('pk')
+            self.nested_many.append((model_field, child, fk_path, key))
+            return lambda row, ctx: ctx['children'][model_field][row[key]]
+
+        if model_field.many_to_one or model_field.one_to_one:
+            null_path = self._add_path(parts[0])
+            if isinstance(nested, serializers.BaseSerializer) and len(parts) == 1:
+                child = CompiledSerializer(nested, prefix=f'{self.prefix}{parts[0]}__')
+                if child.nested_many:
+                    raise UnsupportedSerializer(field)
+                self.paths.extend(p for p in child.paths if p not in self.paths)
+                self.file_prefixes.extend(child.file_prefixes)
+                return lambda row, ctx: None if row[null_path] is None else child.build(row, ctx)
+            if len(parts) != 2:
+                raise UnsupportedSerializer(field)
+            related_field = model_field.related_model._meta.get_field(parts[1])
+            extract = self._compile_value(field, related_field, self._add_path('__'.join(parts)))
+            # DRF skips the key when the relation itself is null
+            return lambda row, ctx: SKIP if row[null_path] is None else extract(row, ctx)
+
+        if len(parts) != 1 or not model_field.concrete:
+            raise UnsupportedSerializer(field)
+        return self._compile_value(field, model_field, self._add_path(parts[0]))
+
+    def _compile_value(self, field, model_field, path):
+        if isinstance(field, SrcsetField):
+            return self._compile_srcset(path)
+        if isinstance(field, serializers.FileField):
+            return self._compile_file(field, model_field, path)
+        if type(field) in IDENTITY_FIELDS:
+            return lambda row, ctx: row[path]
+        if isinstance(field, serializers.DateTimeField):
+            return self._compile_datetime(field, path)
+        if isinstance(field, serializers.FloatField):
+            convert = float
+        elif isinstance(field, serializers.StringRelatedField):
+            convert = str
+        elif isinstance(field, serializers.ModelField) or isinstance(field, serializers.BaseSerializer):
+            raise UnsupportedSerializer(field)
+        else:
+            convert = field.to_representation
+
+        def extract(row, ctx):
+            value = row[path]
+            return None if value is None else convert(value)
+        return extract
+
+    def _compile_datetime(self, field, path):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, 'timezone'):
+            convert = field.to_representation
+            return lambda row, ctx: None if row[path] is None else convert(row[path])
+
+        # DateTimeField.to_representation() without its per-value timezone lookup
+        def extract(row, ctx):
+            value = row[path]
+            if not value:
+                return None
+            tz = ctx['timezone']
+            if tz is None or value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return extract
+
+    def _compile_file(self, field, model_field, path):
+        if not getattr(field, 'use_url', True):
+            return lambda row, ctx: row[path] or None
+        url = self._compile_url(model_field.storage)
+        return lambda row, ctx: url(row[path], ctx) if row[path] else None
+
+    def _compile_url(self, storage):
+        """Returns url(name, ctx), the absolute URL DRF would give to a stored file"""
+        if not isinstance(storage, FileSystemStorage):
+            def url(name, ctx):
+                request = ctx['request']
+                return request.build_absolute_uri(storage.url(name)) if request is not None else storage.url(name)
+            return url
+
+        # storage.url() is urljoin(base_url, quoted name), which is a plain
+        # concatenation for ordinary names; odd ones go through storage.url()
+        base_url = storage.base_url
+        if base_url not in self.file_prefixes:
+            self.file_prefixes.append(base_url)
+
+        def url(name, ctx):
+            if ':' in name or '..' in name:
+                request = ctx['request']
+                return request.build_absolute_uri(storage.url(name)) if request is not None else storage.url(name)
+            if URI_SAFE_NAME.fullmatch(name) is None:
+                name = filepath_to_uri(name)
+            return ctx['file_prefixes'][base_url] + name.lstrip('/')
+        return url
+
+    def _compile_srcset(self, path):
+        url = self._compile_url(default_storage)
+
+        # SrcsetField.to_representation() with the fast URLs
+        def extract(row, ctx):
+            value = row[path]
+            if not value or not value.get('formats'):
+                return None
+            data = {'width': value['width'], 'height': value['height']}
+            for fmt, variants in value['formats'].items():
+                data[fmt] = ', '.join(f'{url(name, ctx)} {width}w' for width, name in variants)
+            return data
+        return extract
+
+    def build(self, row, ctx):
+        item = {}
+        for key, extract in self.plan:
+            value = extract(row, ctx)
+            if value is not SKIP:
+                item[key] = value
+        return item
+
+    def values_queryset(self, queryset, extra_fields=()):
+        """`queryset` as values() rows carrying every path the plan reads"""
+        paths = self.paths + [f for f in extra_fields if f not in self.paths]
+        return queryset.prefetch_related(None).values(*paths)
+
+    def serialize_rows(self, rows, request=None):
+        """Serializes rows from `values_queryset`, like `serializer(..., many=True).data`"""
+        rows = list(rows)
+        ctx = {
+            'request': request,
+            'children': {},
+            'file_prefixes': {},
+            'timezone': timezone.get_current_timezone() if settings.USE_TZ else None,
+        }
+        self._prepare(ctx, rows)
+        return [self.build(row, ctx) for row in rows]
+
+    def _prepare(self, ctx, rows):
+        request = ctx['request']
+        for base_url in self.file_prefixes:
+            if base_url not in ctx['file_prefixes']:
+                ctx['file_prefixes'][base_url] = request.build_absolute_uri(base_url) if request is not None else base_url
+
+        for model_field, child, fk_path, key in self.nested_many:
+            children = defaultdict(list)
+            parent_pks = {row[key] for row in rows}
+            if parent_pks:
+                related = model_field.related_model._default_manager.filter(**{f'{fk_path}__in': parent_pks})
+                child_rows = list(related.values(*dict.fromkeys([fk_path, *child.paths])))
+                child._prepare(ctx, child_rows)
+                for child_row in child_rows:
+                    children[child_row[fk_path]].append(child.build(child_row, ctx))
+            ctx['children'][model_field] = children
+
+_compiled = {}
+
+def compile_serializer(serializer):
+    """
+    Returns the cached CompiledSerializer for a DRF serializer instance.
+
+    Raises:
+        UnsupportedSerializer: if a field can't be compiled exactly
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    signature = field_signature(serializer)
+    if signature not in _compiled:
+        try:
+            _compiled[signature] = CompiledSerializer(serializer)
+        except UnsupportedSerializer:
+            _compiled[signature] = None
+    if _compiled[signature] is None:
+        raise UnsupportedSerializer(serializer)
+    return _compiled[signature]
+
+def get_fast_serializer(serializer):
+    """
+    Returns the compiled plan for `serializer`, or None to use DRF.
+    
+    Only serializers with `fast_serialization = True` in their Meta opt in,
+    and only while the FAST_SERIALIZATION setting is on.
+    """
+    if not getattr(settings, 'FAST_SERIALIZATION', False):
+        return None
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not getattr(serializer.Meta, 'fast_serialization', False):
+        return None
+    try:
+        return compile_serializer(serializer)
+    except UnsupportedSerializer:
+        return None
@@ -17,3 +17,28 @@ class LinkedInPostImportForm(forms.Form):
         if not is_linkedin_post_url(url):
             raise ValidationError("L'URL doit être celle d'un post LinkedIn (https://www.linkedin.com/posts/...).")
         return url
+
+class LinkedInBulkImportForm(forms.Form):
+    linkedin_urls = forms.CharField(
+        label="URLs des posts LinkedIn",
+        widget=forms.Textarea(attrs={'rows': 10, 'cols': 100}),
+        help_text="Une URL de post LinkedIn par ligne. Les posts déjà importés sont ignorés.",
+    )
+
+    def clean_linkedin_urls(self):
+        urls = [line.strip() for line in self.cleaned_data['linkedin_urls'].splitlines() if line.strip()]
+        validate = URLValidator()
+        invalid = []
+        for url in urls:
+            try:
+                validate(url)
+            except ValidationError:
+                invalid.append(url)
+                continue
+            if not is_linkedin_post_url(url):
+                invalid.append(url)
+        if invalid:
+            raise ValidationError(f"Ces lignes ne sont pas des URLs de posts LinkedIn : {', '.join(invalid[:5])}")
+        if not urls:
+            raise ValidationError("Collez au moins une URL.")
+        return urls
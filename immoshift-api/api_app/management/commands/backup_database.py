@@ -1,61 +1,81 @@
 import os
-import time
-import shutil
+import json
 import datetime
 from pathlib import Path
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connection
+from api_app.utils.backup import COMPRESSIONS, backup_database
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Backup SQLite database'
+    help = 'Backup SQLite database (online, with the SQLite backup API)'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--compress', choices=list(COMPRESSIONS), default=settings.SQLITE_BACKUP_COMPRESSION,
+                            help='Compression of the backup file')
+        parser.add_argument('--pages', type=int, default=settings.SQLITE_BACKUP_PAGES,
+                            help='Pages copied per step')
+        parser.add_argument('--pause', type=float, default=settings.SQLITE_BACKUP_PAUSE_MS,
+                            help='Milliseconds between two steps, for the live writes to go through')
+
+    def handle(self, *args, **options):
         try:
-            # Get database file path from settings
-            db_path = settings.DATABASES['default']['NAME']
-            
+            # Get database file path from the connection (the test database under tests)
+            db_path = connection.settings_dict['NAME']
+
             # Ensure the source file exists
-            if not os.path.exists(db_path):
+            if not connection.is_in_memory_db() and not os.path.exists(db_path):
                 self.stdout.write(self.style.ERROR(f"Database file not found at {db_path}"))
                 return
-                
+
             # Format timestamp
             timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            db_filename = os.path.basename(db_path)
+            db_filename = os.path.basename(settings.DB_FILE_PATH if connection.is_in_memory_db() else db_path)
             backup_name = f"{db_filename}_{timestamp}.bak"
             backup_path = os.path.join(settings.SQLITE_BACKUP_DIR, backup_name)
-            
-            # Wait for any potential database transactions to complete
-            time.sleep(1)
-            
-            # Create a copy of the database
-            shutil.copy2(db_path, backup_path)
-            
-            self.stdout.write(self.style.SUCCESS(f"Successfully backed up database to {backup_path}"))
-            
+
+            result = backup_database(
+                str(db_path), backup_path, compression=options['compress'],
+                pages=options['pages'], pause=options['pause'] / 1000,
+            )
+            # Next to the backup, for restores to verify what they decompress
+            with open(f"{result['path']}.json", 'w') as f:
+                json.dump({**result, 'path': os.path.basename(result['path']), 'created_at': timestamp}, f, indent=2)
+
+            logger.info(f"Database backup: {result}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Successfully backed up database to {result['path']} "
+                f"({result['size'] / 1024:.0f} KB, {result['compressed_size'] / 1024:.0f} KB stored, "
+                f"{result['duration']:.2f}s, sha256 {result['sha256']})"
+            ))
+
             # Delete old backups
             self.cleanup_old_backups()
-            
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Backup failed: {str(e)}"))
             logger.error(f"Database backup failed: {str(e)}")
-    
+            # Non-zero exit status for cron
+            raise CommandError(f"Backup failed: {e}")
+
     def cleanup_old_backups(self):
         """Remove backups older than BACKUP_RETENTION_DAYS"""
         retention_days = settings.BACKUP_RETENTION_DAYS
         cutoff_date = datetime.datetime.now() - datetime.timedelta(days=retention_days)
-        
+
         backup_dir = Path(settings.SQLITE_BACKUP_DIR)
         count = 0
-        
-        for backup_file in backup_dir.glob('*.bak'):
+
+        # .bak, .bak.gz, .bak.zst and their .json manifest
+        for backup_file in backup_dir.glob('*.bak*'):
             file_modified = datetime.datetime.fromtimestamp(os.path.getmtime(backup_file))
             if file_modified < cutoff_date:
                 os.remove(backup_file)
-                count += 1
-        
+                if not backup_file.name.endswith('.json'):
+                    count += 1
+
         if count > 0:
-            self.stdout.write(self.style.SUCCESS(f"Removed {count} old backup(s)"))
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS(f"Removed {count} old backup(s)"))
@@ -0,0 +1,79 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api_app.utils.backup import BackupError
+from api_app.utils.replication import parse_time
+from api_app.utils.snapshots import create_snapshot, get_store, restore_snapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Deduplicated, incremental backup of the database and the media files (content-addressed store)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.BACKUP_WORKERS, help='Hashing threads')
+        parser.add_argument('--full', action='store_true',
+                            help='Read every media file, even those unchanged by size and modification time')
+        parser.add_argument('--list', action='store_true', help='List the snapshots')
+        parser.add_argument('--restore', default='', metavar='SNAPSHOT', help='Restore this snapshot (see --list)')
+        parser.add_argument('--output', default='',
+                            help='Directory to restore to (default: restore-<snapshot> in the backup directory)')
+
+    def handle(self, *args, **options):
+        store = get_store()
+        if options['list']:
+            return self.list_snapshots(store)
+        if options['restore']:
+            return self.restore(store, options)
+
+        try:
+            manifest = create_snapshot(
+                connection.settings_dict['NAME'], settings.MEDIA_ROOT, store, workers=options['workers'],
+                full=options['full'], pages=settings.SQLITE_BACKUP_PAGES, pause=settings.SQLITE_BACKUP_PAUSE_MS / 1000,
+            )
+            pruned = store.prune(settings.BACKUP_RETENTION_DAYS)
+        except (BackupError, OSError) as e:
+            logger.error(f"Snapshot failed: {e}")
+            raise CommandError(f"Snapshot failed: {e}")
+
+        stats = manifest['stats']
+        logger.info(f"Backup snapshot {manifest['name']}: {stats}, pruned {pruned}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {manifest['name']}: {stats['files']} media file(s), {stats['hashed_files']} read, "
+            f"{stats['size'] / 1024 / 1024:.1f} MB saved with {stats['written'] / 1024 / 1024:.1f} MB written "
+            f"in {stats['duration']:.2f}s"
+        ))
+        if pruned['manifests']:
+            self.stdout.write(
+                f"Removed {len(pruned['manifests'])} old snapshot(s), {pruned['chunks']} chunk(s), "
+                f"{pruned['bytes'] / 1024 / 1024:.1f} MB"
+            )
+
+    def list_snapshots(self, store):
+        for name in store.manifest_names():
+            stats = store.read_manifest(name)['stats']
+            self.stdout.write(
+                f"{name} ({timezone.localtime(parse_time(name)):%Y-%m-%d %H:%M:%S}): {stats['files']} media file(s), "
+                f"{stats['size'] / 1024 / 1024:.1f} MB, {stats['written'] / 1024 / 1024:.1f} MB written"
+            )
+
+    def restore(self, store, options):
+        output = options['output'] or os.path.join(settings.SQLITE_BACKUP_DIR, f"restore-{options['restore']}")
+        if os.path.exists(output) and os.listdir(output):
+            raise CommandError(f"{output} is not empty")
+        os.makedirs(output, exist_ok=True)
+        db_path = os.path.join(output, os.path.basename(settings.DB_FILE_PATH))
+        try:
+            manifest = restore_snapshot(options['restore'], db_path, os.path.join(output, 'media'), store=store)
+        except BackupError as e:
+            raise CommandError(f"Restore failed: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored snapshot {manifest['name']} to {output} ({len(manifest['media'])} media file(s))"
+        ))
+        self.stdout.write(
+            f"Stop the application and move {db_path} over {settings.DB_FILE_PATH}, "
+            f"{os.path.join(output, 'media')} over {settings.MEDIA_ROOT} to put it live"
+        )
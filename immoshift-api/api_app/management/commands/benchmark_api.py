@@ -0,0 +1,229 @@
+import json
+import time
+import resource
+import datetime
+import subprocess
+from urllib.parse import urlencode
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from api_app import urls as api_urls
+from django.db.models import Max, Q
+from api_app.models import Article, Training, Ebook, EbookDownload, EmailOutbox
+from api_app.utils.download_stats import rebuild_download_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Address of the --include-writes downloads, removed at the end with their emails
+BENCH_EMAIL = 'bench@api-bench.invalid'
+
+# Sample objects for the routes taking a slug, by URL name
+SLUG_SAMPLES = {
+    'article_detail': lambda: Article.objects.filter(is_published=True).order_by('-published_at').first(),
+    'training_detail': lambda: Training.objects.filter(is_active=True).first(),
+    'ebook_detail': lambda: Ebook.objects.filter(is_active=True).first(),
+}
+
+def search_samples():
+    """A whole word of the newest article title and its prefix, or None"""
+    article = Article.objects.filter(is_published=True).order_by('-published_at').first()
+    words = [word for word in (article.title if article else '').split() if len(word) >= 4 and word.isalpha()]
+    return [{'q': words[0]}, {'q': words[0][:3]}] if words else None
+
+# Query strings for the routes that need them, by URL name
+QUERY_SAMPLES = {
+    'search_content': search_samples,
+    'download_time_series': lambda: [
+        {},
+        {'granularity': 'month', 'start': (timezone.localdate() - datetime.timedelta(days=365)).isoformat()},
+    ],
+}
+
+def is_admin_only(pattern):
+    return IsAdminUser in getattr(getattr(pattern.callback, 'cls', None), 'permission_classes', ())
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def peak_rss_kb():
+    """Peak resident set size of this process (ru_maxrss is in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class Command(BaseCommand):
+    help = 'Benchmark every api_app URL through the Django test client and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--output', default='', help='JSON file to write (default: print to stdout)')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--include-writes', action='store_true',
+                            help='Also POST to download-ebook (the downloads and their queued emails are deleted '
+                                 'at the end, the lead counters rebuilt)')
+        parser.add_argument('--admin-user', default='',
+                            help='Staff username for the admin-only routes (default: the first active superuser)')
+
+    def handle(self, *args, **options):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+        self.client = Client(HTTP_HOST=host)
+        self.admin_client = self.get_admin_client(host, options['admin_user'])
+        requests = self.collect_requests(options['include_writes'])
+        last_email_id = EmailOutbox.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+        results = []
+        try:
+            for name, method, url, data, client in requests:
+                result = self.measure(client, method, url, data, options)
+                result.update(name=name, authenticated=client is self.admin_client)
+                results.append(result)
+                self.stdout.write(
+                    f"{method:4} {url:60} {result['status']}  p50={result['p50_ms']:.2f}ms "
+                    f"p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms queries={result['queries']}"
+                )
+        finally:
+            if options['include_writes']:
+                self.cleanup(last_email_id)
+
+        report = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'git_commit': self.get_git_commit(),
+            'iterations': options['iterations'],
+            'cold_cache': options['cold_cache'],
+            'fast_serialization': getattr(settings, 'FAST_SERIALIZATION', False),
+            'peak_rss_kb': peak_rss_kb(),
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Benchmark results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def get_admin_client(self, host, username):
+        """Client logged in as `username` (or the first active superuser), None without one"""
+        users = get_user_model().objects.filter(is_active=True, is_staff=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            if username:
+                raise CommandError(f"No active staff user {username}")
+            return None
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+        return client
+
+    def collect_requests(self, include_writes):
+        """Builds (name, method, url, data, client) for every pattern in api_app/urls.py"""
+        requests = []
+        for pattern in self.iter_patterns(api_urls.urlpatterns):
+            name = pattern.name
+            if not name or 'format' in pattern.pattern.regex.groupindex:
+                continue  # Unnamed or ".json" format-suffix duplicates
+            kwargs = self.sample_kwargs(pattern)
+            queries = QUERY_SAMPLES[name]() if name in QUERY_SAMPLES else [{}]
+            if kwargs is None or queries is None:
+                logger.warning(f"No sample data for {name}, skipped")
+                continue
+            client = self.client
+            if is_admin_only(pattern):
+                if self.admin_client is None:
+                    logger.warning(f"No staff user to request {name} with, skipped (see --admin-user)")
+                    continue
+                client = self.admin_client
+            if name == 'download_ebook':
+                if include_writes:
+                    ebook = Ebook.objects.filter(is_active=True).first()
+                    if ebook:
+                        data = {'ebook': ebook.pk, 'first_name': 'Bench', 'last_name': 'Mark',
+                                'email': BENCH_EMAIL, 'consent_mailing': False}
+                        requests.append((name, 'POST', reverse(name), data, client))
+                continue
+            for url_kwargs in kwargs:
+                for query in queries:
+                    url = reverse(name, kwargs=url_kwargs) + (f"?{urlencode(query)}" if query else '')
+                    if (name, url) not in [(r[0], r[2]) for r in requests]:
+                        requests.append((name, 'GET', url, None, client))
+        return requests
+
+    def iter_patterns(self, patterns):
+        for entry in patterns:
+            if isinstance(entry, URLResolver):
+                yield from self.iter_patterns(entry.url_patterns)
+            elif isinstance(entry, URLPattern):
+                yield entry
+
+    def cleanup(self, last_email_id):
+        """Removes the benchmark downloads and the emails they queued, before send_outbox sends them"""
+        deleted = EbookDownload.objects.filter(email=BENCH_EMAIL)._raw_delete('default')
+        # The user's copy and the admin notification (which names the address)
+        emails, _ = EmailOutbox.objects.filter(id__gt=last_email_id).filter(
+            Q(to__icontains=BENCH_EMAIL) | Q(body__contains=BENCH_EMAIL)
+        ).delete()
+        # The raw delete skipped the counter signals, and the leads stay otherwise
+        rebuild_download_stats()
+        self.stdout.write(f"Removed {deleted} benchmark downloads and {emails} queued emails")
+
+    def sample_kwargs(self, pattern):
+        """Returns a list of kwargs dicts to reverse the pattern with, or None"""
+        params = set(pattern.pattern.regex.groupindex)
+        if not params:
+            return [{}]
+        if params == {'pk'}:
+            obj = pattern.callback.cls.queryset.first()
+            return [{'pk': obj.pk}] if obj else None
+        if params == {'slug'}:
+            obj = SLUG_SAMPLES[pattern.name]()
+            return [{'slug': obj.slug}] if obj else None
+        if params == {'section'}:
+            return [{'section': section} for section in api_urls.sitemaps]
+        return None
+
+    def measure(self, client, method, url, data, options):
+        latencies = []
+        queries = None
+        response = None
+        for i in range(options['warmup'] + options['iterations']):
+            if options['cold_cache']:
+                cache.clear()
+            start = time.perf_counter()
+            if method == 'POST':
+                response = client.post(url, data, secure=True)
+            else:
+                response = client.get(url, secure=True)
+            elapsed = (time.perf_counter() - start) * 1000
+            if i >= options['warmup']:
+                latencies.append(elapsed)
+                queries = int(response.get('X-DB-Queries', 0))
+
+        latencies.sort()
+        return {
+            'method': method,
+            'url': url,
+            'status': response.status_code,
+            'bytes': len(response.content) if not response.streaming else None,
+            'queries': queries,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+            'peak_rss_kb': peak_rss_kb(),
+        }
+
+    def get_git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -0,0 +1,105 @@
+import datetime
+import glob
+import json
+import os
+import time
+from bs4 import FeatureNotFound
+from django.core.management.base import BaseCommand, CommandError
+from api_app.utils.linkedin_scraper import extract_post
+from .benchmark_api import percentile
+import logging
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'fixtures', 'linkedin')
+SOURCE_URL = 'https://www.linkedin.com/posts/benchmark'
+
+def field_differences(result, reference):
+    """Fields of `result` differing from `reference` (published_at falls back to now(), to the second)"""
+    differences = []
+    for name, value in reference.items():
+        other = result.get(name)
+        if name == 'published_at' and isinstance(value, datetime.datetime) and isinstance(other, datetime.datetime):
+            if value.tzinfo is None and other.tzinfo is None and abs(value - other) < datetime.timedelta(seconds=1):
+                continue
+        if other != value:
+            differences.append(name)
+    return differences
+
+class Command(BaseCommand):
+    help = 'Benchmark the extraction of LinkedIn posts from saved pages, offline, and check the fields match'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='HTML files or directories of them (default: api_app/fixtures/linkedin)')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--parsers', default='html.parser,lxml',
+                            help='BeautifulSoup parsers to compare, comma separated (missing ones are skipped)')
+        parser.add_argument('--output', default='', help='JSON file to write (default: print to stdout)')
+
+    def handle(self, *args, **options):
+        pages = self.collect_pages(options['paths'] or [FIXTURES_DIR])
+        if not pages:
+            raise CommandError("No HTML page to extract")
+
+        results = []
+        for path in pages:
+            with open(path, encoding='utf-8') as f:
+                html = f.read()
+            # The whole tree with the standard library parser, what the scraper used to build
+            reference = extract_post(html, SOURCE_URL, parser='html.parser', strained=False)
+            baseline = None
+            for parser in options['parsers'].split(','):
+                for strained in (False, True):
+                    try:
+                        result = self.measure(html, parser, strained, reference, options['iterations'])
+                    except FeatureNotFound:
+                        logger.warning(f"Parser {parser} isn't installed, skipped")
+                        break
+                    baseline = baseline or result['p50_ms']
+                    result.update(page=os.path.basename(path), speedup=round(baseline / result['p50_ms'], 2))
+                    results.append(result)
+                    self.stdout.write(
+                        f"{result['page']:30} {parser:12} {'strained' if strained else 'full tree':10} "
+                        f"p50={result['p50_ms']:.2f}ms x{result['speedup']:.2f} "
+                        f"{'parity' if not result['differences'] else 'DIFFERS: ' + ', '.join(result['differences'])}"
+                    )
+
+        report = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Benchmark results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+        if any(result['differences'] for result in results):
+            raise CommandError("Some extractions differ from the full html.parser tree")
+
+    def collect_pages(self, paths):
+        pages = []
+        for path in paths:
+            if os.path.isdir(path):
+                pages.extend(sorted(glob.glob(os.path.join(path, '*.html'))))
+            else:
+                pages.append(path)
+        return pages
+
+    def measure(self, html, parser, strained, reference, iterations):
+        result = extract_post(html, SOURCE_URL, parser=parser, strained=strained)
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            extract_post(html, SOURCE_URL, parser=parser, strained=strained)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        return {
+            'parser': parser,
+            'strained': strained,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'differences': field_differences(result, reference),
+        }
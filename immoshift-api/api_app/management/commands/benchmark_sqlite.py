@@ -0,0 +1,157 @@
+import json
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from api_app.models import Article, Ebook, EbookDownload
+from api_app.utils.download_stats import rebuild_download_stats
+from api_app.utils.transactions import write_transaction
+from .benchmark_api import percentile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows written by the benchmark, removed at the end
+BENCH_EMAIL_DOMAIN = 'sqlite-bench.invalid'
+
+def configure_connection(journal_mode):
+    """Makes this process' next connections use `journal_mode` instead of the configured one"""
+    pragmas = {**settings.SQLITE_PRAGMAS, 'journal_mode': journal_mode}
+    options = connections['default'].settings_dict['OPTIONS']
+    options['init_command'] = ";".join(f"PRAGMA {name}={value}" for name, value in pragmas.items())
+
+def read_once():
+    """What a list + detail GET costs when the content cache is cold"""
+    articles = list(Article.objects.filter(is_published=True).select_related('author')[:20])
+    if articles:
+        list(articles[0].paragraphs.all())
+    Ebook.objects.filter(is_active=True).count()
+
+def write_once(ebook_id, number):
+    """An ebook download: the ebook lookup, the row and the counters maintained by its signals"""
+    ebook = Ebook.objects.get(pk=ebook_id, is_active=True)
+    EbookDownload.objects.create(
+        ebook=ebook, first_name="Bench", last_name="Bench", email=f"{number}@{BENCH_EMAIL_DOMAIN}",
+        consent_mailing=number % 2 == 0,
+    )
+
+def run_worker(role, index, journal_mode, duration, ebook_id, atomic_reads):
+    """
+    Runs `role` operations for `duration` seconds. Writes get their own transaction,
+    reads too with `atomic_reads` (ATOMIC_REQUESTS on every view, as DEFERRED transactions),
+    or else run in autocommit while writes begin IMMEDIATE, like atomic_writes views.
+    """
+    connections.close_all()  # Forked: get our own connection
+    configure_connection(journal_mode)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    number = index * 10_000_000
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if role == 'reader':
+                with transaction.atomic() if atomic_reads else nullcontext():
+                    read_once()
+            else:
+                number += 1
+                # Transactions on every request used to be DEFERRED, see api_app/utils/transactions.py
+                with transaction.atomic() if atomic_reads else write_transaction():
+                    write_once(ebook_id, number)
+        except OperationalError:
+            errors += 1  # database is locked after busy_timeout
+            continue
+        latencies.append(time.perf_counter() - start)
+    connections.close_all()
+    return role, latencies, errors
+
+class Command(BaseCommand):
+    help = 'Measure SQLite reader/writer throughput under concurrency for each journal mode (dev/staging databases)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reader processes')
+        parser.add_argument('--writers', type=int, default=1, help='Writer processes')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per journal mode')
+        parser.add_argument('--modes', default='delete,wal', help='Journal modes to compare, comma separated')
+        parser.add_argument('--reads', default='atomic,autocommit',
+                            help='How readers run, comma separated: atomic (a transaction per request) and/or autocommit')
+        parser.add_argument('--output', default='', help='JSON file to write (default: print to stdout)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark only applies to the SQLite backend")
+        ebook_id = Ebook.objects.values_list('id', flat=True).first()
+        if ebook_id is None:
+            raise CommandError("No ebook to write downloads for, run seed_content first")
+
+        results = {'connect_ms': self.measure_connect(), 'modes': []}
+        self.stdout.write(f"New connection + pragmas: {results['connect_ms']:.2f}ms (saved by CONN_MAX_AGE)")
+        try:
+            runs = [
+                (mode.strip().lower(), reads.strip() == 'atomic')
+                for mode in options['modes'].split(',') for reads in options['reads'].split(',')
+            ]
+            for mode, atomic_reads in runs:
+                result = self.run_mode(mode, atomic_reads, ebook_id, options)
+                results['modes'].append(result)
+                self.stdout.write(
+                    f"{result['journal_mode']:7} {result['reads']:10} readers {result['reader_ops_s']:8.1f} ops/s "
+                    f"p95={result['reader_p95_ms']:.2f}ms | writers {result['writer_ops_s']:7.1f} ops/s "
+                    f"p95={result['writer_p95_ms']:.2f}ms | locked errors {result['errors']}"
+                )
+        finally:
+            self.cleanup()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def measure_connect(self, count=50):
+        """Average cost of opening a connection with the configured pragmas"""
+        params = connection.get_connection_params()
+        start = time.perf_counter()
+        for _ in range(count):
+            conn = connection.get_new_connection(params)
+            conn.execute("SELECT 1 FROM django_migrations LIMIT 1")
+            conn.close()
+        return (time.perf_counter() - start) / count * 1000
+
+    def run_mode(self, journal_mode, atomic_reads, ebook_id, options):
+        # Switching out of/into WAL needs the database for ourselves
+        connections.close_all()
+        configure_connection(journal_mode)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connections.close_all()
+
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        with ProcessPoolExecutor(max_workers=len(roles)) as executor:
+            futures = [
+                executor.submit(run_worker, role, index, journal_mode, options['duration'], ebook_id, atomic_reads)
+                for index, role in enumerate(roles)
+            ]
+            outcomes = [future.result() for future in futures]
+
+        result = {'journal_mode': journal_mode, 'reads': 'atomic' if atomic_reads else 'autocommit', 'errors': 0}
+        for role in ('reader', 'writer'):
+            latencies = sorted(latency for outcome_role, values, _ in outcomes if outcome_role == role for latency in values)
+            result[f'{role}_ops_s'] = len(latencies) / options['duration']
+            result[f'{role}_p50_ms'] = (percentile(latencies, 50) or 0) * 1000
+            result[f'{role}_p95_ms'] = (percentile(latencies, 95) or 0) * 1000
+        result['errors'] = sum(errors for _, _, errors in outcomes)
+        logger.info(f"SQLite benchmark {journal_mode}/{result['reads']}: {result}")
+        return result
+
+    def cleanup(self):
+        """Removes the benchmark downloads and puts the configured journal mode back"""
+        connections.close_all()
+        configure_connection(settings.SQLITE_PRAGMAS['journal_mode'])
+        deleted = EbookDownload.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')._raw_delete('default')
+        # The raw delete skipped the counter signals
+        rebuild_download_stats()
+        self.stdout.write(f"Removed {deleted} benchmark downloads")
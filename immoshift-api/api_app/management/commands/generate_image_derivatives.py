@@ -0,0 +1,95 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connections
+from api_app.utils.content_cache import bump_content_version
+from api_app.utils.images import (
+    build_variants, delete_stale_files, get_formats, get_image_fields, get_widths, is_up_to_date
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Generate the responsive derivatives (WebP/JPEG width buckets) of every uploaded image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that are already up to date')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Encoding processes (default: one per CPU, 0 to encode in this process)')
+        parser.add_argument('--model', action='append', default=[],
+                            help='Only this model (e.g. article), can be repeated')
+
+    def handle(self, *args, **options):
+        jobs = self.collect_jobs(options['force'], [name.lower() for name in options['model']])
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS("All image derivatives are up to date"))
+            return
+
+        start = time.perf_counter()
+        widths, formats = get_widths(), get_formats()
+        updated = failed = 0
+        for job, record in self.run_jobs(jobs, widths, formats, options['workers']):
+            model, pk, image_field, variants_field, name, old_record = job
+            if not record:
+                failed += 1
+                continue
+            # Skip rows whose image changed while we were encoding
+            count = model._default_manager.filter(pk=pk, **{image_field: name}).update(**{variants_field: record})
+            if count:
+                delete_stale_files(old_record, record)
+                updated += 1
+
+        if updated:
+            bump_content_version()
+        elapsed = time.perf_counter() - start
+        logger.info(f"Image derivatives: {updated} updated, {failed} failed in {elapsed:.1f}s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {updated} image(s) in {elapsed:.1f}s ({failed} failed)"
+        ))
+
+    def collect_jobs(self, force, only_models):
+        """(model, pk, image field, variants field, image name, current record) for every image to process"""
+        jobs = []
+        for model, image_field, variants_field in get_image_fields():
+            if only_models and model._meta.model_name not in only_models:
+                continue
+            rows = (
+                model._default_manager.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+                .values_list('pk', image_field, variants_field)
+            )
+            for pk, name, record in rows.iterator():
+                if force or not is_up_to_date(name, record):
+                    jobs.append((model, pk, image_field, variants_field, name, record))
+        return jobs
+
+    def run_jobs(self, jobs, widths, formats, workers):
+        """Yields (job, variants record) as the encodings finish, each file being encoded once"""
+        jobs_by_name = defaultdict(list)
+        for job in jobs:
+            jobs_by_name[job[4]].append(job)
+
+        if workers <= 0:
+            for name, name_jobs in jobs_by_name.items():
+                record = build_variants(name, widths, formats)
+                for job in name_jobs:
+                    yield job, record
+            return
+
+        # Workers are forked: don't let them inherit the open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(build_variants, name, widths, formats): name for name in jobs_by_name}
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    record = future.result()
+                except Exception:
+                    logger.exception(f"Image derivatives failed for {name}")
+                    record = {}
+                for job in jobs_by_name[name]:
+                    yield job, record
+                if done % 50 == 0:
+                    self.stdout.write(f"{done}/{len(futures)} images")
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from api_app.utils.sitemap_files import regenerate
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Render every sitemap file (after a deploy or writes that skip the model signals: bulk_create, update())'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = regenerate()
+        elapsed = time.perf_counter() - start
+        logger.info(f"Sitemaps generated: {written} file(s) written in {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Sitemaps generated: {written} file(s) written in {elapsed:.2f}s"))
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from api_app.utils.download_stats import rebuild_download_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recompute the ebook download counters and the daily rollup from the EbookDownload rows'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_download_stats()
+        elapsed = time.perf_counter() - start
+        logger.info(f"Download stats rebuilt: {count} daily rows in {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Download stats rebuilt: {count} daily rows in {elapsed:.2f}s"))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api_app.utils import search
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the articles, trainings and paragraphs'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search requires the SQLite backend")
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            count = search.rebuild_index()
+        elapsed = time.perf_counter() - start
+        logger.info(f"Search index rebuilt: {count} rows in {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt: {count} rows in {elapsed:.2f}s"))
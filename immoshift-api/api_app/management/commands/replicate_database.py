@@ -0,0 +1,51 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api_app.utils.replication import ReplicationError, WALShipper, prune_generations
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Continuously ship the SQLite WAL to the replica storage, for point-in-time restores (long-running)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.SQLITE_REPLICA_INTERVAL,
+                            help='Seconds between two reads of the WAL')
+        parser.add_argument('--snapshot-hours', type=float, default=settings.SQLITE_REPLICA_SNAPSHOT_HOURS,
+                            help='Hours between two snapshots (new generations)')
+        parser.add_argument('--iterations', type=int, default=0, help='Stop after this many syncs (0: run forever)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("WAL shipping only applies to the SQLite backend")
+        try:
+            shipper = WALShipper(connection.settings_dict['NAME'])
+        except ReplicationError as e:
+            raise CommandError(str(e))
+
+        iteration = 0
+        try:
+            while True:
+                generation = shipper.step(snapshot_interval=options['snapshot_hours'] * 3600)
+                if generation:
+                    logger.info(f"Replication: new generation {generation}")
+                    self.stdout.write(self.style.SUCCESS(f"Started generation {generation}"))
+                    pruned = prune_generations(settings.BACKUP_RETENTION_DAYS, current=generation)
+                    if pruned:
+                        self.stdout.write(f"Removed {len(pruned)} old generation(s)")
+                iteration += 1
+                if options['iterations'] and iteration >= options['iterations']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            try:
+                # Ship what was committed since the last sync before exiting, unless no generation
+                # was started (a failure in the first start_generation(), which is being raised)
+                if shipper.generation is not None:
+                    shipper.sync()
+            finally:
+                shipper.close()
@@ -0,0 +1,59 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from api_app.utils.replication import ReplicationError, list_generations, list_segments, get_storage, restore_database
+
+class Command(BaseCommand):
+    help = 'Rebuild the database as it was at a given time from the replica (snapshot + shipped WAL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', default='', help='Date and time to restore, e.g. "2026-10-17 14:30:00" (default: latest)')
+        parser.add_argument('--output', default=f"{settings.DB_FILE_PATH}.restored",
+                            help='Where to write the restored database (the live one is never touched)')
+        parser.add_argument('--force', action='store_true', help='Overwrite --output if it exists')
+        parser.add_argument('--list', action='store_true', help='List the generations and what they can restore')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self.list_generations()
+
+        at = None
+        if options['at']:
+            at = parse_datetime(options['at'])
+            if at is None:
+                raise CommandError(f"Invalid date: {options['at']}")
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+        if os.path.exists(options['output']) and not options['force']:
+            raise CommandError(f"{options['output']} exists, use --force to overwrite it")
+
+        try:
+            result = restore_database(options['output'], at=at)
+        except ReplicationError as e:
+            raise CommandError(f"Restore failed: {e}")
+        restored_to = timezone.localtime(result['restored_to'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {options['output']} from generation {result['generation']} "
+            f"({result['frames']} WAL frames replayed, state as of {restored_to:%Y-%m-%d %H:%M:%S})"
+        ))
+        if at and (at - result['restored_to']).total_seconds() > 2 * settings.SQLITE_REPLICA_INTERVAL:
+            self.stdout.write(self.style.WARNING(
+                "Nothing was shipped between that state and the requested time: no writes, or a gap "
+                "between two generations (see --list)"
+            ))
+        self.stdout.write(f"Stop the application and move it over {settings.DB_FILE_PATH} to put it live")
+
+    def list_generations(self):
+        storage = get_storage()
+        for generation, manifest in list_generations(storage):
+            if manifest is None:
+                self.stdout.write(f"{generation}: incomplete")
+                continue
+            segments = list_segments(storage, generation)
+            last = segments[-1][2] if segments else manifest['restorable_from']
+            self.stdout.write(
+                f"{generation}: {timezone.localtime(manifest['restorable_from']):%Y-%m-%d %H:%M:%S} "
+                f"to {timezone.localtime(last):%Y-%m-%d %H:%M:%S}, {len(segments)} WAL segment(s)"
+            )
@@ -0,0 +1,30 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api_app.utils.linkedin_import import run_imports
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Process the bulk LinkedIn imports submitted from the admin (run from cron, or with --loop as a long-lived worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for imports instead of exiting when done')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between two polls with --loop')
+        parser.add_argument('--workers', type=int, default=settings.LINKEDIN_IMPORT_WORKERS,
+                            help='Posts fetched concurrently')
+        parser.add_argument('--batch-size', type=int, default=settings.LINKEDIN_IMPORT_BATCH_SIZE,
+                            help='Articles created per transaction')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = run_imports(workers=options['workers'], batch_size=options['batch_size'])
+            if stats:
+                logger.info(f"LinkedIn imports: {dict(stats)}")
+                self.stdout.write(self.style.SUCCESS(
+                    f"Imported {stats['imported']} post(s), {stats['skipped']} already imported, {stats['failed']} failed"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
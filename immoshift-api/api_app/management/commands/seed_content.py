@@ -0,0 +1,223 @@
+import io
+import os
+import random
+import datetime
+from contextlib import contextmanager
+from PIL import Image
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api_app.models import (
+    Author, Testimonial, Article, Training, Paragraph, Ebook, EbookDownload
+)
+from api_app.utils.content_cache import bump_content_version
+from api_app.utils.download_stats import rebuild_download_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every synthetic row is tagged with this prefix so it can be removed with --flush
+SLUG_PREFIX = 'bench-'
+PLACEHOLDER_DIR = 'bench'
+BATCH_SIZE = 5000
+# Size of the generated vocabulary, drawn with a Zipf distribution like real
+# text so that full-text search benchmarks see realistic term frequencies
+VOCABULARY_SIZE = 5000
+SYLLABLES = ('ba', 'ca', 'de', 'fi', 'go', 'la', 'lu', 'ma', 'mo', 'ne', 'pa', 'po', 'ri', 'sa', 'te', 'to', 'vi', 'ze')
+
+@contextmanager
+def explicit_download_dates():
+    """Lets bulk_create keep our download_date instead of auto_now_add's now()"""
+    field = EbookDownload._meta.get_field('download_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+class Command(BaseCommand):
+    help = 'Seed a reproducible synthetic corpus for benchmarks (never run on production data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=10)
+        parser.add_argument('--articles', type=int, default=500)
+        parser.add_argument('--paragraphs', type=int, default=5, help='Paragraphs per article and per training')
+        parser.add_argument('--trainings', type=int, default=20)
+        parser.add_argument('--ebooks', type=int, default=10)
+        parser.add_argument('--testimonials', type=int, default=30)
+        parser.add_argument('--downloads', type=int, default=100000, help='EbookDownload rows, spread over --days')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded content first')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.vocabulary, self.word_weights = self.build_vocabulary()
+        self.now = timezone.now().replace(microsecond=0)
+
+        if options['flush']:
+            self.flush()
+
+        media = self.create_placeholder_media()
+        with transaction.atomic():
+            authors = self.create_authors(options['authors'], media)
+            self.create_testimonials(options['testimonials'], media)
+            articles = self.create_articles(options['articles'], authors, media)
+            trainings = self.create_trainings(options['trainings'], media)
+            self.create_paragraphs(articles, trainings, options['paragraphs'], media)
+            ebooks = self.create_ebooks(options['ebooks'], media)
+        self.create_downloads(ebooks, options['downloads'], options['days'])
+        # bulk_create doesn't send the signals maintaining the download counters either
+        rebuild_download_stats()
+
+        # bulk_create doesn't send post_save, invalidate the snapshots ourselves
+        bump_content_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(authors)} authors, {len(articles)} articles, {len(trainings)} trainings, "
+            f"{len(ebooks)} ebooks and {options['downloads']} downloads"
+        ))
+
+    def flush(self):
+        """Removes the rows created by a previous run"""
+        Article.objects.filter(slug__startswith=SLUG_PREFIX).delete()
+        Training.objects.filter(slug__startswith=SLUG_PREFIX).delete()
+        Ebook.objects.filter(slug__startswith=SLUG_PREFIX).delete()  # Cascades to downloads
+        Author.objects.filter(name__startswith=SLUG_PREFIX).delete()
+        Testimonial.objects.filter(name__startswith=SLUG_PREFIX).delete()
+        self.stdout.write(self.style.SUCCESS("Removed previously seeded content"))
+
+    def create_placeholder_media(self):
+        """Writes one small file per media kind and returns their storage names"""
+        directory = os.path.join(settings.MEDIA_ROOT, PLACEHOLDER_DIR)
+        os.makedirs(directory, exist_ok=True)
+
+        image = io.BytesIO()
+        Image.new('RGB', (1200, 800), (40, 90, 160)).save(image, format='JPEG', quality=80)
+        files = {
+            'image': ('placeholder.jpg', image.getvalue()),
+            'pdf': ('placeholder.pdf', b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n'),
+            'video': ('placeholder.mp4', bytes(256 * 1024)),
+        }
+        names = {}
+        for kind, (file_name, content) in files.items():
+            with open(os.path.join(directory, file_name), 'wb') as f:
+                f.write(content)
+            names[kind] = f'{PLACEHOLDER_DIR}/{file_name}'
+        return names
+
+    def build_vocabulary(self):
+        """Returns (words, cumulative Zipf weights), the domain words being the most frequent"""
+        words = ['immobilier', 'mandat', 'vente', 'estimation', 'négociation', 'client', 'prospection',
+                 'agence', 'formation', 'conseil', 'marché', 'visite', 'acquéreur', 'projet', 'réseau']
+        seen = set(words)
+        while len(words) < VOCABULARY_SIZE:
+            word = ''.join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 4)))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        weights = []
+        total = 0.0
+        for rank in range(len(words)):
+            total += 1 / (rank + 1)
+            weights.append(total)
+        return words, weights
+
+    def words(self, count):
+        return ' '.join(self.random.choices(self.vocabulary, cum_weights=self.word_weights, k=count))
+
+    def create_authors(self, count, media):
+        authors = [
+            Author(name=f"{SLUG_PREFIX}auteur {i}", picture=media['image'] if i % 2 == 0 else None, bio=self.words(30))
+            for i in range(count)
+        ]
+        return Author.objects.bulk_create(authors)
+
+    def create_testimonials(self, count, media):
+        Testimonial.objects.bulk_create([
+            Testimonial(name=f"{SLUG_PREFIX}client {i}", role="Agent", avatar=media['image'],
+                        quote=self.words(25), rating=self.random.randint(3, 5))
+            for i in range(count)
+        ])
+
+    def create_articles(self, count, authors, media):
+        articles = [
+            Article(
+                title=self.words(6).capitalize(),
+                slug=f"{SLUG_PREFIX}article-{i}",
+                excerpt=self.words(40),
+                image=media['image'],
+                author=self.random.choice(authors) if authors else None,
+                published_at=self.now - datetime.timedelta(minutes=i * 37),
+                is_published=self.random.random() > 0.05,
+            )
+            for i in range(count)
+        ]
+        return Article.objects.bulk_create(articles, batch_size=BATCH_SIZE)
+
+    def create_trainings(self, count, media):
+        trainings = [
+            Training(
+                title=self.words(4).capitalize(),
+                slug=f"{SLUG_PREFIX}formation-{i}",
+                short_description=self.words(30),
+                image=media['image'],
+                duration=f"{self.random.randint(1, 5)} jours",
+                price=self.random.randint(200, 3000),
+                position=i,
+            )
+            for i in range(count)
+        ]
+        return Training.objects.bulk_create(trainings)
+
+    def create_paragraphs(self, articles, trainings, per_parent, media):
+        media_types = ['none', 'none', 'image', 'video_url', 'video_file']
+        paragraphs = []
+        parents = [('article', article) for article in articles] + [('training', training) for training in trainings]
+        for parent_field, parent in parents:
+            for position in range(per_parent):
+                media_type = self.random.choice(media_types)
+                paragraphs.append(Paragraph(
+                    **{parent_field: parent},
+                    position=position,
+                    title=self.words(4) if position else None,
+                    content=self.words(120),
+                    media_type=media_type,
+                    image=media['image'] if media_type == 'image' else None,
+                    video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ" if media_type == 'video_url' else None,
+                    video_file=media['video'] if media_type == 'video_file' else None,
+                    thumbnail=media['image'] if media_type == 'video_file' else None,
+                ))
+        Paragraph.objects.bulk_create(paragraphs, batch_size=BATCH_SIZE)
+
+    def create_ebooks(self, count, media):
+        ebooks = [
+            Ebook(title=self.words(5).capitalize(), slug=f"{SLUG_PREFIX}ebook-{i}", description=self.words(50),
+                  cover_image=media['image'], file=media['pdf'], position=i)
+            for i in range(count)
+        ]
+        return Ebook.objects.bulk_create(ebooks)
+
+    def create_downloads(self, ebooks, count, days):
+        if not ebooks or not count:
+            return
+        span = days * 24 * 3600
+        created = 0
+        with explicit_download_dates():
+            while created < count:
+                batch = []
+                for i in range(created, min(created + BATCH_SIZE, count)):
+                    batch.append(EbookDownload(
+                        ebook=self.random.choice(ebooks),
+                        first_name="Prénom",
+                        last_name=f"Nom {i}",
+                        # About one lead in five downloads several ebooks
+                        email=f"lead{self.random.randint(0, int(count * 0.8))}@example.com",
+                        consent_mailing=self.random.random() < 0.6,
+                        download_date=self.now - datetime.timedelta(seconds=self.random.randint(0, span)),
+                        ip_address=f"10.{i % 256}.{(i // 256) % 256}.{self.random.randint(1, 254)}",
+                    ))
+                with transaction.atomic():
+                    EbookDownload.objects.bulk_create(batch)
+                created += len(batch)
+                logger.info(f"Seeded {created}/{count} downloads")
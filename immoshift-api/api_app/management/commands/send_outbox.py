@@ -0,0 +1,39 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api_app.utils.digest import is_digest_mode, queue_download_digest
+from api_app.utils.outbox import BATCH_SIZE, drain_outbox, purge_sent
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Send the queued emails of the outbox (run from cron, or with --loop as a long-lived worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between two polls with --loop')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Emails claimed at a time')
+        parser.add_argument('--digest-now', action='store_true',
+                            help='Send the admin download digest without waiting for the end of the interval')
+
+    def handle(self, *args, **options):
+        force_digest = options['digest_now']
+        while True:
+            if is_digest_mode() or force_digest:
+                reported = queue_download_digest(force=force_digest)
+                force_digest = False
+                if reported:
+                    self.stdout.write(f"Queued the admin digest of {reported} download(s)")
+            stats = drain_outbox(batch_size=options['batch_size'])
+            if any(stats.values()):
+                logger.info(f"Outbox: {stats['sent']} sent, {stats['retried']} to retry, {stats['dead']} dead")
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {stats['sent']} email(s), {stats['retried']} to retry, {stats['dead']} dead-lettered"
+                ))
+            purged = purge_sent(getattr(settings, 'EMAIL_OUTBOX_KEEP_SENT_DAYS', 30))
+            if purged:
+                self.stdout.write(f"Purged {purged} old sent email(s)")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
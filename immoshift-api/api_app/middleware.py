@@ -0,0 +1,56 @@
+import logging
+from django.conf import settings
+from django.db import connection
+from .utils.query_budget import QueryStats, QueryBudgetExceeded, get_view_query_budget
+
+logger = logging.getLogger(__name__)
+
+SESSION_AUTH_QUERIES = 2  # Session row + user row
+TOKEN_AUTH_QUERIES = 1  # User row of a JWT
+
+class QueryBudgetMiddleware:
+    """
+    Counts the SQL queries and SQL time of each request.
+
+    The numbers are reported in the `X-DB-Queries` and `Server-Timing` headers.
+    When the view declares a budget (see utils/query_budget.py) and exceeds it,
+    a warning is logged, or QueryBudgetExceeded is raised if
+    QUERY_BUDGET_STRICT is enabled (the default under `manage.py test`).
+    Queries run while a streaming response is consumed are not counted.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request.query_budget = None
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+
+        response['X-DB-Queries'] = str(stats.count)
+        timing = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        self.check_budget(request, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_view_query_budget(view_func, request)
+
+    def check_budget(self, request, stats):
+        budget = request.query_budget
+        if budget is None:
+            return
+        # Budgets cover the view's own work, not the session/user lookups
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            budget += SESSION_AUTH_QUERIES
+        if 'HTTP_AUTHORIZATION' in request.META:
+            budget += TOKEN_AUTH_QUERIES
+        if stats.count <= budget:
+            return
+        message = f"Query budget exceeded on {request.method} {request.path}: {stats.count} queries (budget {budget})"
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
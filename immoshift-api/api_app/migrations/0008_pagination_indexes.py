@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0007_rgpdcontent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-published_at', 'id'], name='article_published_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paragraph',
+            index=models.Index(fields=['position', 'id'], name='paragraph_position_id_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# Frozen copy of the SQL of api_app/utils/search.py as of this migration
+INDEX_TABLE = 'api_app_search_index'
+COLUMNS = '(rowid, kind, parent_kind, parent_id, title, body)'
+
+CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5(
+        kind UNINDEXED, parent_kind UNINDEXED, parent_id UNINDEXED, title, body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4 5 6'
+    )
+"""
+
+# (table, rowid code, index row from the source row alias {row}, watched columns)
+SOURCES = [
+    ('api_app_article', 1, "{row}.id * 4 + 1, 'article', 'article', {row}.id, {row}.title, {row}.excerpt",
+     'title, excerpt'),
+    ('api_app_training', 3,
+     "{row}.id * 4 + 3, 'training', 'training', {row}.id, {row}.title, {row}.short_description",
+     'title, short_description'),
+    ('api_app_paragraph', 2,
+     "{row}.id * 4 + 2, 'paragraph', CASE WHEN {row}.article_id IS NOT NULL THEN 'article' ELSE 'training' END, "
+     "COALESCE({row}.article_id, {row}.training_id), {row}.title, {row}.content",
+     'title, content, article_id, training_id'),
+]
+
+
+def trigger_sql():
+    statements = []
+    for table, code, select, watched in SOURCES:
+        insert = f"INSERT INTO {INDEX_TABLE} {COLUMNS} VALUES ({select.format(row='new')});"
+        delete = f"DELETE FROM {INDEX_TABLE} WHERE rowid = old.id * 4 + {code};"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {watched} ON {table} "
+            f"BEGIN {delete} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        ]
+    return statements
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    for statement in trigger_sql():
+        schema_editor.execute(statement)
+    # Index the content that already exists
+    for table, _, select, _ in SOURCES:
+        schema_editor.execute(f"INSERT INTO {INDEX_TABLE} {COLUMNS} SELECT {select.format(row='s')} FROM {table} s")
+    schema_editor.execute(f"INSERT INTO {INDEX_TABLE} ({INDEX_TABLE}) VALUES ('optimize')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, *_ in SOURCES:
+        for suffix in ('ai', 'au', 'ad'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0008_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
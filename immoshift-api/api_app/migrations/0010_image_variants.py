@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes responsive'),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='picture_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes responsive'),
+        ),
+        migrations.AddField(
+            model_name='ebook',
+            name='cover_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes responsive'),
+        ),
+        migrations.AddField(
+            model_name='paragraph',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes responsive'),
+        ),
+        migrations.AddField(
+            model_name='testimonial',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes responsive'),
+        ),
+        migrations.AddField(
+            model_name='training',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes responsive'),
+        ),
+    ]
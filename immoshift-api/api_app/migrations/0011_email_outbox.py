@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Type')),
+                ('subject', models.CharField(max_length=255, verbose_name='Sujet')),
+                ('from_email', models.CharField(max_length=255, verbose_name='Expéditeur')),
+                ('to', models.JSONField(default=list, verbose_name='Destinataires')),
+                ('body', models.TextField(verbose_name='Texte')),
+                ('html_body', models.TextField(blank=True, default='', verbose_name='HTML')),
+                ('inline_logo', models.BooleanField(default=False, verbose_name='Logo intégré')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('sent', 'Envoyé'), ('dead', 'Abandonné')], default='pending', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Tentatives')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")),
+            ],
+            options={
+                'verbose_name': 'Email sortant',
+                'verbose_name_plural': 'Emails sortants',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0011_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nom')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Dernier identifiant traité')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='Dernier envoi')),
+            ],
+            options={
+                'verbose_name': 'Curseur de notification',
+                'verbose_name_plural': 'Curseurs de notification',
+            },
+        ),
+    ]
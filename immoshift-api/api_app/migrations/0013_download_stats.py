@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def fill_download_stats(apps, schema_editor):
+    # Frozen copy of utils/download_stats.rebuild_download_stats() as of this migration
+    Ebook = apps.get_model('api_app', 'Ebook')
+    EbookDownload = apps.get_model('api_app', 'EbookDownload')
+    EbookDownloadDaily = apps.get_model('api_app', 'EbookDownloadDaily')
+
+    rows = (
+        EbookDownload.objects.order_by()
+        .values('ebook_id', day=TruncDate('download_date'))
+        .annotate(total=Count('id'), consented=Count('id', filter=Q(consent_mailing=True)))
+    )
+    EbookDownloadDaily.objects.bulk_create(
+        [
+            EbookDownloadDaily(ebook_id=row['ebook_id'], date=row['day'], count=row['total'],
+                               consented_count=row['consented'])
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+    totals = (
+        EbookDownloadDaily.objects.filter(ebook=OuterRef('pk')).order_by()
+        .values('ebook').annotate(total=Sum('count')).values('total')
+    )
+    Ebook.objects.update(download_total=Coalesce(Subquery(totals), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0012_notification_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ebook',
+            name='download_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Téléchargements'),
+        ),
+        migrations.CreateModel(
+            name='EbookDownloadDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('count', models.IntegerField(default=0, verbose_name='Téléchargements')),
+                ('consented_count', models.IntegerField(default=0, verbose_name='Dont consentement emailing')),
+                ('ebook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_downloads', to='api_app.ebook', verbose_name='E-book')),
+            ],
+            options={
+                'verbose_name': 'Téléchargements du jour',
+                'verbose_name_plural': 'Téléchargements par jour',
+                'ordering': ['-date', 'ebook'],
+                'indexes': [models.Index(fields=['date'], name='ebook_download_daily_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ebook', 'date'), name='ebook_download_daily_unique')],
+            },
+        ),
+        migrations.RunPython(fill_download_stats, migrations.RunPython.noop),
+    ]
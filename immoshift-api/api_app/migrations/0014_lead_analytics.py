@@ -0,0 +1,73 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:33
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+
+def fill_leads(apps, schema_editor):
+    # Frozen copy of the lead part of utils/download_stats.rebuild_download_stats()
+    # as of this migration, the download counts were filled by 0013
+    EbookDownload = apps.get_model('api_app', 'EbookDownload')
+    EbookDownloadDaily = apps.get_model('api_app', 'EbookDownloadDaily')
+    EbookLead = apps.get_model('api_app', 'EbookLead')
+
+    leads = (
+        EbookDownload.objects.order_by()
+        .values('ebook_id', email_key=Lower(Trim('email')))
+        .annotate(first_download_at=Min('download_date'))
+    )
+    EbookLead.objects.bulk_create([EbookLead(**lead) for lead in leads.iterator()], batch_size=1000)
+
+    days = defaultdict(lambda: {'new_ebook_lead_count': 0, 'new_lead_count': 0})
+    current_key = None
+    ordered = EbookLead.objects.order_by('email_key', 'first_download_at', 'ebook_id').values_list(
+        'email_key', 'ebook_id', 'first_download_at'
+    )
+    for email_key, ebook_id, first_download_at in ordered.iterator(chunk_size=2000):
+        day = days[ebook_id, timezone.localdate(first_download_at)]
+        day['new_ebook_lead_count'] += 1
+        if email_key != current_key:
+            day['new_lead_count'] += 1
+            current_key = email_key
+    for (ebook_id, date), counters in days.items():
+        EbookDownloadDaily.objects.filter(ebook_id=ebook_id, date=date).update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0013_download_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ebookdownloaddaily',
+            name='new_lead_count',
+            field=models.IntegerField(default=0, verbose_name='Nouveaux prospects'),
+        ),
+        migrations.AddField(
+            model_name='ebookdownloaddaily',
+            name='new_ebook_lead_count',
+            field=models.IntegerField(default=0, verbose_name="Nouveaux prospects de l'e-book"),
+        ),
+        migrations.CreateModel(
+            name='EbookLead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_key', models.CharField(max_length=254, verbose_name='Email (minuscules)')),
+                ('first_download_at', models.DateTimeField(verbose_name='Premier téléchargement')),
+                ('ebook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leads', to='api_app.ebook', verbose_name='E-book')),
+            ],
+            options={
+                'verbose_name': 'Prospect par e-book',
+                'verbose_name_plural': 'Prospects par e-book',
+                'constraints': [models.UniqueConstraint(fields=('email_key', 'ebook'), name='ebook_lead_unique')],
+            },
+        ),
+        migrations.RunPython(fill_leads, migrations.RunPython.noop),
+    ]
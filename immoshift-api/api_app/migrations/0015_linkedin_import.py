@@ -0,0 +1,68 @@
+# Generated by Django 5.1.7 on 2026-10-18 00:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0014_lead_analytics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkedInImportItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, verbose_name='URL du post')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('imported', 'Importé'), ('skipped', 'Déjà importé'), ('failed', 'Échec')], default='pending', max_length=10, verbose_name='Statut')),
+                ('lease_until', models.DateTimeField(blank=True, null=True, verbose_name="Réservé jusqu'à")),
+                ('error', models.TextField(blank=True, default='', verbose_name='Erreur')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Date de fin')),
+            ],
+            options={
+                'verbose_name': 'Post LinkedIn importé',
+                'verbose_name_plural': 'Posts LinkedIn importés',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LinkedInImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Date de fin')),
+            ],
+            options={
+                'verbose_name': 'Import LinkedIn',
+                'verbose_name_plural': 'Imports LinkedIn',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['source_url'], name='article_source_url_idx'),
+        ),
+        migrations.AddField(
+            model_name='linkedinimportitem',
+            name='article',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api_app.article', verbose_name='Article'),
+        ),
+        migrations.AddField(
+            model_name='linkedinimportjob',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Créé par'),
+        ),
+        migrations.AddField(
+            model_name='linkedinimportitem',
+            name='job',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api_app.linkedinimportjob', verbose_name='Import'),
+        ),
+        migrations.AddIndex(
+            model_name='linkedinimportitem',
+            index=models.Index(fields=['status', 'lease_until'], name='linkedin_item_due_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.forms import ValidationError as FormValidationError
@@ -11,6 +12,7 @@ class Author(models.Model):
     """Model for content authors that can be reused across multiple articles."""
     name = models.CharField(max_length=100, verbose_name="Nom")
     picture = models.ImageField(upload_to='authors/', verbose_name="Photo", blank=True, null=True)
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes responsive")  # See utils/images.py
     bio = models.TextField(verbose_name="Biographie", blank=True, null=True)
     
     def __str__(self):
@@ -24,6 +26,7 @@ class Testimonial(models.Model):
     name = models.CharField(max_length=100, verbose_name="Nom")
     role = models.CharField(max_length=100, verbose_name="Rôle")
     avatar = models.ImageField(upload_to='testimonials/', verbose_name="Avatar")
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes responsive")  # See utils/images.py
     quote = models.TextField(verbose_name="Citation")
     rating = models.IntegerField(
         verbose_name="Note", 
@@ -47,6 +50,7 @@ class Training(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Prix", blank=True, null=True)
     show_price = models.BooleanField(default=True, verbose_name="Afficher le prix")
     image = models.ImageField(upload_to='trainings/', verbose_name="Image")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes responsive")  # See utils/images.py
     video_url = models.URLField(blank=True, null=True, verbose_name="URL Vidéo")
     is_active = models.BooleanField(default=True, verbose_name="Actif")
     position = models.PositiveIntegerField(default=0, verbose_name="Position d'affichage")
@@ -66,6 +70,7 @@ class Article(models.Model):
     slug = models.SlugField(unique=True, verbose_name="Slug URL")
     excerpt = models.TextField(verbose_name="Extrait")
     image = models.ImageField(upload_to='articles/', verbose_name="Image principale", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes responsive")  # See utils/images.py
     author = models.ForeignKey(
         Author, 
         on_delete=models.SET_NULL, 
@@ -92,6 +97,12 @@ class Article(models.Model):
         verbose_name = "Article"
         verbose_name_plural = "Articles"
         ordering = ['-published_at']
+        indexes = [
+            # Keyset pagination seeks on (published_at, id)
+            models.Index(fields=['-published_at', 'id'], name='article_published_id_idx'),
+            # Imports skip the posts already imported
+            models.Index(fields=['source_url'], name='article_source_url_idx'),
+        ]
 
 class Paragraph(models.Model):
     """Model for paragraphs that can be attached to Articles or Trainings with optional images or videos."""
@@ -114,6 +125,7 @@ class Paragraph(models.Model):
     
     # Media fields
     image = models.ImageField(upload_to='paragraphs/', verbose_name="Image", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes responsive")  # See utils/images.py
     video_url = models.URLField(verbose_name="URL Vidéo", help_text="YouTube ou Vimeo URL", blank=True, null=True)
     video_file = models.FileField(upload_to='paragraph_videos/', blank=True, null=True, verbose_name="Fichier Vidéo",
                                  help_text="Téléchargez directement un fichier vidéo (recommandé < 100 MB)")
@@ -208,15 +220,22 @@ class Paragraph(models.Model):
         verbose_name = "Paragraphe"
         verbose_name_plural = "Paragraphes"
         ordering = ['position']
+        indexes = [
+            # Keyset pagination seeks on (position, id)
+            models.Index(fields=['position', 'id'], name='paragraph_position_id_idx'),
+        ]
 
 class Ebook(models.Model):
     title = models.CharField(max_length=200, verbose_name="Titre")
     slug = models.SlugField(unique=True, verbose_name="Slug URL")
     description = models.TextField(verbose_name="Description")
     cover_image = models.ImageField(upload_to='ebooks/covers/', verbose_name="Image de couverture")
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes responsive")  # See utils/images.py
     file = models.FileField(upload_to='ebooks/files/', verbose_name="Fichier PDF")
     is_active = models.BooleanField(default=True, verbose_name="Actif")
     position = models.PositiveIntegerField(default=0, verbose_name="Position d'affichage")
+    # Maintained on each download, see utils/download_stats.py
+    download_total = models.PositiveIntegerField(default=0, editable=False, verbose_name="Téléchargements")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
     
@@ -246,6 +265,167 @@ class EbookDownload(models.Model):
         verbose_name_plural = "Téléchargements E-books"
 
 
+class EbookDownloadDaily(models.Model):
+    """Downloads per ebook and per day, maintained on each download (see utils/download_stats.py)."""
+    ebook = models.ForeignKey(Ebook, on_delete=models.CASCADE, related_name="daily_downloads", verbose_name="E-book")
+    date = models.DateField(verbose_name="Date")
+    count = models.IntegerField(default=0, verbose_name="Téléchargements")
+    consented_count = models.IntegerField(default=0, verbose_name="Dont consentement emailing")
+    # First download of the ebook by an email / first download of any ebook by an email
+    new_ebook_lead_count = models.IntegerField(default=0, verbose_name="Nouveaux prospects de l'e-book")
+    new_lead_count = models.IntegerField(default=0, verbose_name="Nouveaux prospects")
+
+    def __str__(self):
+        return f"{self.ebook_id} - {self.date}: {self.count}"
+
+    class Meta:
+        verbose_name = "Téléchargements du jour"
+        verbose_name_plural = "Téléchargements par jour"
+        ordering = ['-date', 'ebook']
+        constraints = [
+            models.UniqueConstraint(fields=['ebook', 'date'], name='ebook_download_daily_unique'),
+        ]
+        indexes = [
+            # Date range scans over every ebook
+            models.Index(fields=['date'], name='ebook_download_daily_date_idx'),
+        ]
+
+
+class EbookLead(models.Model):
+    """First download of an ebook by an email, to count leads incrementally."""
+    ebook = models.ForeignKey(Ebook, on_delete=models.CASCADE, related_name="leads", verbose_name="E-book")
+    email_key = models.CharField(max_length=254, verbose_name="Email (minuscules)")
+    first_download_at = models.DateTimeField(verbose_name="Premier téléchargement")
+
+    def __str__(self):
+        return f"{self.email_key} - {self.ebook_id}"
+
+    class Meta:
+        verbose_name = "Prospect par e-book"
+        verbose_name_plural = "Prospects par e-book"
+        constraints = [
+            # Leading email_key also serves the "seen for any ebook" lookups
+            models.UniqueConstraint(fields=['email_key', 'ebook'], name='ebook_lead_unique'),
+        ]
+
+
+class EmailOutbox(models.Model):
+    """
+    Email written in the same transaction as the row that triggered it and
+    sent later by `manage.py send_outbox` (see utils/outbox.py).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_SENT, 'Envoyé'),
+        (STATUS_DEAD, 'Abandonné'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name="Type")
+    subject = models.CharField(max_length=255, verbose_name="Sujet")
+    from_email = models.CharField(max_length=255, verbose_name="Expéditeur")
+    to = models.JSONField(default=list, verbose_name="Destinataires")
+    body = models.TextField(verbose_name="Texte")
+    html_body = models.TextField(blank=True, default='', verbose_name="HTML")
+    inline_logo = models.BooleanField(default=False, verbose_name="Logo intégré")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Statut")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    last_error = models.TextField(blank=True, default='', verbose_name="Dernière erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+    class Meta:
+        verbose_name = "Email sortant"
+        verbose_name_plural = "Emails sortants"
+        ordering = ['-id']
+        indexes = [
+            # The worker only ever looks for due pending emails
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+
+class NotificationCursor(models.Model):
+    """
+    High-water mark of a periodic notification or incremental export: rows
+    up to `last_id` have been reported (see utils/digest.py, utils/csv_export.py).
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name="Nom")
+    last_id = models.BigIntegerField(default=0, verbose_name="Dernier identifiant traité")
+    last_run_at = models.DateTimeField(blank=True, null=True, verbose_name="Dernier envoi")
+
+    def __str__(self):
+        return f"{self.name} ({self.last_id})"
+
+    class Meta:
+        verbose_name = "Curseur de notification"
+        verbose_name_plural = "Curseurs de notification"
+
+
+class LinkedInImportJob(models.Model):
+    """
+    Bulk import of LinkedIn posts submitted from the admin, one
+    LinkedInImportItem per URL, run by `manage.py run_linkedin_imports`
+    (see utils/linkedin_import.py).
+    """
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Créé par"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Date de fin")
+
+    def __str__(self):
+        return f"Import LinkedIn #{self.pk}"
+
+    class Meta:
+        verbose_name = "Import LinkedIn"
+        verbose_name_plural = "Imports LinkedIn"
+        ordering = ['-id']
+
+
+class LinkedInImportItem(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_IMPORTED = 'imported'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_IMPORTED, 'Importé'),
+        (STATUS_SKIPPED, 'Déjà importé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    job = models.ForeignKey(LinkedInImportJob, on_delete=models.CASCADE, related_name='items', verbose_name="Import")
+    url = models.URLField(max_length=500, verbose_name="URL du post")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Statut")
+    # While running: until when the worker holding it has it
+    lease_until = models.DateTimeField(blank=True, null=True, verbose_name="Réservé jusqu'à")
+    article = models.ForeignKey(
+        Article, on_delete=models.SET_NULL, blank=True, null=True, related_name='+', verbose_name="Article"
+    )
+    error = models.TextField(blank=True, default='', verbose_name="Erreur")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Date de fin")
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = "Post LinkedIn importé"
+        verbose_name_plural = "Posts LinkedIn importés"
+        ordering = ['id']
+        indexes = [
+            # The worker looks for pending items and expired leases
+            models.Index(fields=['status', 'lease_until'], name='linkedin_item_due_idx'),
+        ]
+
+
 class RGPDContent(models.Model):
     owner_name = models.CharField(max_length=150, default="Audrey Antonini", verbose_name="Nom de la responsable")
     trade_name = models.CharField(max_length=150, default="ImmoShift", verbose_name="Nom commercial")
@@ -0,0 +1,154 @@
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a composite key, e.g. ('-published_at', 'id').
+
+    Unlike DRF's CursorPagination (which seeks on the first ordering field and
+    then skips ties with an OFFSET), every page is a pure index seek on the whole
+    key, so page N costs the same as page 1 however many rows share a value.
+    The last ordering field must be unique. The cursor is opaque (base64 JSON).
+    """
+    ordering = ('id',)
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Curseur invalide'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, values, reverse=False):
+        payload = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, queryset, cursor):
+        """Returns (values, reverse) with values converted back to Python types"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self._get_field(queryset, name).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+            return values, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_field(self, queryset, name):
+        return queryset.model._meta.get_field(name.lstrip('-'))
+
+    def _row_values(self, queryset, row):
+        """Ordering key of a page row, either a model instance or a values() dict"""
+        values = []
+        for name in self.ordering:
+            field = self._get_field(queryset, name)
+            if isinstance(row, dict):
+                value = row[field.name]
+                # Same text as field.value_to_string() gives for instances
+                values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+            else:
+                values.append(field.value_to_string(row))
+        return values
+
+    def _seek_filter(self, values, reverse):
+        """
+        Lexicographic "after this key" filter:
+        (a > va) OR (a = va AND b > vb) OR ...
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[field] = value
+        return condition
+
+    def _get_ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering)
+
+    def get_page(self, queryset, page_size, cursor=None):
+        """
+        Fetches one page.
+
+        Returns:
+            tuple: (rows, next_cursor, previous_cursor), cursors are None at the ends
+        """
+        values, reverse = self.decode_cursor(queryset, cursor) if cursor else (None, False)
+        queryset = queryset.order_by(*self._get_ordering(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, reverse))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(self._row_values(queryset, rows[-1]))
+            if values is not None and (has_more or not reverse):
+                previous_cursor = self.encode_cursor(self._row_values(queryset, rows[0]), reverse=True)
+        return rows, next_cursor, previous_cursor
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        rows, self.next_cursor, self.previous_cursor = self.get_page(queryset, self.page_size_value, cursor)
+        return rows
+
+    def get_cursor_link(self, url, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        url = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return Response({
+            'next': self.get_cursor_link(url, self.next_cursor),
+            'previous': self.get_cursor_link(url, self.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+class ArticleCursorPagination(KeysetPagination):
+    ordering = ('-published_at', 'id')
+
+class ParagraphCursorPagination(KeysetPagination):
+    ordering = ('position', 'id')
+
+class TestimonialCursorPagination(KeysetPagination):
+    ordering = ('id',)
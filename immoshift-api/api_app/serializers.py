@@ -1,87 +1,267 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import (
     Testimonial, Training, Article, Paragraph, Ebook, EbookDownload, Author, RGPDContent
 )
 
-class AuthorSerializer(serializers.ModelSerializer):
+def parse_field_list(value):
+    """
+    Parses a `?fields=` / `?omit=` value into a tree of field names.
+    
+    "title,paragraphs.title,paragraphs.content" becomes
+    {'title': {}, 'paragraphs': {'title': {}, 'content': {}}}
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    tree = {}
+    for path in value:
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree or None
+
+class DynamicFieldsMixin:
+    """
+    Lets clients narrow a serializer with `?fields=a,b` or `?omit=c`.
+    
+    Names can be given explicitly (`fields=` / `omit=` keyword arguments) or are
+    read from the request in the context. Dotted names reach nested serializers
+    (`?fields=title,paragraphs.content`). `optimize_queryset` then loads only the
+    columns and relations the remaining fields read.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super().__init__(*args, **kwargs)
+        
+        request = self.context.get('request')
+        if fields is None and omit is None and request is not None:
+            fields = request.query_params.get('fields')
+            omit = request.query_params.get('omit')
+        self.restrict_fields(parse_field_list(fields), parse_field_list(omit))
+    
+    def restrict_fields(self, fields=None, omit=None):
+        """Drops the fields not selected by the `fields` / `omit` trees"""
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+            for name, subtree in fields.items():
+                if subtree and name in self.fields:
+                    self._restrict_nested(self.fields[name], fields=subtree)
+        for name, subtree in (omit or {}).items():
+            if name not in self.fields:
+                continue
+            if subtree:
+                self._restrict_nested(self.fields[name], omit=subtree)
+            else:
+                self.fields.pop(name)
+    
+    @staticmethod
+    def _restrict_nested(field, **kwargs):
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, DynamicFieldsMixin):
+            nested.restrict_fields(**kwargs)
+    
+    @staticmethod
+    def _concrete_sources(model, serializer):
+        """Columns read by a nested serializer's fields, or None if one isn't a plain column"""
+        columns = []
+        for field in serializer.fields.values():
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete:
+                return None
+            columns.append(field.source)
+        return columns
+    
+    def optimize_queryset(self, queryset, extra_fields=()):
+        """
+        Restricts `queryset` to what the remaining fields read.
+        
+        Concrete columns go through only(), forward relations through
+        select_related() and nested many relations through a Prefetch that is
+        itself narrowed. Relations whose fields were dropped are not fetched.
+        """
+        model = self.Meta.model
+        only = {'pk', *extra_fields}
+        select_related = set()
+        prefetches = []
+        can_defer = True
+        
+        for field in self.fields.values():
+            if field.source == '*':
+                can_defer = False
+                continue
+            parts = field.source.split('.')
+            try:
+                model_field = model._meta.get_field(parts[0])
+            except FieldDoesNotExist:
+                # Property or method: we can't tell which columns it needs
+                can_defer = False
+                continue
+            
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if model_field.one_to_many:
+                related_queryset = model_field.related_model._default_manager.all()
+                if isinstance(nested, DynamicFieldsMixin):
+                    related_queryset = nested.optimize_queryset(
+                        related_queryset, extra_fields=[model_field.field.name]
+                    )
+                prefetches.append(Prefetch(parts[0], queryset=related_queryset))
+            elif model_field.many_to_one or model_field.one_to_one:
+                select_related.add(parts[0])
+                only.add(parts[0])
+                if len(parts) > 1:
+                    only.add('__'.join(parts))
+                elif isinstance(nested, serializers.BaseSerializer):
+                    related_columns = self._concrete_sources(model_field.related_model, nested)
+                    if related_columns is None:
+                        can_defer = False
+                    else:
+                        only.update(f'{parts[0]}__{name}' for name in related_columns)
+            elif model_field.concrete:
+                only.add(parts[0])
+            else:
+                can_defer = False
+        
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if can_defer:
+            queryset = queryset.only(*only)
+        return queryset
+
+class SrcsetField(serializers.ReadOnlyField):
+    """
+    Renders a `<field>_variants` record (see utils/images.py) as srcset strings:
+    {"width": 1920, "height": 1280, "webp": "<url> 320w, <url> 640w, ...", "jpeg": "..."}
+    or None when no derivatives exist yet.
+    """
+    def to_representation(self, value):
+        if not value or not value.get('formats'):
+            return None
+        request = self.context.get('request')
+        data = {'width': value['width'], 'height': value['height']}
+        for fmt, variants in value['formats'].items():
+            urls = []
+            for width, name in variants:
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            data[fmt] = ', '.join(urls)
+        return data
+
+class AuthorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Author model"""
+    picture_srcset = SrcsetField(source='picture_variants')
+    
     class Meta:
         model = Author
-        fields = ['id', 'name', 'picture', 'bio']
+        fields = ['id', 'name', 'picture', 'picture_srcset', 'bio']
 
-class TestimonialSerializer(serializers.ModelSerializer):
+class TestimonialSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    avatar_srcset = SrcsetField(source='avatar_variants')
+    
     class Meta:
         model = Testimonial
-        fields = ['id', 'name', 'role', 'avatar', 'quote', 'rating']
+        fast_serialization = True  # See fast_serializers.py
+        fields = ['id', 'name', 'role', 'avatar', 'avatar_srcset', 'quote', 'rating']
 
-class ParagraphSerializer(serializers.ModelSerializer):
+class ParagraphSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Paragraph model, used with Article and Training"""
+    image_srcset = SrcsetField(source='image_variants')
+    
     class Meta:
         model = Paragraph
         fields = [
-            'id', 'title', 'content', 'image', 'video_url', 'video_file', 
+            'id', 'title', 'content', 'image', 'image_srcset', 'video_url', 'video_file', 
             'thumbnail', 'position', 'file_size_mb', 'media_type'
         ]
 
-class ArticleListSerializer(serializers.ModelSerializer):
+class ArticleListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Simplified serializer for listing articles on the homepage"""
     author_name = serializers.StringRelatedField(source='author.name', read_only=True)
     author_picture = serializers.ImageField(source='author.picture', read_only=True)
+    image_srcset = SrcsetField(source='image_variants')
+    author_picture_srcset = SrcsetField(source='author.picture_variants')
     
     class Meta:
         model = Article
-        fields = ['id', 'title', 'slug', 'excerpt', 'image', 'published_at', 
-                 'author_name', 'author_picture', 'source_url']
+        fast_serialization = True  # See fast_serializers.py
+        fields = ['id', 'title', 'slug', 'excerpt', 'image', 'image_srcset', 'published_at', 
+                 'author_name', 'author_picture', 'author_picture_srcset', 'source_url']
 
-class ArticleDetailSerializer(serializers.ModelSerializer):
+class ArticleDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Detailed serializer for article pages with related paragraphs"""
     paragraphs = ParagraphSerializer(many=True, read_only=True)
     author = AuthorSerializer(read_only=True)
+    image_srcset = SrcsetField(source='image_variants')
     
     class Meta:
         model = Article
+        fast_serialization = True  # See fast_serializers.py
         fields = [
-            'id', 'title', 'slug', 'excerpt', 'image', 
+            'id', 'title', 'slug', 'excerpt', 'image', 'image_srcset', 
             'author', 'source_url', 'is_published', 'created_at', 
             'published_at', 'updated_at', 'paragraphs'
         ]
 
-class TrainingListSerializer(serializers.ModelSerializer):
+class TrainingListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Simplified serializer for listing trainings on the homepage"""
+    image_srcset = SrcsetField(source='image_variants')
+    
     class Meta:
         model = Training
+        fast_serialization = True  # See fast_serializers.py
         fields = [
-            'id', 'title', 'slug', 'short_description', 'image', 
+            'id', 'title', 'slug', 'short_description', 'image', 'image_srcset', 
             'duration', 'price', 'show_price', 'position'
         ]
 
-class TrainingDetailSerializer(serializers.ModelSerializer):
+class TrainingDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Detailed serializer for training pages with related paragraphs"""
     paragraphs = ParagraphSerializer(many=True, read_only=True)
+    image_srcset = SrcsetField(source='image_variants')
     
     class Meta:
         model = Training
+        fast_serialization = True  # See fast_serializers.py
         fields = [
             'id', 'title', 'slug', 'short_description', 
-            'duration', 'price', 'show_price', 'image', 'video_url', 'is_active',
+            'duration', 'price', 'show_price', 'image', 'image_srcset', 'video_url', 'is_active',
             'created_at', 'updated_at', 'paragraphs', 'position'
         ]
 
-class EbookSerializer(serializers.ModelSerializer):
+class EbookSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Ebooks without the file field for listing"""
+    cover_image_srcset = SrcsetField(source='cover_image_variants')
+    
     class Meta:
         model = Ebook
+        fast_serialization = True  # See fast_serializers.py
         fields = [
-            'id', 'title', 'slug', 'description', 'cover_image', 
+            'id', 'title', 'slug', 'description', 'cover_image', 'cover_image_srcset', 
             'is_active', 'position'
         ]
 
-class EbookDetailSerializer(serializers.ModelSerializer):
+class EbookDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Ebook detail pages including file field for download"""
+    cover_image_srcset = SrcsetField(source='cover_image_variants')
+    
     class Meta:
         model = Ebook
+        fast_serialization = True  # See fast_serializers.py
         fields = [
-            'id', 'title', 'slug', 'description', 'cover_image', 
+            'id', 'title', 'slug', 'description', 'cover_image', 'cover_image_srcset', 
             'file', 'is_active', 'created_at', 'position'
         ]
 
@@ -98,7 +278,7 @@ class EbookDownloadCreateSerializer(serializers.ModelSerializer):
             validated_data['ip_address'] = request.META.get('REMOTE_ADDR')
         return super().create(validated_data)
 
-class EbookDownloadAdminSerializer(serializers.ModelSerializer):
+class EbookDownloadAdminSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Full serializer for admin operations"""
     ebook_title = serializers.StringRelatedField(source='ebook.title', read_only=True)
     
@@ -110,7 +290,7 @@ class EbookDownloadAdminSerializer(serializers.ModelSerializer):
         ]
 
 
-class RGPDContentSerializer(serializers.ModelSerializer):
+class RGPDContentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = RGPDContent
         fields = [
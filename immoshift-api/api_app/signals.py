@@ -0,0 +1,119 @@
+from functools import partial
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from .models import Article, Author, Testimonial, Training, Ebook, EbookDownload, Paragraph, RGPDContent
+from .utils.content_cache import bump_content_version
+from .utils.digest import protect_cursor_ids
+from .utils.download_stats import record_download
+from .utils.email_cache import invalidate_ebook
+from .utils.images import get_image_fields, is_up_to_date, update_derivatives
+from .utils.search import ensure_triggers
+from .utils.sitemap_files import get_sitemaps, schedule_regeneration, sections_of
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Models whose changes alter the public content payloads
+CONTENT_MODELS = (Article, Author, Testimonial, Training, Ebook, Paragraph, RGPDContent)
+
+def invalidate_content_cache(sender, **kwargs):
+    """Bumps the content version whenever public content changes."""
+    # Wait for the commit so no worker can rebuild a snapshot from the old rows
+    transaction.on_commit(bump_content_version)
+
+for model in CONTENT_MODELS:
+    post_save.connect(invalidate_content_cache, sender=model, dispatch_uid=f'content_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_content_cache, sender=model, dispatch_uid=f'content_cache_delete_{model.__name__}')
+
+def invalidate_email_fragments(sender, instance, **kwargs):
+    """Drops this process' pre-rendered confirmation email of the ebook."""
+    invalidate_ebook(instance.pk)
+
+post_save.connect(invalidate_email_fragments, sender=Ebook, dispatch_uid='email_fragments_save')
+post_delete.connect(invalidate_email_fragments, sender=Ebook, dispatch_uid='email_fragments_delete')
+
+def refresh_image_derivatives(sender, instance, **kwargs):
+    """Regenerates the responsive variants once a new image is committed."""
+    for model, image_field, variants_field in get_image_fields():
+        if model is not sender:
+            continue
+        if is_up_to_date(getattr(instance, image_field).name, getattr(instance, variants_field)):
+            continue
+        transaction.on_commit(partial(generate_derivatives, sender, instance.pk, image_field, variants_field))
+
+def generate_derivatives(model, pk, image_field, variants_field):
+    try:
+        changed = update_derivatives(model, pk, image_field, variants_field)
+    except Exception:
+        # The upload itself succeeded, generate_image_derivatives can retry
+        logger.exception(f"Image derivatives failed for {model.__name__} {pk}")
+        return
+    if changed:
+        bump_content_version()
+
+for model in {model for model, _, _ in get_image_fields()}:
+    post_save.connect(refresh_image_derivatives, sender=model, dispatch_uid=f'image_derivatives_{model.__name__}')
+
+def remember_sitemap_listing(sender, instance, **kwargs):
+    """Whether the stored row is in the sitemap, when the instance being saved no longer is."""
+    for section in sections_of(sender):
+        sitemap = get_sitemaps()[section]
+        if not sitemap.is_listed(instance):
+            instance._sitemap_listed = bool(instance.pk) and sitemap.items().filter(pk=instance.pk).exists()
+
+def refresh_sitemaps(sender, instance, update_fields=None, **kwargs):
+    """Regenerates the sitemap files of the sections a listed object enters, leaves or changes in."""
+    sections = []
+    for section in sections_of(sender):
+        sitemap = get_sitemaps()[section]
+        if update_fields is not None and not set(update_fields) & set(sitemap.fields):
+            continue
+        if sitemap.is_listed(instance) or getattr(instance, '_sitemap_listed', False):
+            sections.append(section)
+    if sections:
+        schedule_regeneration(sections)
+
+for model in (Article, Training, Ebook):
+    pre_save.connect(remember_sitemap_listing, sender=model, dispatch_uid=f'sitemap_pre_save_{model.__name__}')
+    post_save.connect(refresh_sitemaps, sender=model, dispatch_uid=f'sitemap_save_{model.__name__}')
+    post_delete.connect(refresh_sitemaps, sender=model, dispatch_uid=f'sitemap_delete_{model.__name__}')
+
+# Fields of a download its counters depend on
+COUNTED_DOWNLOAD_FIELDS = ('ebook_id', 'consent_mailing', 'download_date')
+
+def remember_counted_fields(sender, instance, **kwargs):
+    """Keeps the stored values of an edited download to move its counters after the save."""
+    if instance.pk and not instance._state.adding:
+        instance._counted_before = sender.objects.filter(pk=instance.pk).values(*COUNTED_DOWNLOAD_FIELDS).first()
+
+def count_download(sender, instance, created, **kwargs):
+    """Keeps Ebook.download_total, EbookDownloadDaily and EbookLead in step with the downloads."""
+    if created:
+        record_download(instance, 1, count_lead=True)
+        return
+    before = getattr(instance, '_counted_before', None)
+    if before and any(before[field] != getattr(instance, field) for field in COUNTED_DOWNLOAD_FIELDS):
+        record_download(sender(**before), -1)
+        record_download(instance, 1, count_lead=True)
+
+def uncount_download(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Ebook):
+        return  # Its counters are deleted with it
+    record_download(instance, -1)
+
+pre_save.connect(remember_counted_fields, sender=EbookDownload, dispatch_uid='download_stats_pre_save')
+post_save.connect(count_download, sender=EbookDownload, dispatch_uid='download_stats_save')
+post_delete.connect(uncount_download, sender=EbookDownload, dispatch_uid='download_stats_delete')
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Table rebuilds during migrate drop the full-text index triggers, put them back."""
+    ensure_triggers(connections[using])
+
+post_migrate.connect(restore_search_triggers, sender=apps.get_app_config('api_app'), dispatch_uid='search_triggers')
+
+def restore_download_sequence(sender, using, **kwargs):
+    """Table rebuilds during migrate restart the download ids, keep them ahead of the cursors."""
+    protect_cursor_ids(connections[using])
+
+post_migrate.connect(restore_download_sequence, sender=apps.get_app_config('api_app'), dispatch_uid='download_sequence')
@@ -1,71 +1,72 @@
 from django.contrib.sitemaps import Sitemap
-from django.urls import reverse
 from .models import Article, Training, Ebook
 from django.conf import settings # Ensure SITE_URL is defined in settings.py
 
-class ArticleSitemap(Sitemap):
-    changefreq = "weekly"
-    priority = "0.8"
+class FrontendSitemap(Sitemap):
+    """
+    Sitemap of the frontend pages of a content model, read as (slug, updated_at)
+    rows only. Rendered to files by api_app/utils/sitemap_files.py.
+    """
+    model = None
+    # Filter of the rows listed, also checked on instances being saved
+    listed = {}
+    ordering = ()
+    # Frontend path of the detail pages
+    path = ''
+    # Fields whose change alters the sitemap
+    fields = ('slug', 'updated_at')
 
     def items(self):
-        # Only include published articles
-        return Article.objects.filter(is_published=True).order_by('-published_at')
-    
-    def lastmod(self, obj):
-        return obj.updated_at
-    
+        return self.model.objects.filter(**self.listed).order_by(*self.ordering).values_list('slug', 'updated_at')
+
+    def location(self, item):
+        return f"{settings.SITE_URL}/{self.path}/{item[0]}/"
+
+    def lastmod(self, item):
+        return item[1]
+
+    def is_listed(self, instance):
+        return all(getattr(instance, field) == value for field, value in self.listed.items())
+
     def get_urls(self, site=None, **kwargs):
-        # Override get_urls to yield dictionaries with the full frontend URL
-        site_url = getattr(settings, 'SITE_URL', '') # Get frontend URL from settings
+        # Full frontend URLs, not the Sites framework domain
         for item in self.items():
             yield {
-                'location': f"{site_url}/articles/{item.slug}/",
+                'location': self.location(item),
                 'lastmod': self.lastmod(item),
                 'changefreq': self.changefreq,
                 'priority': self.priority,
             }
 
-class TrainingSitemap(Sitemap):
+class ArticleSitemap(FrontendSitemap):
+    changefreq = "weekly"
+    priority = "0.8"
+    model = Article
+    # Only include published articles
+    listed = {'is_published': True}
+    ordering = ('-published_at', 'id')
+    path = 'articles'
+    fields = ('slug', 'updated_at', 'is_published', 'published_at')
+
+class TrainingSitemap(FrontendSitemap):
     changefreq = "monthly"
     priority = "0.9"
+    model = Training
+    # Only include active trainings, ordered by position
+    listed = {'is_active': True}
+    ordering = ('position', 'id')
+    path = 'trainings'
+    fields = ('slug', 'updated_at', 'is_active', 'position')
 
-    def items(self):
-        # Only include active trainings, ordered by position
-        return Training.objects.filter(is_active=True).order_by('position', 'id')
-    
-    def lastmod(self, obj):
-        return obj.updated_at
-    
-    def get_urls(self, site=None, **kwargs):
-        site_url = getattr(settings, 'SITE_URL', '')
-        for item in self.items():
-            yield {
-                'location': f"{site_url}/trainings/{item.slug}/",
-                'lastmod': self.lastmod(item),
-                'changefreq': self.changefreq,
-                'priority': self.priority,
-            }
-
-class EbookSitemap(Sitemap):
+class EbookSitemap(FrontendSitemap):
     changefreq = "monthly"
     priority = "0.7"
-
-    def items(self):
-        # Only include active ebooks, ordered by position
-        return Ebook.objects.filter(is_active=True).order_by('position', 'id')
-    
-    def lastmod(self, obj):
-        return obj.updated_at
-    
-    def get_urls(self, site=None, **kwargs):
-        site_url = getattr(settings, 'SITE_URL', '')
-        for item in self.items():
-            yield {
-                'location': f"{site_url}/ebooks/{item.slug}/",
-                'lastmod': self.lastmod(item),
-                'changefreq': self.changefreq,
-                'priority': self.priority,
-            }
+    model = Ebook
+    # Only include active ebooks, ordered by position
+    listed = {'is_active': True}
+    ordering = ('position', 'id')
+    path = 'ebooks'
+    fields = ('slug', 'updated_at', 'is_active', 'position')
 
 class StaticViewSitemap(Sitemap):
     priority = "0.5"
@@ -73,14 +74,17 @@ class StaticViewSitemap(Sitemap):
 
     def items(self):
         return ['homepage']
-    
+
+    def location(self, item):
+        return f"{settings.SITE_URL}/" # Adjust if other static pages exist
+
+    def lastmod(self, item):
+        return None
+
     def get_urls(self, site=None, **kwargs):
-        site_url = getattr(settings, 'SITE_URL', '')
         for item in self.items():
-            loc = f"{site_url}/" if item == 'homepage' else f"{site_url}/" # Adjust if other static pages exist
             yield {
-                'location': loc,
-                # 'lastmod': # Add lastmod if applicable for static pages
+                'location': self.location(item),
                 'changefreq': self.changefreq,
                 'priority': self.priority,
             }
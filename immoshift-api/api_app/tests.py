@@ -1,3 +1,1459 @@
-from django.test import TestCase
+import json
+import os
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import addModuleCleanup
+from unittest.mock import Mock, patch
+from bs4 import FeatureNotFound
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .fast_serializers import compile_serializer
+from .models import (
+    Article, Author, EbookDownload, EbookDownloadDaily, Ebook, EmailOutbox, LinkedInImportItem, LinkedInImportJob,
+    NotificationCursor, Paragraph, Testimonial, Training
+)
+from .serializers import (
+    ArticleListSerializer, ArticleDetailSerializer, TrainingListSerializer, TrainingDetailSerializer,
+    EbookSerializer, EbookDetailSerializer, TestimonialSerializer
+)
+from .utils import email_cache
+from .utils.backup import decompress_file
+from .utils.digest import CURSOR_NAME, protect_cursor_ids, queue_download_digest
+from .utils.http_client import HTTPClientError, cache_paths, fetch, prune_cache
+from .utils.images import build_variants
+from .utils import linkedin_import
+from .utils.linkedin_scraper import download_images, extract_post, scrape_linkedin_post
+from .utils.outbox import drain_outbox
+from .utils.query_budget import QueryBudgetExceeded
+from .utils.replication import GenerationBroken, WALShipper, list_generations, prune_generations, restore_database
+from .utils.sitemap_files import regenerate_pending
+from .utils.snapshots import ChunkStore, restore_snapshot
+from .utils.transactions import atomic_writes, write_transaction
+from .views import ArticleViewSet
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def setUpModule():
+    # Every test gets a locmem cache and temporary sitemap / HTTP cache directories, not the real ones
+    directory = tempfile.TemporaryDirectory(prefix='api_app-tests-')
+    addModuleCleanup(directory.cleanup)
+    storage = override_settings(
+        CACHES=LOCMEM_CACHES,
+        SITEMAP_DIR=os.path.join(directory.name, 'sitemaps'),
+        HTTP_CACHE_DIR=os.path.join(directory.name, 'http'),
+    )
+    storage.enable()
+    addModuleCleanup(storage.disable)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HomePageSnapshotTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        Testimonial.objects.create(name="Alice", role="Agent", avatar="testimonials/a.jpg", quote="Top")
+
+    def test_snapshot_served_without_queries(self):
+        first = self.client.get(reverse('home_page_data'))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()['testimonials']), 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(reverse('home_page_data'))
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(first.content, second.content)
+
+    def test_content_change_invalidates_snapshot(self):
+        self.client.get(reverse('home_page_data'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.create(title="Nouveau", slug="nouveau", excerpt="Extrait")
+
+        response = self.client.get(reverse('home_page_data'))
+        self.assertEqual([a['slug'] for a in response.json()['articles']], ['nouveau'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.article = Article.objects.create(title="Titre", slug="titre", excerpt="Extrait")
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        cached = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_read_endpoints_return_304(self):
+        for url in ['/home/', '/articles/', f'/articles/{self.article.pk}/', '/article/titre/',
+                    '/trainings/', '/ebooks/', '/rgpd/']:
+            with self.subTest(url=url):
+                self.assertRevalidates(url)
+
+    def test_content_change_changes_etag(self):
+        etag = self.client.get('/article/titre/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.save()
+        response = self.client.get('/article/titre/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_embedded_change_changes_last_modified(self):
+        from django.core.cache import cache
+        from .utils.content_cache import CONTENT_VERSION_KEY
+        long_ago = timezone.now() - timedelta(days=30)
+        Article.objects.filter(pk=self.article.pk).update(updated_at=long_ago)
+        cache.set(CONTENT_VERSION_KEY, ('old', long_ago), timeout=None)
+        last_modified = self.client.get('/article/titre/')['Last-Modified']
+
+        # A new paragraph doesn't touch the article's updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            Paragraph.objects.create(article=self.article, position=1, content="Nouveau")
+        response = self.client.get('/article/titre/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Nouveau', response.content.decode())
+
+    def test_vary_accept(self):
+        response = self.client.get('/article/titre/')
+        self.assertIn('Accept', response['Vary'])
+        self.assertIn('Accept', self.client.get('/article/titre/', HTTP_IF_NONE_MATCH=response['ETag'])['Vary'])
+        self.assertEqual(self.client.get('/article/missing/').status_code, 404)
+        response = self.client.get('/rgpd/')
+        self.assertIn('Accept', response['Vary'])
+        self.assertIn('Accept', self.client.get('/rgpd/', HTTP_IF_NONE_MATCH=response['ETag'])['Vary'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(name="Audrey")
+        self.article = Article.objects.create(title="Titre", slug="titre", excerpt="Extrait", author=author)
+        Paragraph.objects.create(article=self.article, position=1, title="P1", content="Texte")
+
+    def test_fields_and_omit(self):
+        data = self.client.get('/article/titre/?fields=title,paragraphs.content').json()
+        self.assertEqual(data, {'title': "Titre", 'paragraphs': [{'content': "Texte"}]})
+
+        data = self.client.get('/article/titre/?omit=paragraphs,author').json()
+        self.assertNotIn('paragraphs', data)
+        self.assertIn('excerpt', data)
+
+    def test_unrequested_relations_are_not_queried(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/article/titre/?fields=title')
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2)  # Last-Modified lookup + the article itself
+        self.assertNotIn('api_app_paragraph', ' '.join(selects))
+
+    def test_list_reads_author_in_one_query(self):
+        Article.objects.create(title="Deux", slug="deux", excerpt="Extrait", author=Author.objects.get())
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/articles/?fields=slug,author_name').json()['results']
+        self.assertEqual({a['author_name'] for a in data}, {"Audrey"})
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        published_at = timezone.now()
+        # Several articles share a publication date to exercise the id tie-breaker
+        for i in range(7):
+            Article.objects.create(
+                title=f"Article {i}", slug=f"article-{i}", excerpt="Extrait",
+                published_at=published_at - timedelta(days=i // 3)
+            )
+
+    def test_pages_walk_whole_table_in_order(self):
+        expected = list(Article.objects.order_by('-published_at', 'id').values_list('slug', flat=True))
+        slugs = []
+        url = '/articles/?limit=2'
+        while url:
+            data = self.client.get(url).json()
+            slugs += [a['slug'] for a in data['results']]
+            url = data['next']
+        self.assertEqual(slugs, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/articles/?limit=3').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/articles/?cursor=garbage').status_code, 404)
+
+    def test_home_limit(self):
+        data = self.client.get('/home/?limit=2').json()
+        self.assertEqual(len(data['articles']), 2)
+        rest = self.client.get(data['articles_next']).json()
+        self.assertEqual(len(rest['results']), 2)
+        self.assertNotIn('articles_next', self.client.get('/home/').json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Budgets are enforced by QueryBudgetMiddleware, so a plain GET is the assertion"""
+    def setUp(self):
+        author = Author.objects.create(name="Audrey")
+        for i in range(12):
+            article = Article.objects.create(title=f"Article {i}", slug=f"article-{i}", excerpt="Extrait", author=author)
+            Paragraph.objects.create(article=article, position=1, content="Texte")
+            ebook = Ebook.objects.create(
+                title=f"Ebook {i}", slug=f"ebook-{i}", description="Description",
+                cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf"
+            )
+            EbookDownload.objects.create(ebook=ebook, first_name="Jean", last_name="Dupont", email="jean@example.com")
+
+    def test_api_endpoints_within_budget(self):
+        for url in ['/home/', '/articles/', '/articles/1/', '/article/article-1/', '/paragraphs/',
+                    '/ebooks/', '/ebook/ebook-1/', '/testimonials/', '/rgpd/']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('X-DB-Queries', response)
+                self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_admin_changelists_within_budget(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        for model in ['article', 'paragraph', 'ebook', 'ebookdownload']:
+            with self.subTest(model=model):
+                self.assertEqual(self.client.get(f'/admin/api_app/{model}/').status_code, 200)
+
+    def test_exceeded_budget_raises(self):
+        with patch.object(ArticleViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/articles/')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FastSerializationParityTests(TestCase):
+    """The compiled serializers must render the exact bytes DRF renders"""
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        with_picture = Author.objects.create(name="Audrey Antonini", picture="authors/photo d'été.jpg")
+        without_picture = Author.objects.create(name="Jean")
+        for i, author in enumerate([with_picture, without_picture, None]):
+            article = Article.objects.create(
+                title=f"Article é {i}", slug=f"article-{i}", excerpt="Extrait", author=author,
+                image="articles/a.jpg" if i else "", source_url="https://www.linkedin.com/posts/x" if i else None,
+            )
+            Paragraph.objects.create(article=article, position=2, title="Deux", content="Texte", media_type='image', image="paragraphs/p.png")
+            Paragraph.objects.create(
+                article=article, position=1, media_type='video_file', video_file="paragraph_videos/v.mp4",
+                thumbnail="paragraph_thumbnails/t.jpg", file_size_mb=12.5
+            )
+        training = Training.objects.create(
+            title="Formation", slug="formation", short_description="Courte", image="trainings/t.jpg",
+            price=Decimal('1490.50'), duration="2 jours"
+        )
+        Paragraph.objects.create(training=training, position=1, content="Programme", media_type='video_url', video_url="https://youtu.be/x")
+        Training.objects.create(title="Gratuite", slug="gratuite", short_description="Courte", image="trainings/u.jpg", show_price=False)
+        Ebook.objects.create(title="Guide", slug="guide", description="Desc", cover_image="ebooks/covers/c.jpg", file="ebooks/files/g.pdf")
+        Testimonial.objects.create(name="Alice", role="Agent", avatar="testimonials/a.jpg", quote="Top", rating=4)
+        Author.objects.filter(pk=with_picture.pk).update(picture_variants={
+            'name': "authors/photo d'été.jpg", 'width': 640, 'height': 640,
+            'formats': {'webp': [[320, "authors/derivatives/photo d'été.jpg.320w.webp"],
+                                 [640, "authors/derivatives/photo d'été.jpg.640w.webp"]]},
+        })
+        Article.objects.filter(slug='article-1').update(image_variants={
+            'name': 'articles/a.jpg', 'width': 960, 'height': 540,
+            'formats': {'webp': [[960, 'articles/derivatives/a.jpg.960w.webp']],
+                        'jpeg': [[960, 'articles/derivatives/a.jpg.960w.jpg']]},
+        })
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def assertParity(self, serializer, queryset, request=None):
+        expected = self.render(serializer.data)
+        fast = compile_serializer(serializer)
+        self.assertEqual(self.render(fast.serialize_rows(fast.values_queryset(queryset), request)), expected)
+
+    def test_serializers_parity(self):
+        request = APIRequestFactory().get('/')
+        cases = [
+            (ArticleListSerializer, Article.objects.order_by('id')),
+            (ArticleDetailSerializer, Article.objects.order_by('id')),
+            (TrainingListSerializer, Training.objects.all()),
+            (TrainingDetailSerializer, Training.objects.all()),
+            (EbookSerializer, Ebook.objects.all()),
+            (EbookDetailSerializer, Ebook.objects.all()),
+            (TestimonialSerializer, Testimonial.objects.all()),
+        ]
+        for serializer_class, queryset in cases:
+            for context in [{}, {'request': Request(request)}]:
+                with self.subTest(serializer=serializer_class.__name__, request=bool(context)):
+                    serializer = serializer_class(queryset, many=True, context=context)
+                    self.assertParity(serializer, queryset, context.get('request'))
+
+    def test_sparse_fields_parity(self):
+        queryset = Article.objects.order_by('id')
+        serializer = ArticleDetailSerializer(queryset, many=True, fields='title,author.name,paragraphs.image')
+        self.assertParity(serializer, queryset)
+
+    def test_endpoints_parity(self):
+        urls = ['/home/', '/home/?limit=2', '/articles/?limit=2', '/articles/1/', '/article/article-2/',
+                '/trainings/', '/training/formation/', '/ebooks/', '/ebook/guide/', '/testimonials/',
+                '/article/article-0/?fields=title,paragraphs.content']
+        for url in urls:
+            with self.subTest(url=url):
+                from django.core.cache import cache
+                cache.clear()
+                with override_settings(FAST_SERIALIZATION=False):
+                    expected = self.client.get(url).content
+                cache.clear()
+                with override_settings(FAST_SERIALIZATION=True):
+                    self.assertEqual(self.client.get(url).content, expected)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BenchmarkCommandsTests(TestCase):
+    def test_seed_and_benchmark(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            call_command('seed_content', authors=2, articles=5, paragraphs=2, trainings=2, ebooks=2,
+                         testimonials=2, downloads=50, stdout=StringIO())
+            self.assertEqual(Article.objects.count(), 5)
+            self.assertEqual(EbookDownload.objects.count(), 50)
+
+            output = os.path.join(media_root, 'bench.json')
+            call_command('benchmark_api', iterations=2, warmup=0, output=output, stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+            # The admin-only routes with a staff user only
+            get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+            stdout = StringIO()
+            with override_settings(ADMIN_EMAIL='admin@example.com', ADMIN_NOTIFICATION_MODE='immediate'):
+                call_command('benchmark_api', iterations=2, warmup=0, output=output, include_writes=True,
+                             stdout=stdout)
+            with open(output) as f:
+                admin_report = json.load(f)
+        # The downloads posted, their emails (to the user and the admin) and counters are gone
+        self.assertIn("Removed 2 benchmark downloads and 4 queued emails", stdout.getvalue())
+        self.assertEqual(EbookDownload.objects.count(), 50)
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertEqual(sum(Ebook.objects.values_list('download_total', flat=True)), 50)
+
+        names = {result['name'] for result in report['results']}
+        self.assertTrue({'home_page_data', 'article-list', 'article_detail', 'rgpd_content', 'search_content'} <= names)
+        self.assertFalse({'ebook_download_stats', 'download_time_series'} & names)
+        self.assertTrue(all(result['p99_ms'] is not None for result in report['results']))
+        self.assertEqual([result['url'] for result in admin_report['results'] if result['status'] not in (200, 201)], [])
+        self.assertIn('download_ebook', {result['name'] for result in admin_report['results']})
+        self.assertEqual(
+            {result['name'] for result in admin_report['results'] if result['authenticated']},
+            {'ebook_download_stats', 'download_time_series'},
+        )
+        self.assertTrue(all('?q=' in result['url'] for result in admin_report['results']
+                            if result['name'] == 'search_content'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, QUERY_BUDGET_STRICT=True)
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.article = Article.objects.create(title="Réussir sa négociation", slug="negociation", excerpt="Conseils")
+        Paragraph.objects.create(article=self.article, position=1, content="Préparer l'estimation du <bien>")
+        self.training = Training.objects.create(
+            title="Prospection", slug="prospection", short_description="Trouver des mandats", image="t.jpg"
+        )
+        Article.objects.create(title="Brouillon négociation", slug="brouillon", excerpt="", is_published=False)
+
+    def search(self, query):
+        response = self.client.get('/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_prefix_and_accent_insensitive_match(self):
+        results = self.search('negoc')
+        self.assertEqual([(r['type'], r['slug']) for r in results], [('article', 'negociation')])
+        self.assertIn('<mark>négociation</mark>', results[0]['snippet'])
+
+    def test_whole_word_prefix(self):
+        Article.objects.create(title="Négocier sans brader", slug="negocier", excerpt="")
+        self.assertEqual([r['slug'] for r in self.search('négociation')], ['negociation'])
+        self.assertEqual({r['slug'] for r in self.search('negoci')}, {'negociation', 'negocier'})
+
+    def test_ranks_every_match(self):
+        # Many newer body-only matches don't push out an older title match
+        other = Article.objects.create(title="Divers", slug="divers", excerpt="")
+        Paragraph.objects.bulk_create([
+            Paragraph(article=other, position=i, content=f"Une négociation parmi d'autres {i}") for i in range(600)
+        ])
+        self.assertEqual(self.search('négociation')[0]['slug'], 'negociation')
+
+    def test_paragraph_hit_returns_parent_with_escaped_snippet(self):
+        results = self.search('estim')
+        self.assertEqual(results[0]['slug'], 'negociation')
+        self.assertIn('&lt;bien&gt;', results[0]['snippet'])
+
+    def test_index_follows_updates_and_deletes(self):
+        Training.objects.filter(pk=self.training.pk).update(short_description="Développer son réseau")
+        self.assertEqual(self.search('mandats'), [])
+        self.assertEqual(self.search('reseau')[0]['slug'], 'prospection')
+        self.article.delete()
+        self.assertEqual(self.search('estimation'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_app_search_index")
+        self.assertEqual(self.search('prospection'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('prospection')[0]['type'], 'training')
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/admin/api_app/article/', {'q': 'estim'})
+        self.assertContains(response, 'Réussir sa négociation')
+        self.assertNotContains(response, 'Brouillon')
+        response = self.client.get('/admin/api_app/paragraph/', {'q': 'estim'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_DERIVATIVE_WIDTHS=[320, 640, 1920], IMAGE_DERIVATIVE_FORMATS=['webp', 'jpeg'])
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, name='photo.jpg', size=(1000, 600)):
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, format='JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_never_upscale(self):
+        article = Article.objects.create(title="A", slug="a", excerpt="E", image=self.upload())
+        record = build_variants(article.image.name)
+        self.assertEqual([width for width, _ in record['formats']['webp']], [320, 640, 1000])
+        self.assertEqual((record['width'], record['height']), (1000, 600))
+        for variants in record['formats'].values():
+            for _, name in variants:
+                self.assertTrue(os.path.exists(os.path.join(self.media_root.name, name)))
+
+    def test_generated_on_save_and_exposed_as_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            article = Article.objects.create(title="A", slug="a", excerpt="E", image=self.upload())
+        article.refresh_from_db()
+        self.assertEqual(article.image_variants['name'], article.image.name)
+
+        srcset = self.client.get('/articles/').json()['results'][0]['image_srcset']
+        self.assertRegex(srcset['webp'], r'^http://testserver/media/articles/derivatives/photo\S*\.320w\.webp 320w, ')
+        self.assertIn('1000w', srcset['jpeg'])
+
+        # A new image replaces the derivatives of the previous one
+        old_files = [name for _, name in article.image_variants['formats']['webp']]
+        with self.captureOnCommitCallbacks(execute=True):
+            article.image = self.upload('other.jpg', (400, 300))
+            article.save()
+        article.refresh_from_db()
+        self.assertEqual([width for width, _ in article.image_variants['formats']['webp']], [320, 400])
+        self.assertFalse(any(os.path.exists(os.path.join(self.media_root.name, name)) for name in old_files))
+
+    def test_batch_command(self):
+        Testimonial.objects.create(name="T", role="R", avatar=self.upload(), quote="Q")
+        Ebook.objects.create(title="E", slug="e", description="D", cover_image=self.upload(), file="ebooks/files/e.pdf")
+        Training.objects.create(title="F", slug="f", short_description="C", image="trainings/missing.jpg")
+        for workers in (2, 0):
+            with self.subTest(workers=workers):
+                out = StringIO()
+                call_command('generate_image_derivatives', force=True, workers=workers, stdout=out)
+                self.assertIn('Generated derivatives for 2 image(s)', out.getvalue())
+                self.assertIn('(1 failed)', out.getvalue())
+        self.assertTrue(Ebook.objects.get().cover_image_variants['formats'])
+
+
+@override_settings(MEDIA_SENDFILE='')
+class MediaRangeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(self.media_root.name, 'paragraph_videos'))
+        self.content = bytes(range(256)) * 1024
+        with open(os.path.join(self.media_root.name, 'paragraph_videos', 'v.mp4'), 'wb') as f:
+            f.write(self.content)
+        self.url = '/media/paragraph_videos/v.mp4'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(self.body(response), self.content)
+
+    def test_single_range(self):
+        for header, start, end in [('bytes=100-199', 100, 199), ('bytes=-10', len(self.content) - 10, len(self.content) - 1),
+                                   ('bytes=262000-', 262000, len(self.content) - 1)]:
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{len(self.content)}')
+                self.assertEqual(self.body(response), self.content[start:end + 1])
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+
+    def test_multipart_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9, 50-59, 5-12')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = self.body(response)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-12/262144\r\n\r\n' + self.content[0:13], body)
+        self.assertIn(b'Content-Range: bytes 50-59/262144\r\n\r\n' + self.content[50:60], body)
+
+    def test_file_closed_without_iterating(self):
+        opened = []
+
+        def tracking_open(*args, **kwargs):
+            opened.append(open(*args, **kwargs))
+            return opened[-1]
+
+        with patch('api_app.views.open', tracking_open, create=True):
+            for header in ['bytes=0-9', 'bytes=0-9, 50-59']:
+                with self.subTest(header=header):
+                    # The client went away before the first chunk
+                    self.client.get(self.url, HTTP_RANGE=header).close()
+                    self.assertTrue(opened[-1].closed)
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=999999-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */262144')
+        # Malformed headers are ignored
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=10-5').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='items=0-5').status_code, 200)
+
+    def test_if_range_and_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_path_traversal_and_sendfile(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/paragraph_videos/').status_code, 404)
+        with override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/paragraph_videos/v.mp4')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ADMIN_EMAIL='admin@example.com', EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.ebook = Ebook.objects.create(
+            title="Guide", slug="guide", description="Description",
+            cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf"
+        )
+
+    def download(self):
+        return self.client.post('/download-ebook/', {
+            'ebook': self.ebook.pk, 'first_name': "Jean", 'last_name': "Dupont", 'email': "jean@example.com",
+        })
+
+    def test_download_queues_emails(self):
+        self.assertEqual(self.download().status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).count(), 2)
+
+        out = StringIO()
+        call_command('send_outbox', stdout=out)
+        self.assertIn("Sent 2 email(s)", out.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['admin@example.com', 'jean@example.com'])
+        confirmation = next(message for message in mail.outbox if message.to == ['jean@example.com'])
+        self.assertEqual(confirmation.alternatives[0][1], 'text/html')
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.STATUS_SENT).exists())
+
+    def test_queuing_error_rolls_back_download(self):
+        with patch('api_app.utils.email_utils.render_confirmation', side_effect=RuntimeError("template")):
+            with self.assertRaises(RuntimeError):
+                self.download()
+        self.assertFalse(EbookDownload.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_retry_backoff_and_dead_letter(self):
+        self.download()
+        connection = mail.get_connection()
+        with patch.object(connection, 'send_messages', side_effect=smtplib.SMTPServerDisconnected("down")):
+            with self.assertLogs('api_app.utils.outbox', 'WARNING'):
+                self.assertEqual(drain_outbox(connection=connection), {'sent': 0, 'retried': 2, 'dead': 0})
+            # Not due yet
+            self.assertEqual(drain_outbox(connection=connection)['retried'], 0)
+            entry = EmailOutbox.objects.first()
+            self.assertEqual(entry.attempts, 1)
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+
+            for attempt in range(2):
+                EmailOutbox.objects.update(next_attempt_at=timezone.now())
+                with self.assertLogs('api_app.utils.outbox', 'WARNING'):
+                    stats = drain_outbox(connection=connection)
+        self.assertEqual(stats['dead'], 2)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.STATUS_DEAD, attempts=3).count(), 2)
+        self.assertIn("SMTPServerDisconnected", EmailOutbox.objects.first().last_error)
+
+    def test_permanent_error_is_dead_lettered(self):
+        self.download()
+        connection = mail.get_connection()
+        refused = smtplib.SMTPRecipientsRefused({'jean@example.com': (550, b'No such user')})
+        with patch.object(connection, 'send_messages', side_effect=refused), self.assertLogs('api_app.utils.outbox'):
+            self.assertEqual(drain_outbox(connection=connection)['dead'], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ADMIN_EMAIL='admin@example.com', ADMIN_NOTIFICATION_MODE='digest')
+class AdminDigestTests(TestCase):
+    def setUp(self):
+        self.ebooks = [
+            Ebook.objects.create(title=f"Guide {i}", slug=f"guide-{i}", description="Description",
+                                 cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf")
+            for i in range(2)
+        ]
+
+    def download(self, ebook, email):
+        response = self.client.post('/download-ebook/', {
+            'ebook': ebook.pk, 'first_name': "Jean", 'last_name': "Dupont", 'email': email,
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def admin_emails(self):
+        return [message for message in mail.outbox if message.to == ['admin@example.com']]
+
+    def test_digest_groups_downloads_once(self):
+        self.download(self.ebooks[0], 'a@example.com')
+        self.download(self.ebooks[0], 'b@example.com')
+        self.download(self.ebooks[1], 'c@example.com')
+        self.assertFalse(EmailOutbox.objects.filter(kind='admin_download_notification').exists())
+
+        call_command('send_outbox', digest_now=True, stdout=StringIO())
+        [digest] = self.admin_emails()
+        self.assertIn("3 nouveau(x)", digest.subject)
+        self.assertIn("Guide 0 : 2 téléchargement(s)", digest.body)
+        self.assertIn("<c@example.com>", digest.body)
+
+        # Interval not over: nothing, then only the new download once forced
+        self.download(self.ebooks[1], 'd@example.com')
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(self.admin_emails()), 1)
+        call_command('send_outbox', digest_now=True, stdout=StringIO())
+        digest = self.admin_emails()[-1]
+        self.assertIn("1 nouveau(x)", digest.subject)
+        self.assertNotIn("a@example.com", digest.body)
+        self.assertEqual(NotificationCursor.objects.get(name=CURSOR_NAME).last_id, EbookDownload.objects.latest('id').id)
+
+    def test_deleted_latest_download_id_not_reused(self):
+        self.download(self.ebooks[0], 'a@example.com')
+        self.download(self.ebooks[0], 'b@example.com')
+        self.assertEqual(queue_download_digest(force=True), 2)
+        # RGPD erasure of the latest download, then a migration rebuilding the table
+        EbookDownload.objects.filter(email='b@example.com').delete()
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE sqlite_sequence SET seq = (SELECT MAX(id) FROM api_app_ebookdownload) "
+                           "WHERE name = 'api_app_ebookdownload'")
+        protect_cursor_ids(connection)
+
+        self.download(self.ebooks[1], 'c@example.com')
+        self.assertEqual(queue_download_digest(force=True), 1)
+        self.assertIn("<c@example.com>", EmailOutbox.objects.filter(kind='admin_download_digest').latest('id').body)
+
+    def test_new_cursor_skips_reported_downloads(self):
+        with override_settings(ADMIN_NOTIFICATION_MODE='immediate'):
+            self.download(self.ebooks[0], 'a@example.com')
+        self.assertEqual(EmailOutbox.objects.filter(kind='admin_download_notification').count(), 1)
+        # Switched to digest: only the downloads made since
+        self.download(self.ebooks[0], 'b@example.com')
+        self.assertEqual(NotificationCursor.objects.get(name=CURSOR_NAME).last_id,
+                         EbookDownload.objects.get(email='a@example.com').pk)
+        self.assertEqual(queue_download_digest(force=True), 1)
+
+    def test_stale_cursor_does_not_double_report(self):
+        self.download(self.ebooks[0], 'a@example.com')
+        self.assertEqual(queue_download_digest(force=True), 1)
+        # A worker that read the cursor before it moved must not report the same rows
+        stale = NotificationCursor(pk=NotificationCursor.objects.get().pk, name=CURSOR_NAME, last_id=0)
+        with patch('api_app.utils.digest.get_cursor', return_value=stale):
+            self.assertEqual(queue_download_digest(force=True), 0)
+        self.assertEqual(EmailOutbox.objects.filter(kind='admin_download_digest').count(), 1)
+
+
+class EmailCacheTests(TestCase):
+    def setUp(self):
+        self.static_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.static_dir.cleanup)
+        static = override_settings(STATICFILES_DIRS=[self.static_dir.name])
+        static.enable()
+        self.addCleanup(static.disable)
+        email_cache.clear()
+        self.addCleanup(email_cache.clear)
+        self.ebook = Ebook.objects.create(
+            title="Guide <Immo>", slug="guide", description="Description",
+            cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf"
+        )
+
+    def test_fragments_match_full_render(self):
+        text, html, has_logo = email_cache.render_confirmation(self.ebook, "Jean & <Marie>")
+        self.assertFalse(has_logo)
+        self.assertEqual(html, render_to_string(email_cache.CONFIRMATION_TEMPLATE, {
+            'first_name': "Jean & <Marie>", 'ebook_title': self.ebook.title, 'logo_cid': None,
+        }))
+        self.assertIn('Bonjour Jean & <Marie>,', text)
+        self.assertIn('"Guide <Immo>"', text)
+
+    def test_fragments_are_reused_and_invalidated(self):
+        email_cache.render_confirmation(self.ebook, "Jean")
+        template = email_cache.get_confirmation_template()
+        with patch.object(template, 'render', wraps=template.render) as render:
+            email_cache.render_confirmation(self.ebook, "Paul")
+            self.assertEqual(render.call_count, 0)
+            self.ebook.title = "Nouveau titre"
+            self.ebook.save()
+            text, html, _ = email_cache.render_confirmation(self.ebook, "Paul")
+            self.assertEqual(render.call_count, 1)
+        self.assertIn("Nouveau titre", html)
+
+    def test_logo_part_is_encoded_once(self):
+        from PIL import Image
+        os.makedirs(os.path.join(self.static_dir.name, 'images'))
+        with open(os.path.join(self.static_dir.name, 'images', 'logo.png'), 'wb') as f:
+            Image.new('RGB', (4, 4)).save(f, format='PNG')
+        email_cache.clear()
+        _, html, has_logo = email_cache.render_confirmation(self.ebook, "Jean")
+        self.assertTrue(has_logo)
+        self.assertIn('cid:logo_immoshift', html)
+        self.assertIs(email_cache.get_logo_part(), email_cache.get_logo_part())
+        self.assertEqual(email_cache.get_logo_part()['Content-ID'], '<logo_immoshift>')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.ebook = Ebook.objects.create(
+            title="Guide", slug="guide", description="Description",
+            cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf"
+        )
+        for email, consent in [('a@example.com', False), ('b@example.com', True), ('A@example.com', True)]:
+            self.add_download(email, consent)
+
+    def add_download(self, email, consent=False):
+        return EbookDownload.objects.create(
+            ebook=self.ebook, first_name="Jean", last_name="Dupont", email=email, consent_mailing=consent
+        )
+
+    def export(self, action, selected=None, query=''):
+        if selected is None:
+            selected = list(EbookDownload.objects.values_list('pk', flat=True))
+        response = self.client.post(f'/admin/api_app/ebookdownload/{query}', {
+            'action': action, '_selected_action': selected,
+        })
+        if not response.streaming:
+            return None
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return [line.split(',') for line in lines[1:]]
+
+    def test_streamed_exports(self):
+        rows = self.export('export_all_emails')
+        self.assertEqual([row[0] for row in rows], ['a@example.com', 'b@example.com', 'A@example.com'])
+        self.assertEqual(rows[1][3], 'Oui')
+        self.assertEqual([row[0] for row in self.export('export_consented_emails')], ['b@example.com', 'A@example.com'])
+        # Latest download of each address, whatever the case
+        self.assertEqual([row[0] for row in self.export('export_unique_emails')], ['b@example.com', 'A@example.com'])
+
+    def test_export_since_last_export(self):
+        self.assertEqual(len(self.export('export_new_emails')), 2)
+        self.assertIsNone(self.export('export_new_emails'))
+        self.add_download('c@example.com')
+        self.assertEqual([row[0] for row in self.export('export_new_emails')], ['c@example.com'])
+        # The cursor belongs to each admin
+        self.client.force_login(get_user_model().objects.create_superuser('other', 'other@example.com', 'pw'))
+        self.assertEqual(len(self.export('export_new_emails')), 3)
+
+    def test_new_emails_ignore_the_selection(self):
+        other_ebook = Ebook.objects.create(
+            title="Autre", slug="autre", description="Description",
+            cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf"
+        )
+        other = EbookDownload.objects.create(ebook=other_ebook, first_name="Jean", last_name="Dupont",
+                                             email='d@example.com')
+        self.assertEqual(len(self.export('export_new_emails')), 3)
+        self.add_download('e@example.com')
+        EbookDownload.objects.create(ebook=other_ebook, first_name="Jean", last_name="Dupont", email='f@example.com')
+        latest = self.add_download('g@example.com')
+        # Only the latest download ticked, filtered on one ebook: the lower ids of both ebooks come out too
+        rows = self.export('export_new_emails', [latest.pk], f'?ebook__id__exact={self.ebook.pk}')
+        self.assertEqual([row[0] for row in rows], ['e@example.com', 'f@example.com', 'g@example.com'])
+        # And the next export has the rows downloaded since, whatever is ticked
+        self.assertIsNone(self.export('export_new_emails', [other.pk]))
+        EbookDownload.objects.create(ebook=other_ebook, first_name="Jean", last_name="Dupont", email='h@example.com')
+        self.assertEqual([row[0] for row in self.export('export_new_emails', [latest.pk])], ['h@example.com'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DownloadStatsTests(TestCase):
+    def setUp(self):
+        self.ebooks = [
+            Ebook.objects.create(title=f"Guide {i}", slug=f"guide-{i}", description="Description",
+                                 cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf")
+            for i in range(2)
+        ]
+
+    def add_download(self, ebook, consent=False):
+        return EbookDownload.objects.create(
+            ebook=ebook, first_name="Jean", last_name="Dupont", email="jean@example.com", consent_mailing=consent
+        )
+
+    def snapshot(self):
+        return (
+            list(Ebook.objects.order_by('id').values_list('download_total', flat=True)),
+            sorted(EbookDownloadDaily.objects.filter(count__gt=0).values_list('ebook_id', 'date', 'count', 'consented_count')),
+        )
+
+    def test_counters_follow_downloads(self):
+        first = self.add_download(self.ebooks[0], consent=True)
+        self.add_download(self.ebooks[0])
+        self.add_download(self.ebooks[1])
+        today = timezone.localdate()
+        self.assertEqual(self.snapshot(), ([2, 1], [(self.ebooks[0].pk, today, 2, 1), (self.ebooks[1].pk, today, 1, 0)]))
+
+        # Moved to the other ebook, then deleted
+        first.ebook = self.ebooks[1]
+        first.save()
+        self.assertEqual(self.snapshot()[0], [1, 2])
+        first.delete()
+        self.assertEqual(self.snapshot(), ([1, 1], [(self.ebooks[0].pk, today, 1, 0), (self.ebooks[1].pk, today, 1, 0)]))
+
+        expected = self.snapshot()
+        EbookDownload.objects.bulk_create([EbookDownload(ebook=self.ebooks[1], first_name="A", last_name="B", email="a@b.fr")])
+        call_command('rebuild_download_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot()[0], [expected[0][0], expected[0][1] + 1])
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.add_download(self.ebooks[1])
+        self.assertEqual(self.client.get('/stats/ebooks/').status_code, 403)
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        data = self.client.get('/stats/ebooks/').json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual([ebook['slug'] for ebook in data['ebooks']], ['guide-1', 'guide-0'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DownloadTimeSeriesTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.ebooks = [
+            Ebook.objects.create(title=f"Guide {i}", slug=f"guide-{i}", description="Description",
+                                 cover_image="ebooks/covers/c.jpg", file="ebooks/files/f.pdf")
+            for i in range(2)
+        ]
+        self.today = timezone.localdate()
+        for ebook, email, consent in [(0, 'a@example.com', True), (0, 'A@example.com ', False), (1, 'a@example.com', False),
+                                      (1, 'b@example.com', True)]:
+            EbookDownload.objects.create(ebook=self.ebooks[ebook], first_name="Jean", last_name="Dupont",
+                                         email=email, consent_mailing=consent)
+
+    def counters(self):
+        return sorted(EbookDownloadDaily.objects.values_list(
+            'ebook_id', 'date', 'count', 'consented_count', 'new_ebook_lead_count', 'new_lead_count'
+        ))
+
+    def test_incremental_counters_match_rebuild(self):
+        expected = [(self.ebooks[0].pk, self.today, 2, 1, 1, 1), (self.ebooks[1].pk, self.today, 2, 1, 2, 1)]
+        self.assertEqual(self.counters(), expected)
+        call_command('rebuild_download_stats', stdout=StringIO())
+        self.assertEqual(self.counters(), expected)
+
+    def test_time_series(self):
+        response = self.client.get('/stats/downloads/', {'granularity': 'week'})
+        # Session, user, ebooks and the rollup, whatever the number of downloads
+        self.assertEqual(response['X-DB-Queries'], '4')
+        data = response.json()
+        # a@ for both ebooks and b@: three (email, ebook) pairs from two emails
+        self.assertEqual(data['totals'], {'count': 4, 'consented_count': 2, 'new_ebook_lead_count': 3,
+                                          'new_lead_count': 2, 'consent_rate': 0.5})
+        # Every week of the default 30 days is listed
+        self.assertGreaterEqual(len(data['periods']), 5)
+        self.assertEqual(sum(period['count'] for period in data['periods']), 4)
+        self.assertEqual([ebook['slug'] for ebook in data['ebooks']], ['guide-0', 'guide-1'])
+
+        data = self.client.get('/stats/downloads/', {
+            'start': self.today.isoformat(), 'end': self.today.isoformat(), 'ebook': 'guide-1',
+        }).json()
+        self.assertEqual(data['periods'][0]['count'], 2)
+        self.assertEqual(len(data['ebooks']), 1)
+        self.assertEqual(data['ebooks'][0]['series'][0]['new_ebook_lead_count'], 2)
+
+    def test_returning_email_is_not_a_new_lead(self):
+        EbookDownload.objects.filter(email='b@example.com').update(download_date=timezone.now() - timedelta(days=60))
+        call_command('rebuild_download_stats', stdout=StringIO())
+        EbookDownload.objects.create(ebook=self.ebooks[0], first_name="Jean", last_name="Dupont", email='b@example.com')
+        totals = self.client.get('/stats/downloads/').json()['totals']
+        # b@ is a new lead of guide-0 but was first seen 60 days ago, out of the range
+        self.assertEqual((totals['count'], totals['new_ebook_lead_count'], totals['new_lead_count']), (4, 3, 1))
+
+    def test_invalid_parameters(self):
+        for params in [{'start': 'hier'}, {'granularity': 'year'}, {'start': '2026-02-01', 'end': '2026-01-01'},
+                       {'start': '2024-01-01', 'end': '2026-01-01'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/stats/downloads/', params).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get('/stats/downloads/').status_code, 403)
+
+
+
+@override_settings(SITEMAP_MAX_URLS=2)
+class SitemapFilesTests(TestCase):
+    def setUp(self):
+        sitemap_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(sitemap_dir.cleanup)
+        settings_override = override_settings(SITEMAP_DIR=sitemap_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                Article.objects.create(title=f"Article {i}", slug=f"article-{i}", excerpt="Extrait",
+                                       published_at=now - timedelta(days=i))
+            self.draft = Article.objects.create(title="Brouillon", slug="brouillon", excerpt="Extrait", is_published=False)
+            Training.objects.create(title="Formation", slug="formation", short_description="Courte")
+
+    def test_paginated_files_served_without_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            index = self.client.get('/sitemap.xml')
+            first = self.client.get('/sitemap-articles.xml')
+            second = self.client.get('/sitemap-articles.xml?p=2')
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(index['Content-Type'], 'application/xml')
+        self.assertContains(index, '<loc>http://testserver/sitemap-articles.xml?p=2</loc>')
+        self.assertContains(index, '<loc>http://testserver/sitemap-trainings.xml</loc>')
+        content = b''.join(first.streaming_content).decode()
+        self.assertIn('/articles/article-0/</loc>', content)
+        self.assertIn('/articles/article-1/</loc>', content)
+        self.assertIn('/articles/article-2/</loc>', b''.join(second.streaming_content).decode())
+        self.assertNotIn('brouillon', content)
+
+        cached = self.client.get('/sitemap-articles.xml', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get('/sitemap-articles.xml?p=3').status_code, 404)
+        self.assertEqual(self.client.get('/sitemap-inconnu.xml').status_code, 404)
+
+    def test_regenerated_on_publish_relevant_changes(self):
+        # Not listed before nor after: nothing to render
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.draft.title = "Brouillon relu"
+            self.draft.save()
+        self.assertNotIn(regenerate_pending, callbacks)
+        # update_fields outside of the sitemap fields
+        with self.captureOnCommitCallbacks() as callbacks:
+            Article.objects.get(slug='article-0').save(update_fields=['title'])
+        self.assertNotIn(regenerate_pending, callbacks)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.is_published = True
+            self.draft.save()
+        self.assertEqual(self.client.get('/sitemap-articles.xml?p=2').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.filter(slug__in=['brouillon', 'article-1']).delete()
+            Article.objects.filter(slug='article-2').get().delete()
+        self.assertEqual(self.client.get('/sitemap-articles.xml?p=2').status_code, 404)
+        self.assertNotContains(self.client.get('/sitemap.xml'), 'sitemap-articles.xml?p=2')
+        content = b''.join(self.client.get('/sitemap-articles.xml').streaming_content).decode()
+        self.assertIn('article-0', content)
+        self.assertNotIn('article-1', content)
+
+
+class AtomicWritesTests(TransactionTestCase):
+    def view(self, request):
+        self.in_transaction = connection.in_atomic_block
+        return None
+
+    def test_only_unsafe_methods_are_atomic(self):
+        view = atomic_writes(self.view)
+        self.assertEqual(view._non_atomic_requests, {'default'})
+        factory = APIRequestFactory()
+        for method, in_transaction in [('get', False), ('head', False), ('options', False), ('post', True),
+                                       ('delete', True)]:
+            with self.subTest(method=method):
+                view(getattr(factory, method)('/'))
+                self.assertEqual(self.in_transaction, in_transaction)
+
+    def test_only_writes_begin_immediate(self):
+        def begins(queries):
+            return [query['sql'] for query in queries if query['sql'].startswith('BEGIN')]
+
+        view = atomic_writes(self.view)
+        with CaptureQueriesContext(connection) as queries:
+            view(APIRequestFactory().post('/'))
+        self.assertEqual(begins(queries), ['BEGIN IMMEDIATE'])
+        self.assertIsNone(connection.transaction_mode)
+
+        # The admin change form runs its GET in a transaction too, deferred
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(f'/admin/auth_app/customuser/{user.pk}/change/').status_code, 200)
+        self.assertEqual(begins(queries), ['BEGIN'])
+
+        with self.settings(SQLITE_WRITE_TRANSACTION_MODE=None), CaptureQueriesContext(connection) as queries:
+            with write_transaction():
+                pass
+        self.assertEqual(begins(queries), ['BEGIN'])
+
+    def test_applied_to_every_route(self):
+        for path in ['/articles/', '/home/', '/download-ebook/', '/sitemap.xml', '/admin/']:
+            with self.subTest(path=path):
+                match = resolve(path)
+                self.assertTrue(match.func.atomic_writes)
+                self.assertEqual(match.func._non_atomic_requests, {'default'})
+        # Still found by the query budgets
+        self.assertEqual(resolve('/download-ebook/').func.query_budget, 8)
+        self.assertIs(resolve('/articles/').func.cls, ArticleViewSet)
+
+
+class BackupDatabaseTests(TransactionTestCase):
+    def setUp(self):
+        self.backup_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.backup_dir.cleanup)
+
+    def test_online_compressed_backup(self):
+        Testimonial.objects.create(name="Alice", role="Agent", avatar="testimonials/a.jpg", quote="Top")
+        old = os.path.join(self.backup_dir.name, 'db.sqlite3_20000101_000000.bak')
+        open(old, 'w').close()
+        os.utime(old, (0, 0))
+
+        with override_settings(SQLITE_BACKUP_DIR=self.backup_dir.name):
+            call_command('backup_database', pages=1, pause=0, stdout=StringIO())
+
+        names = sorted(os.listdir(self.backup_dir.name))
+        self.assertEqual(len(names), 2)
+        backup, manifest = (os.path.join(self.backup_dir.name, name) for name in names)
+        self.assertTrue(backup.endswith('.bak.gz'))
+        with open(manifest) as f:
+            info = json.load(f)
+        restored = os.path.join(self.backup_dir.name, 'restored.sqlite3')
+        self.assertEqual(decompress_file(backup, restored), info['sha256'])
+        self.assertEqual(os.path.getsize(restored), info['size'])
+
+        conn = sqlite3.connect(restored)
+        try:
+            self.assertEqual(conn.execute("SELECT name FROM api_app_testimonial").fetchall(), [("Alice",)])
+        finally:
+            conn.close()
+
+
+class WALShippingTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+        settings_override = override_settings(SQLITE_BACKUP_DIR=self.dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.db_path = os.path.join(self.dir, 'live.sqlite3')
+        self.db = sqlite3.connect(self.db_path, isolation_level=None)
+        self.addCleanup(self.db.close)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE lead (id INTEGER PRIMARY KEY, email TEXT)")
+        self.storage = FileSystemStorage(location=os.path.join(self.dir, 'replica'))
+        self.shipper = WALShipper(self.db_path, storage=self.storage, checkpoint_pages=1)
+        self.addCleanup(self.shipper.close)
+
+    def add_leads(self, count):
+        for i in range(count):
+            self.db.execute("INSERT INTO lead (email) VALUES (?)", [f"{i}@example.com" * 50])
+
+    def restored_count(self, at=None):
+        restored = os.path.join(self.dir, 'restored.sqlite3')
+        restore_database(restored, at=at, storage=self.storage)
+        conn = sqlite3.connect(restored)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM lead").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_point_in_time_restore(self):
+        self.add_leads(5)
+        generation = self.shipper.step()
+        self.add_leads(10)
+        first = self.shipper.sync()
+
+        # Checkpointed once shipped: the next writer restarts the WAL, which is followed
+        index = self.shipper.index
+        self.assertTrue(self.shipper.checkpoint())
+        self.add_leads(20)
+        self.assertIsNone(self.shipper.step())
+        self.assertEqual(self.shipper.index, index + 1)
+        self.add_leads(1)
+        self.shipper.sync()
+
+        self.assertEqual(self.restored_count(first), 15)
+        self.assertEqual(self.restored_count(), 36)
+        self.assertEqual([name for name, _ in list_generations(self.storage)], [generation])
+
+    def test_lost_frames_start_a_new_generation(self):
+        self.add_leads(1)
+        generation = self.shipper.step()
+        self.add_leads(3)
+        # Checkpointed and restarted by someone else before being shipped
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.add_leads(2)
+        new_generation = self.shipper.step()
+        self.assertIsNotNone(new_generation)
+        self.assertNotEqual(new_generation, generation)
+        self.assertEqual(self.restored_count(), 6)
+
+        self.assertEqual(prune_generations(30, current=new_generation, storage=self.storage), [])
+        # With no retention, only the current generation serves restores
+        self.assertEqual(prune_generations(0, current=new_generation, storage=self.storage), [generation])
+        self.assertEqual([name for name, _ in list_generations(self.storage)], [new_generation])
+
+    def test_failed_start_leaves_no_generation(self):
+        with patch('api_app.utils.replication.backup_database', side_effect=OSError("disk full")):
+            with self.assertRaisesMessage(OSError, "disk full"):
+                self.shipper.step()
+        self.assertIsNone(self.shipper.generation)
+        self.assertIsNotNone(self.shipper.step())
+
+    def test_command_reraises_and_closes(self):
+        shipper = Mock(generation=None)
+        shipper.step.side_effect = GenerationBroken("storage down")
+        with patch('api_app.management.commands.replicate_database.WALShipper', return_value=shipper):
+            with self.assertRaisesMessage(GenerationBroken, "storage down"):
+                call_command('replicate_database', iterations=1, stdout=StringIO())
+        shipper.sync.assert_not_called()
+        shipper.close.assert_called_once_with()
+
+        # With a generation, the last sync runs and a failing one still closes the connections
+        shipper = Mock(generation='20260101T000000Z')
+        shipper.step.return_value = None
+        shipper.sync.side_effect = OSError("storage down")
+        with patch('api_app.management.commands.replicate_database.WALShipper', return_value=shipper):
+            with self.assertRaises(OSError):
+                call_command('replicate_database', iterations=1, stdout=StringIO())
+        shipper.close.assert_called_once_with()
+
+
+class BackupSnapshotTests(TransactionTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+        self.media_root = os.path.join(self.dir, 'media')
+        os.makedirs(os.path.join(self.media_root, 'ebooks'))
+        settings_override = override_settings(
+            BACKUP_STORE_DIR=os.path.join(self.dir, 'store'), BACKUP_CHUNK_SIZE=4096, MEDIA_ROOT=self.media_root,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.store = ChunkStore(os.path.join(self.dir, 'store'), 4096)
+
+    def write_media(self, relpath, content):
+        with open(os.path.join(self.media_root, relpath), 'wb') as f:
+            f.write(content)
+
+    def snapshot(self):
+        call_command('backup_snapshot', stdout=StringIO())
+        return self.store.read_manifest(self.store.manifest_names()[-1])
+
+    def restore(self, name):
+        output = tempfile.mkdtemp(dir=self.dir)
+        db_path = os.path.join(output, 'db.sqlite3')
+        restore_snapshot(name, db_path, os.path.join(output, 'media'), store=self.store)
+        conn = sqlite3.connect(db_path)
+        try:
+            names = [row[0] for row in conn.execute("SELECT name FROM api_app_testimonial ORDER BY name")]
+        finally:
+            conn.close()
+        with open(os.path.join(output, 'media', 'ebooks', 'guide.pdf'), 'rb') as f:
+            return names, f.read()
+
+    def test_incremental_deduplicated_snapshots(self):
+        Testimonial.objects.create(name="Alice", role="Agent", avatar="testimonials/a.jpg", quote="Top")
+        guide = os.urandom(10000)
+        self.write_media('ebooks/guide.pdf', guide)
+        self.write_media('ebooks/copy.pdf', guide)
+        first = self.snapshot()
+        self.assertEqual(first['stats']['hashed_files'], 2)
+        # The copy is stored once: its 3 chunks, those of the database
+        self.assertEqual(first['media']['ebooks/copy.pdf']['chunks'], first['media']['ebooks/guide.pdf']['chunks'])
+        database_chunks = set(first['database']['chunks'])
+        stored = sum(len(files) for _, _, files in os.walk(self.store.chunks_dir))
+        self.assertEqual(stored, len(database_chunks) + 3)
+
+        # Nothing changed: no media file read, the database chunks already stored
+        second = self.snapshot()
+        self.assertEqual(second['stats']['hashed_files'], 0)
+        self.assertEqual(second['stats']['written'], 0)
+
+        Testimonial.objects.create(name="Bob", role="Agent", avatar="testimonials/b.jpg", quote="Bien")
+        new_guide = guide[:8192] + os.urandom(100)
+        self.write_media('ebooks/guide.pdf', new_guide)
+        third = self.snapshot()
+        self.assertEqual(third['stats']['hashed_files'], 1)
+        self.assertEqual(third['media']['ebooks/guide.pdf']['chunks'][:2], first['media']['ebooks/guide.pdf']['chunks'][:2])
+
+        self.assertEqual(self.restore(first['name']), (["Alice"], guide))
+        self.assertEqual(self.restore(third['name']), (["Alice", "Bob"], new_guide))
+
+        # Expired: only the chunks the latest snapshot doesn't use are deleted
+        pruned = self.store.prune(0)
+        self.assertEqual(pruned['manifests'], [first['name'], second['name']])
+        self.assertGreaterEqual(pruned['chunks'], 1)
+        self.assertEqual(self.store.manifest_names(), [third['name']])
+        self.assertEqual(self.restore(third['name']), (["Alice", "Bob"], new_guide))
+
+
+class FakeLinkedInHandler(BaseHTTPRequestHandler):
+    hits = {}
+    post = (
+        b'<html><head><meta property="og:image" content="/image.jpg"></head><body>'
+        b'<div class="attributed-text-segment-list__content">Titre du post\nSecond ligne</div>'
+        b'<div class="base-main-feed-card__entity-lockup"><a class="link-styled">Alice</a>'
+        b'<img data-delayed-url="/avatar.jpg"></div></body></html>'
+    )
+
+    def do_GET(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path == '/flaky' and self.hits[self.path] == 1:
+            return self.answer(503, b'')
+        if self.path in ('/image.jpg', '/avatar.jpg'):
+            time.sleep(0.3)
+        if self.path == '/posts/post' and self.headers.get('If-None-Match') == '"v1"':
+            return self.answer(304, b'')
+        body = self.post if self.path == '/posts/post' else self.path.encode() * 1000
+        self.answer(200, body, {'ETag': '"v1"'} if self.path == '/posts/post' else {})
+
+    def answer(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPClientTests(SimpleTestCase):
+    def setUp(self):
+        FakeLinkedInHandler.hits = {}
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeLinkedInHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base_url = f"http://127.0.0.1:{server.server_port}"
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(HTTP_CACHE_DIR=cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_revalidated_cache_retries_and_size_limit(self):
+        first = fetch(f"{self.base_url}/posts/post")
+        self.assertFalse(first.from_cache)
+        second = fetch(f"{self.base_url}/posts/post")
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.read(), FakeLinkedInHandler.post)
+        self.assertEqual(FakeLinkedInHandler.hits['/posts/post'], 2)
+
+        # 503 then 200
+        self.assertEqual(fetch(f"{self.base_url}/flaky").read(), b'/flaky' * 1000)
+        self.assertEqual(FakeLinkedInHandler.hits['/flaky'], 2)
+        with self.assertRaises(HTTPClientError):
+            fetch(f"{self.base_url}/big", max_bytes=1000)
+
+    def test_prune_cache(self):
+        urls = [f"{self.base_url}/{name}" for name in ('flaky', 'avatar.jpg', 'image.jpg')]
+        for url in urls:
+            fetch(url)
+        # Unused for 40 days, then the oldest of the others
+        old = time.time() - 40 * 86400
+        for path in cache_paths(urls[0]):
+            os.utime(path, (old, old))
+        for path in cache_paths(urls[1]):
+            os.utime(path, (old + 86400 * 30, old + 86400 * 30))
+
+        self.assertEqual(prune_cache(max_bytes=10 ** 6), 1)
+        self.assertFalse(os.path.exists(cache_paths(urls[0])[0]))
+        self.assertEqual(prune_cache(max_bytes=15000), 1)
+        self.assertEqual([os.path.exists(cache_paths(url)[0]) for url in urls], [False, False, True])
+        self.assertEqual(prune_cache(max_bytes=0), 1)
+
+    def test_scraped_post_images_download_concurrently(self):
+        listing = {entry.name: entry.stat().st_mtime_ns for entry in os.scandir()}
+        data = scrape_linkedin_post(f"{self.base_url}/posts/post?utm_source=share")
+        self.assertEqual(data['title'], "Titre du post")
+        self.assertEqual(data['author_name'], "Alice")
+        # No debug file written to the working directory anymore
+        self.assertEqual({entry.name: entry.stat().st_mtime_ns for entry in os.scandir()}, listing)
+
+        start = time.perf_counter()
+        avatar, image = download_images([self.base_url + data['author_image_url'], self.base_url + data['image_url']])
+        self.assertLess(time.perf_counter() - start, 0.55)
+        self.addCleanup(avatar.close)
+        self.addCleanup(image.close)
+        self.assertEqual((avatar.name, image.name), ('avatar.jpg', 'image.jpg'))
+        self.assertEqual(image.read(), b'/image.jpg' * 1000)
+        self.assertEqual(download_images([None, '']), [None, None])
+
+
+class LinkedInExtractionTests(SimpleTestCase):
+    """The one-pass extractor on saved pages (api_app/fixtures/linkedin), with every parsing option"""
+    fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures', 'linkedin')
+    source_url = "https://www.linkedin.com/posts/x"
+
+    def extract_all(self, name):
+        with open(os.path.join(self.fixtures_dir, name), encoding='utf-8') as f:
+            html = f.read()
+        reference = extract_post(html, self.source_url, parser='html.parser', strained=False)
+        for parser in ('html.parser', 'lxml'):
+            for strained in (False, True):
+                try:
+                    data = extract_post(html, self.source_url, parser=parser, strained=strained)
+                except FeatureNotFound:
+                    continue  # lxml is optional
+                with self.subTest(page=name, parser=parser, strained=strained):
+                    self.assertEqual(data, reference)
+        return reference
+
+    def test_post_page(self):
+        data = self.extract_all('post.html')
+        self.assertEqual(data['title'], "Tu as déjà eu ce RDV où tout semblait aligné… mais le client te dit “je vais réfléchir”")
+        self.assertEqual(data['excerpt'], "👉 Ce n’est pas forcément ton offre qui est en cause.")
+        self.assertTrue(data['content'].startswith(data['title'] + "\n\n👉"))
+        self.assertIn('/feedshare-shrink_800/', data['image_url'])
+        self.assertEqual(data['published_at'], datetime(2025, 5, 2, 13, 0, 15, 591000, tzinfo=dt_timezone.utc))
+        self.assertEqual(data['author_name'], "Audrey A.")
+        self.assertTrue(data['author_headline'].startswith("Je suis le terrain."))
+        self.assertIn('/profile-displayphoto-shrink_400_400/', data['author_image_url'])
+        self.assertEqual(data['source_url'], self.source_url)
+
+    def test_structured_data_page(self):
+        data = self.extract_all('post-structured-data.html')
+        # No post text in the page: the articleBody of the second ld+json script
+        self.assertEqual(data['content'].split("\n"), [
+            "Trois questions à poser avant une estimation", "Pourquoi vendez-vous maintenant ?",
+            "Qu'avez-vous déjà essayé ?", "Qui d'autre décide avec vous ?",
+        ])
+        self.assertEqual(data['excerpt'], "Pourquoi vendez-vous maintenant ?")
+        self.assertEqual(data['image_url'], "https://media.licdn.com/dms/image/v2/C4E0BAQ/company-logo_200_200/0/logo.png")
+        self.assertEqual(data['published_at'], datetime(2025, 3, 14, 8, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual((data['author_name'], data['author_headline'], data['author_image_url']),
+                         ("ImmoShift", "Formations pour agents immobiliers", None))
+
+    def test_missing_content(self):
+        data = extract_post('<html><body><p>Connectez-vous</p></body></html>', self.source_url)
+        self.assertEqual(data, {'error': 'Could not extract content from the LinkedIn post.', 'source_url': self.source_url})
+
+    def test_benchmark_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('benchmark_linkedin_extraction', iterations=1, output=output, stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+        self.assertEqual({result['page'] for result in report['results']}, {'post.html', 'post-structured-data.html'})
+        self.assertFalse([result for result in report['results'] if result['differences']])
+
+
+class LinkedInBulkImportTests(TestCase):
+    def setUp(self):
+        self.imported = Article.objects.create(
+            title="Ancien", slug="ancien", excerpt="Extrait", source_url="https://www.linkedin.com/posts/ancien"
+        )
+
+    def fake_scrape(self, url):
+        if url.endswith('/broken'):
+            return {'error': 'Could not extract content from the LinkedIn post.', 'source_url': url}
+        return {
+            'title': "Mon post", 'excerpt': "Extrait", 'content': f"Mon post\n{url}", 'image_url': None,
+            'published_at': timezone.now(), 'source_url': url, 'author_name': "Alice", 'author_headline': "Agent",
+            'author_image_url': None,
+        }
+
+    def test_bulk_import_job(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        urls = [
+            "https://www.linkedin.com/posts/ancien?utm_source=share",
+            "https://www.linkedin.com/posts/nouveau-1",
+            "https://www.linkedin.com/posts/nouveau-2",
+            "https://www.linkedin.com/posts/nouveau-2",
+            "https://www.linkedin.com/posts/broken",
+        ]
+        response = self.client.post(reverse('admin:article_import_linkedin_bulk'), {'linkedin_urls': "\n".join(urls)})
+        job = LinkedInImportJob.objects.get()
+        self.assertRedirects(response, reverse('admin:article_import_linkedin_job', args=[job.pk]))
+        self.assertEqual(job.items.count(), 4)
+        progress = self.client.get(reverse('admin:article_import_linkedin_job', args=[job.pk]), {'format': 'json'}).json()
+        self.assertEqual(progress['counts']['pending'], 4)
+
+        with patch.object(linkedin_import, 'scrape_linkedin_post', side_effect=self.fake_scrape), \
+                patch.object(linkedin_import, 'download_images', return_value=[None, None]) as download_images, \
+                patch.object(linkedin_import, 'save_batch', wraps=linkedin_import.save_batch) as save_batch:
+            stats = linkedin_import.run_imports(workers=2, batch_size=2)
+        self.assertEqual(stats, {'imported': 2, 'skipped': 1, 'failed': 1})
+        # The post already imported isn't fetched, the others are committed two at a time
+        self.assertEqual(download_images.call_count, 2)
+        self.assertEqual([len(call.args[0]) for call in save_batch.call_args_list], [2, 1])
+
+        progress = self.client.get(reverse('admin:article_import_linkedin_job', args=[job.pk]), {'format': 'json'}).json()
+        self.assertTrue(progress['finished'])
+        self.assertEqual(progress['counts'], {'pending': 0, 'running': 0, 'imported': 2, 'skipped': 1, 'failed': 1})
+        self.assertEqual(progress['items'][0]['article_id'], self.imported.pk)
+        self.assertEqual(progress['items'][0]['article_url'],
+                         reverse('admin:api_app_article_change', args=[self.imported.pk]))
+        self.assertIn('Could not extract', progress['items'][3]['error'])
+        self.assertIsNone(progress['items'][3]['article_url'])
+        self.assertEqual(
+            sorted(Article.objects.filter(author__name="Alice").values_list('slug', flat=True)), ['mon-post', 'mon-post-2']
+        )
+        self.assertEqual(self.client.get(reverse('admin:article_import_linkedin_job', args=[job.pk])).status_code, 200)
+        self.assertContains(self.client.get(reverse('admin:article_import_linkedin')), f"#{job.pk}")
+
+    def test_claimed_items_are_leased(self):
+        linkedin_import.enqueue_import(["https://www.linkedin.com/posts/a", "https://www.linkedin.com/posts/b"])
+        self.assertEqual(len(linkedin_import.claim_items()), 2)
+        self.assertEqual(linkedin_import.claim_items(), [])
+        # Worker killed: taken again once the lease is over
+        LinkedInImportItem.objects.update(lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(linkedin_import.claim_items()), 2)
@@ -1,6 +1,5 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from django.contrib.sitemaps.views import sitemap
 from . import views
 from .sitemaps import ArticleSitemap, TrainingSitemap, EbookSitemap, StaticViewSitemap
 
@@ -35,10 +34,17 @@ urlpatterns = [
     # Ebook download route
     path('download-ebook/', views.download_ebook, name='download_ebook'),
 
+    # Full-text search over articles and trainings
+    path('search/', views.search_content, name='search_content'),
+
     # Legal notice and RGPD content route
     path('rgpd/', views.rgpd_content, name='rgpd_content'),
+
+    # Admin-only statistics
+    path('stats/ebooks/', views.ebook_download_stats, name='ebook_download_stats'),
+    path('stats/downloads/', views.download_time_series, name='download_time_series'),
     
-    # Sitemap configuration
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
-    path('sitemap-<section>.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    # Sitemap files, rendered by api_app/utils/sitemap_files.py
+    path('sitemap.xml', views.serve_sitemap, name='sitemap_index'),
+    path('sitemap-<section>.xml', views.serve_sitemap, name='sitemap_section'),
 ]
\ No newline at end of file
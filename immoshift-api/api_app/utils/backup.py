@@ -0,0 +1,148 @@
+"""
+Online backups of the SQLite database.
+
+The copy is made with SQLite's backup API from a connection of its own,
+`pages` pages at a time with a pause in between: each step is a short read,
+so requests keep writing while the backup runs (in WAL mode readers never
+block writers, in rollback journal mode a write only waits for the step in
+progress). The result is a consistent snapshot whatever is in the -wal file
+or the journal. A write made by another connection between two steps makes
+SQLite restart the copy, which a long pause makes more likely on a busy
+database.
+
+The copy is then checked with PRAGMA integrity_check and compressed in
+chunks, hashing the database bytes on the way, so that a restore can verify
+what it decompressed.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from urllib.request import pathname2url
+
+CHUNK_SIZE = 1024 * 1024
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst', 'none': ''}
+
+class BackupError(Exception):
+    """The backup could not be made or did not pass its checks"""
+
+def copy_database(source, destination, pages=256, pause=0.01, timeout=5):
+    """
+    Copies the database `source` (a path or a file: URI) to the path `destination`.
+
+    Returns:
+        int: number of pages copied
+    """
+    progress = {'total': 0}
+
+    def step(status, remaining, total):
+        progress['total'] = total
+        if remaining and pause:
+            time.sleep(pause)
+
+    src = sqlite3.connect(source, uri=True, timeout=timeout)
+    try:
+        dst = sqlite3.connect(destination)
+        try:
+            src.backup(dst, pages=pages, progress=step)
+            # The copy inherits the journal mode, a standalone file is easier to move around
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    return progress['total']
+
+def integrity_check(path):
+    """Raises BackupError unless the database at `path` passes PRAGMA integrity_check"""
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if problems != ['ok']:
+        raise BackupError(f"Integrity check failed on {path}: {'; '.join(problems[:5])}")
+
+def open_compressed(path, mode, compression):
+    """File object reading or writing `path` (or an open binary file) through `compression`"""
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise BackupError("zstd compression needs the zstandard package")
+        if 'w' in mode:
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=10, threads=-1))
+        return zstandard.open(path, mode)
+    return path if hasattr(path, 'read') else open(path, mode)
+
+def compress_file(source, destination, compression='gzip'):
+    """
+    Writes `source` to `destination` compressed.
+
+    Returns:
+        str: SHA-256 of the uncompressed bytes
+    """
+    digest = hashlib.sha256()
+    with open(source, 'rb') as src, open_compressed(destination, 'wb', compression) as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+def decompress_file(source, destination, compression='gzip'):
+    """Inverse of compress_file(), returns the SHA-256 of the bytes written"""
+    digest = hashlib.sha256()
+    with open_compressed(source, 'rb', compression) as src, open(destination, 'wb') as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+def compression_of(path):
+    """The compression a backup file name ends with"""
+    for compression, extension in COMPRESSIONS.items():
+        if extension and path.endswith(extension):
+            return compression
+    return 'none'
+
+def backup_database(source, destination, compression='gzip', pages=256, pause=0.01):
+    """
+    Backs up `source` to `destination` (the compression's extension is
+    appended): online copy, integrity check, compression.
+
+    Returns:
+        dict: the backup's path, sizes, page count, SHA-256 and duration
+    """
+    start = time.perf_counter()
+    destination += COMPRESSIONS[compression]
+    temp_path = f"{destination}.tmp"
+    try:
+        page_count = copy_database(source, temp_path, pages=pages, pause=pause)
+        integrity_check(temp_path)
+        size = os.path.getsize(temp_path)
+        if compression == 'none':
+            sha256 = compress_file(temp_path, os.devnull, 'none')  # Only hashes
+            shutil.move(temp_path, destination)
+        else:
+            sha256 = compress_file(temp_path, destination, compression)
+    except BaseException:
+        # No half-written backup left behind
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return {
+        'path': destination,
+        'compression': compression,
+        'size': size,
+        'compressed_size': os.path.getsize(destination),
+        'pages': page_count,
+        'sha256': sha256,
+        'duration': round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,72 @@
+import hashlib
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from .content_cache import get_content_version, get_content_changed_at
+
+def content_etag(request, *args, **kwargs):
+    """
+    ETag derived from the global content version, so no query is needed.
+
+    The path (with query string) and Accept header are mixed in because the
+    same content version renders differently per URL and per renderer.
+    """
+    key = '|'.join([
+        get_content_version(),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+def content_last_modified(request, *args, **kwargs):
+    """Last-Modified for list payloads: when public content last changed."""
+    return get_content_changed_at()
+
+def object_last_modified(queryset, lookup_field='pk', lookup_url_kwarg=None):
+    """
+    Builds a Last-Modified function for one object's payload.
+
+    The payload embeds the paragraphs and the author, whose edits (and
+    deletions) don't touch the object's `updated_at`: the latest of it and
+    of the last content change is used. The object is still looked up, so a
+    missing one gets no Last-Modified and its 404.
+
+    Args:
+        queryset: Queryset the object is looked up in (e.g. published articles)
+        lookup_field: Model field matched against the URL keyword argument
+        lookup_url_kwarg: URL keyword argument name, defaults to lookup_field
+
+    Returns:
+        callable: Function suitable for `condition(last_modified_func=...)`
+    """
+    lookup_url_kwarg = lookup_url_kwarg or lookup_field
+
+    def last_modified(request, *args, **kwargs):
+        if lookup_url_kwarg not in kwargs:
+            return None
+        updated_at = (
+            queryset.filter(**{lookup_field: kwargs[lookup_url_kwarg]})
+            .values_list('updated_at', flat=True)
+            .first()
+        )
+        if updated_at is None:
+            return None
+        return max(updated_at, get_content_changed_at())
+    return last_modified
+
+def content_validators(last_modified_func):
+    """
+    condition() with the content ETag and `last_modified_func`. The ETag
+    depends on the Accept header, hence Vary: Accept, 304s included.
+    """
+    validators = condition(etag_func=content_etag, last_modified_func=last_modified_func)
+
+    def decorator(view):
+        return vary_on_headers('Accept')(validators(view))
+    return decorator
+
+# Validators for list and home payloads
+content_condition = content_validators(content_last_modified)
+
+def object_condition(queryset, lookup_field='pk', lookup_url_kwarg=None):
+    """Validators for detail routes: content ETag plus the payload's last change."""
+    return content_validators(object_last_modified(queryset, lookup_field, lookup_url_kwarg))
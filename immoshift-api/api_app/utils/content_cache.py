@@ -0,0 +1,61 @@
+import uuid
+from django.core.cache import cache
+from django.utils import timezone
+
+CONTENT_VERSION_KEY = 'content_version'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24  # Snapshots are keyed by version, so they never go stale
+
+# Per-process copy of the last snapshot built for each name: {name: (version, blob)}
+_local_snapshots = {}
+
+def _get_content_state():
+    """Returns the shared (version, changed_at) pair, creating it if missing."""
+    state = cache.get(CONTENT_VERSION_KEY)
+    if state is None:
+        cache.add(CONTENT_VERSION_KEY, (uuid.uuid4().hex, timezone.now()), timeout=None)
+        state = cache.get(CONTENT_VERSION_KEY)
+    return state
+
+def get_content_version():
+    """
+    Returns the current global content version.
+
+    The version is an opaque token shared by every worker through the cache.
+    A fresh random token is used (instead of a counter) so a cleared cache can
+    never bring back a version that an old snapshot was built for.
+    """
+    return _get_content_state()[0]
+
+def get_content_changed_at():
+    """Returns when the content version last changed (used as Last-Modified)."""
+    return _get_content_state()[1]
+
+def bump_content_version():
+    """Invalidates every snapshot by switching to a new content version."""
+    cache.set(CONTENT_VERSION_KEY, (uuid.uuid4().hex, timezone.now()), timeout=None)
+
+def get_snapshot(name, builder):
+    """
+    Returns the pre-serialized bytes for `name` at the current content version.
+
+    Args:
+        name: Unique name of the payload (include any request parameters)
+        builder: Callable returning the bytes blob, only called on a cache miss
+
+    Returns:
+        bytes: The serialized payload
+    """
+    version = get_content_version()
+
+    local = _local_snapshots.get(name)
+    if local and local[0] == version:
+        return local[1]
+
+    cache_key = f'snapshot:{name}:{version}'
+    blob = cache.get(cache_key)
+    if blob is None:
+        blob = builder()
+        cache.set(cache_key, blob, timeout=SNAPSHOT_TIMEOUT)
+
+    _local_snapshots[name] = (version, blob)
+    return blob
@@ -0,0 +1,60 @@
+"""
+Streaming CSV exports of the ebook leads.
+
+Rows are read with a server-side chunked iterator over values_list() and
+written to the response as they come, so neither the queryset nor the CSV
+is ever held in memory whatever the size of the lead table.
+"""
+import csv
+from django.db.models import Max
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from api_app.models import NotificationCursor
+
+CHUNK_SIZE = 2000
+LEAD_COLUMNS = ['Email', 'Prénom', 'Nom', 'Consentement', 'Date']
+LEAD_FIELDS = ('email', 'first_name', 'last_name', 'consent_mailing', 'download_date')
+
+class Echo:
+    """File-like object handing back what csv.writer writes, one line at a time"""
+    def write(self, value):
+        return value
+
+def unique_by_email(queryset):
+    """Keeps the latest download of each email (case-insensitive), in SQL"""
+    latest_ids = (
+        queryset.order_by()
+        .values(email_key=Lower('email'))
+        .annotate(latest_id=Max('id'))
+        .values('latest_id')
+    )
+    return queryset.filter(id__in=latest_ids)
+
+def iter_lead_rows(queryset, on_complete=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(LEAD_COLUMNS)
+    rows = queryset.order_by('id').values_list(*LEAD_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    for email, first_name, last_name, consent_mailing, download_date in rows:
+        yield writer.writerow([
+            email,
+            first_name,
+            last_name,
+            'Oui' if consent_mailing else 'Non',
+            download_date.strftime('%Y-%m-%d %H:%M'),
+        ])
+    # Only once the whole file went out
+    if on_complete is not None:
+        on_complete()
+
+def stream_leads_csv(queryset, filename, on_complete=None):
+    response = StreamingHttpResponse(iter_lead_rows(queryset, on_complete), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def export_cursor_name(user):
+    return f'lead_export_user_{user.pk}'
+
+def get_export_cursor(user):
+    """High-water mark of the downloads already exported by this admin"""
+    cursor, _ = NotificationCursor.objects.get_or_create(name=export_cursor_name(user))
+    return cursor
@@ -0,0 +1,135 @@
+"""
+Admin digest of the ebook downloads.
+
+With ADMIN_NOTIFICATION_MODE = "digest", downloads don't queue one admin
+email each. `manage.py send_outbox` calls `queue_download_digest()` which,
+every ADMIN_DIGEST_INTERVAL_MINUTES, renders one summary of the downloads
+since the last digest, grouped per ebook, and queues it in the outbox.
+
+The `admin_download_digest` NotificationCursor holds the id of the last
+reported download. The digest email and the cursor move are written in the
+same transaction, and the cursor is moved with a conditional UPDATE, so a
+download is reported exactly once even if two workers run at the same time.
+Ids grow with commit order since SQLite has a single writer, and are never
+reused: the table is AUTOINCREMENT, and `protect_cursor_ids()` keeps its
+sequence ahead of the cursors when a migration rebuilds it.
+"""
+import datetime
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from api_app.models import EbookDownload, NotificationCursor
+from .outbox import enqueue_email
+
+CURSOR_NAME = 'admin_download_digest'
+DEFAULT_INTERVAL_MINUTES = 15
+
+def is_digest_mode():
+    return getattr(settings, 'ADMIN_NOTIFICATION_MODE', 'immediate') == 'digest'
+
+def get_interval():
+    return datetime.timedelta(minutes=getattr(settings, 'ADMIN_DIGEST_INTERVAL_MINUTES', DEFAULT_INTERVAL_MINUTES))
+
+def get_cursor():
+    """
+    The digest cursor, created on first use after the downloads so far, which
+    the immediate mode reported.
+    """
+    cursor = NotificationCursor.objects.filter(name=CURSOR_NAME).first()
+    if cursor is None:
+        last_id = EbookDownload.objects.order_by('-id').values_list('id', flat=True).first()
+        cursor, _ = NotificationCursor.objects.get_or_create(name=CURSOR_NAME, defaults={'last_id': last_id or 0})
+    return cursor
+
+def start_cursor(before_id):
+    """
+    Creates the cursor right before the download `before_id` unless it exists,
+    in one statement. Called for each download in digest mode, so the ones
+    made before the first digest are reported.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {NotificationCursor._meta.db_table} (name, last_id) "
+            f"SELECT %s, COALESCE(MAX(id), 0) FROM {EbookDownload._meta.db_table} WHERE id < %s "
+            f"ON CONFLICT (name) DO NOTHING",
+            [CURSOR_NAME, before_id],
+        )
+
+def protect_cursor_ids(using):
+    """
+    Raises the AUTOINCREMENT sequence of the downloads to the highest cursor.
+
+    SQLite never reuses an AUTOINCREMENT id, but a migration rebuilding the
+    table restarts the sequence at the highest id left: after deleting the
+    latest downloads (RGPD erasure), new ones would get ids the cursors
+    (digest, lead exports) already passed and never be reported.
+    """
+    if using.vendor != 'sqlite':
+        return
+    downloads, cursors = EbookDownload._meta.db_table, NotificationCursor._meta.db_table
+    # sqlite_sequence exists with the first AUTOINCREMENT table
+    if not {downloads, cursors} <= set(using.introspection.table_names()):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(f"SELECT MAX(last_id) FROM {cursors}")
+        last_id = cursor.fetchone()[0] or 0
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [downloads])
+        row = cursor.fetchone()
+        if row is None:
+            if last_id:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [downloads, last_id])
+        elif row[0] < last_id:
+            cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [last_id, downloads])
+
+def render_digest(downloads, start, end):
+    """Renders the summary of `downloads` (ordered by ebook then id), returns (subject, body)"""
+    by_ebook = defaultdict(list)
+    titles = {}
+    for download in downloads:
+        by_ebook[download['ebook_id']].append(download)
+        titles[download['ebook_id']] = download['ebook__title']
+    ebooks = sorted(
+        ({'title': titles[ebook_id], 'downloads': rows} for ebook_id, rows in by_ebook.items()),
+        key=lambda ebook: (-len(ebook['downloads']), ebook['title'])
+    )
+    total = sum(len(ebook['downloads']) for ebook in ebooks)
+    subject = f"{total} nouveau(x) téléchargement(s) d'ebook"
+    body = render_to_string('emails/admin_download_digest.txt', {
+        'ebooks': ebooks, 'total': total, 'start': start, 'end': end,
+    })
+    return subject, body
+
+def queue_download_digest(force=False):
+    """
+    Queues the digest of the downloads not reported yet, if the interval is over.
+
+    Returns:
+        int: number of downloads in the queued digest, 0 if nothing was queued
+    """
+    admin_email = settings.ADMIN_EMAIL
+    if not admin_email:
+        return 0
+    cursor = get_cursor()
+    now = timezone.now()
+    if not force and cursor.last_run_at and now - cursor.last_run_at < get_interval():
+        return 0
+
+    downloads = list(
+        EbookDownload.objects.filter(id__gt=cursor.last_id)
+        .order_by('ebook_id', 'id')
+        .values('id', 'ebook_id', 'ebook__title', 'first_name', 'last_name', 'email', 'phone',
+                'consent_mailing', 'download_date')
+    )
+    with transaction.atomic():
+        high_water_mark = max((download['id'] for download in downloads), default=cursor.last_id)
+        moved = NotificationCursor.objects.filter(pk=cursor.pk, last_id=cursor.last_id).update(
+            last_id=high_water_mark, last_run_at=now
+        )
+        if not moved or not downloads:
+            # Another worker took this window, or there is nothing to report
+            return 0
+        subject, body = render_digest(downloads, cursor.last_run_at, now)
+        enqueue_email('admin_download_digest', subject, body, [admin_email])
+    return len(downloads)
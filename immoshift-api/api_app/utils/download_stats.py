@@ -0,0 +1,235 @@
+"""
+Denormalized ebook download counters.
+
+Each EbookDownload insert or delete (signals.py) moves, in the same
+transaction, `Ebook.download_total` and the EbookDownloadDaily row of the
+ebook for that day, upserted in a single statement. The admin and the stats
+endpoints read those instead of counting EbookDownload rows.
+
+New leads are counted when they happen: an insert also registers the
+(email, ebook) pair in EbookLead. If the pair is new the download counts in
+`new_ebook_lead_count` (a new lead of that ebook), and if the email had
+never downloaded anything it counts in `new_lead_count` (a new lead
+overall). These are emails first seen in a period, not the distinct emails
+that downloaded in it: an email downloading again later is in `count`
+only. Deleting a download doesn't take them back, a lead stays acquired on
+the day it was acquired until the next rebuild. Emails are compared with
+SQL LOWER(TRIM()), like the CSV export.
+
+Writes that bypass the signals (bulk_create, raw SQL, queryset.update()
+of ebook/consent) must be followed by `manage.py rebuild_download_stats`.
+"""
+import datetime
+from collections import defaultdict
+from itertools import islice
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Lower, TruncDate, TruncMonth, TruncWeek, Trim
+from django.utils import timezone
+
+GRANULARITIES = {
+    'day': F('date'),
+    'week': TruncWeek('date'),
+    'month': TruncMonth('date'),
+}
+# Period start of a date, as ISO text, for the SQLite path of download_series()
+PERIOD_SQL = {
+    'day': "date(date)",  # Not the bare column, which the sqlite3 module would convert to a date
+    'week': "date(date, '-' || ((CAST(strftime('%%w', date) AS INTEGER) + 6) %% 7) || ' days')",
+    'month': "strftime('%%Y-%%m-01', date)",
+}
+COUNTERS = ('count', 'consented_count', 'new_ebook_lead_count', 'new_lead_count')
+BATCH_SIZE = 1000
+
+def register_lead(download):
+    """
+    Records the (email, ebook) pair of a new download.
+
+    Returns:
+        tuple: (first download of this ebook by the email, first download of any ebook by the email)
+    """
+    from api_app.models import EbookLead
+
+    table = EbookLead._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {table} WHERE email_key = LOWER(TRIM(%s)) LIMIT 1", [download.email])
+        seen = cursor.fetchone() is not None
+        cursor.execute(
+            f"INSERT INTO {table} (email_key, ebook_id, first_download_at) VALUES (LOWER(TRIM(%s)), %s, %s) "
+            f"ON CONFLICT (email_key, ebook_id) DO NOTHING",
+            [download.email, download.ebook_id, connection.ops.adapt_datetimefield_value(download.download_date)],
+        )
+        return cursor.rowcount == 1, not seen
+
+def record_download(download, delta=1, count_lead=False):
+    """
+    Adds `delta` (1 on insert, -1 on delete) to the counters of `download`.
+    With `count_lead`, also counts it as a new lead of the ebook / new lead if it is one.
+    """
+    from api_app.models import Ebook, EbookDownloadDaily
+
+    new_email, new_lead = register_lead(download) if count_lead else (False, False)
+    table = EbookDownloadDaily._meta.db_table
+    date = timezone.localdate(download.download_date)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (ebook_id, date, count, consented_count, new_ebook_lead_count, new_lead_count) "
+            f"VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (ebook_id, date) DO UPDATE SET "
+            + ', '.join(f"{column} = {table}.{column} + excluded.{column}" for column in COUNTERS),
+            [download.ebook_id, connection.ops.adapt_datefield_value(date), delta,
+             delta if download.consent_mailing else 0, int(new_email), int(new_lead)],
+        )
+    Ebook.objects.filter(pk=download.ebook_id).update(download_total=F('download_total') + delta)
+
+def bulk_create_batches(model, objs):
+    """bulk_create() without materializing all of `objs` at once"""
+    objs = iter(objs)
+    while batch := list(islice(objs, BATCH_SIZE)):
+        model.objects.bulk_create(batch)
+
+def rebuild_download_stats(ebook_model=None, download_model=None, daily_model=None, lead_model=None):
+    """
+    Recomputes every counter from the EbookDownload rows.
+
+    The models can be passed in for data migrations, without `lead_model`
+    only the download and consent counts are rebuilt.
+
+    Returns:
+        int: number of daily rows
+    """
+    if ebook_model is None:
+        from api_app.models import (
+            Ebook as ebook_model, EbookDownload as download_model, EbookDownloadDaily as daily_model,
+            EbookLead as lead_model,
+        )
+
+    with transaction.atomic():
+        days = defaultdict(lambda: dict.fromkeys(COUNTERS if lead_model else COUNTERS[:2], 0))
+        rows = (
+            download_model.objects.order_by()
+            .values('ebook_id', day=TruncDate('download_date'))
+            .annotate(total=Count('id'), consented=Count('id', filter=Q(consent_mailing=True)))
+        )
+        for row in rows.iterator():
+            day = days[row['ebook_id'], row['day']]
+            day['count'], day['consented_count'] = row['total'], row['consented']
+
+        if lead_model is not None:
+            lead_model.objects.all().delete()
+            leads = (
+                download_model.objects.order_by()
+                .values('ebook_id', email_key=Lower(Trim('email')))
+                .annotate(first_download_at=Min('download_date'))
+            )
+            bulk_create_batches(lead_model, (lead_model(**lead) for lead in leads.iterator(chunk_size=BATCH_SIZE)))
+
+            current_key = None
+            ordered = lead_model.objects.order_by('email_key', 'first_download_at', 'ebook_id').values_list(
+                'email_key', 'ebook_id', 'first_download_at'
+            )
+            for email_key, ebook_id, first_download_at in ordered.iterator(chunk_size=2000):
+                day = days[ebook_id, timezone.localdate(first_download_at)]
+                day['new_ebook_lead_count'] += 1
+                if email_key != current_key:
+                    # Earliest download of this email
+                    day['new_lead_count'] += 1
+                    current_key = email_key
+
+        daily_model.objects.all().delete()
+        bulk_create_batches(
+            daily_model,
+            (daily_model(ebook_id=ebook_id, date=date, **counters) for (ebook_id, date), counters in days.items()),
+        )
+        totals = (
+            daily_model.objects.filter(ebook=OuterRef('pk')).order_by()
+            .values('ebook').annotate(total=Sum('count')).values('total')
+        )
+        ebook_model.objects.update(download_total=Coalesce(Subquery(totals), Value(0)))
+        return len(days)
+
+def period_starts(start, end, granularity):
+    """Start date of every period overlapping [start, end]"""
+    if granularity == 'week':
+        current = start - datetime.timedelta(days=start.weekday())
+    elif granularity == 'month':
+        current = start.replace(day=1)
+    else:
+        current = start
+    while current <= end:
+        yield current
+        if granularity == 'week':
+            current += datetime.timedelta(days=7)
+        elif granularity == 'month':
+            current = (current.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        else:
+            current += datetime.timedelta(days=1)
+
+def with_rate(counters):
+    counters['consent_rate'] = round(counters['consented_count'] / counters['count'], 4) if counters['count'] else None
+    return counters
+
+def _series_rows(start, end, granularity, ebook_ids):
+    """(ebook id, ISO period start, *COUNTERS) summed per ebook and period"""
+    from api_app.models import EbookDownloadDaily
+
+    if connection.vendor != 'sqlite':
+        queryset = EbookDownloadDaily.objects.filter(date__gte=start, date__lte=end)
+        if ebook_ids is not None:
+            queryset = queryset.filter(ebook_id__in=ebook_ids)
+        rows = (
+            queryset.order_by()
+            .values_list('ebook_id', GRANULARITIES[granularity])
+            .annotate(*(Sum(counter) for counter in COUNTERS))
+        )
+        return [(ebook_id, period.isoformat(), *counters) for ebook_id, period, *counters in rows]
+
+    # SQLite's own date functions on the ISO text: Django's Trunc*() are Python
+    # callbacks and date conversion per row costs more than the query itself
+    params = [start.isoformat(), end.isoformat()]
+    ebook_filter = ''
+    if ebook_ids is not None:
+        if not ebook_ids:
+            return []
+        ebook_filter = f"AND ebook_id IN ({', '.join(['%s'] * len(ebook_ids))})"
+        params += list(ebook_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT ebook_id, {PERIOD_SQL[granularity]} AS period, "
+            f"{', '.join(f'SUM({counter})' for counter in COUNTERS)} "
+            f"FROM {EbookDownloadDaily._meta.db_table} WHERE date BETWEEN %s AND %s {ebook_filter} "
+            f"GROUP BY ebook_id, period",
+            params,
+        )
+        return cursor.fetchall()
+
+def download_series(start, end, granularity='day', ebook_ids=None):
+    """
+    Download time series between the dates `start` and `end` (inclusive),
+    from EbookDownloadDaily only.
+
+    Returns:
+        dict: `totals` over the range, `periods` (all ebooks) and `ebooks`
+        (per ebook id), periods being ISO dates listed even without downloads
+    """
+    size = len(COUNTERS)
+    totals = [0] * size
+    periods, ebooks = {}, {}
+    for ebook_id, period, *counters in _series_rows(start, end, granularity, ebook_ids):
+        period_totals = periods.setdefault(period, [0] * size)
+        ebooks.setdefault(ebook_id, {})[period] = counters
+        for i, value in enumerate(counters):
+            totals[i] += value
+            period_totals[i] += value
+
+    def entry(period, counters):
+        return with_rate({'period': period, **dict(zip(COUNTERS, counters or (0,) * size))})
+
+    keys = [key.isoformat() for key in period_starts(start, end, granularity)]
+    return {
+        'totals': with_rate(dict(zip(COUNTERS, totals))),
+        'periods': [entry(key, periods.get(key)) for key in keys],
+        'ebooks': {
+            ebook_id: [entry(key, series.get(key)) for key in keys]
+            for ebook_id, series in ebooks.items()
+        },
+    }
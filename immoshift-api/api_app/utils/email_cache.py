@@ -0,0 +1,140 @@
+"""
+Per-process cache of what the confirmation emails are built from.
+
+Every email used to stat and re-read the logo, build a new MIME part and
+render the template from scratch. This module keeps:
+
+- the compiled confirmation template,
+- the logo MIME part, base64-encoded once and shared by the messages,
+- per ebook, the rendered email split around the recipient's first name,
+  so an email is a string join instead of a template render (the template
+  must output `first_name` as is, without filters).
+
+Files are re-checked (one stat each) at most every FILE_CHECK_INTERVAL
+seconds and everything built from a file is dropped when its mtime changes.
+Ebook fragments are keyed by (id, updated_at), so a change made through
+another process is picked up, and signals.py drops them on save/delete.
+"""
+import os
+import threading
+import time
+from email.mime.image import MIMEImage
+from django.conf import settings
+from django.template import engines
+from django.template.loader import get_template
+from django.utils.html import escape
+
+CONFIRMATION_TEMPLATE = 'emails/ebook_confirmation_email.html'
+LOGO_CID = 'logo_immoshift'  # Content ID for the image
+FILE_CHECK_INTERVAL = 2.0
+# Rendered in place of the first name, then split on
+FIRST_NAME_MARKER = '\x00first_name\x00'
+
+CONFIRMATION_TEXT = """
+Bonjour {first_name},
+
+Merci d'avoir téléchargé cet ebook "{ebook_title}".
+Vous pouvez accéder à votre ebook via le lien fourni lors de votre demande.
+
+Si vous avez des questions, n'hésitez pas à me contacter.
+
+Cordialement,
+Immoshift
+        """
+
+_lock = threading.Lock()
+_file_versions = {}  # path -> (checked at, mtime_ns or None)
+_template = None  # (mtime_ns, compiled template)
+_logo = None  # (path, mtime_ns, MIME part)
+_fragments = {}  # ebook id -> (updated_at, template mtime, logo present, html parts, text parts)
+
+def clear():
+    global _template, _logo
+    with _lock:
+        _file_versions.clear()
+        _fragments.clear()
+        _template = _logo = None
+
+def invalidate_ebook(ebook_id):
+    _fragments.pop(ebook_id, None)
+
+def file_version(path):
+    """mtime_ns of `path` (None if missing), looked up at most every FILE_CHECK_INTERVAL seconds"""
+    now = time.monotonic()
+    checked_at, version = _file_versions.get(path, (None, None))
+    if checked_at is None or now - checked_at > FILE_CHECK_INTERVAL:
+        try:
+            version = os.stat(path).st_mtime_ns
+        except OSError:
+            version = None
+        _file_versions[path] = (now, version)
+    return version
+
+def get_logo_path():
+    """Path of the logo attached inline to the HTML emails, None if missing"""
+    if settings.STATICFILES_DIRS:
+        # Use the first defined static dir, assuming it's api_app/static
+        path = os.path.join(settings.STATICFILES_DIRS[0], 'images', 'logo.png')
+        if file_version(path) is not None:
+            return path
+    return None
+
+def get_logo_part():
+    """The logo MIME part, read and encoded once per version of the file"""
+    global _logo
+    path = get_logo_path()
+    if path is None:
+        return None
+    version = file_version(path)
+    if _logo is None or _logo[:2] != (path, version):
+        with open(path, 'rb') as f:
+            part = MIMEImage(f.read())
+        part.add_header('Content-ID', f'<{LOGO_CID}>')  # Angle brackets are important
+        part.add_header('Content-Disposition', 'inline', filename=os.path.basename(path))
+        _logo = (path, version, part)
+    return _logo[2]
+
+def get_confirmation_template():
+    """The compiled confirmation template, recompiled when the file changes"""
+    global _template
+    if _template is not None:
+        version = file_version(_template[1].origin.name)
+        if version == _template[0]:
+            return _template[1]
+    with _lock:
+        # The cached template loader would hand back the old compiled template
+        path = get_template(CONFIRMATION_TEMPLATE).origin.name
+        with open(path, encoding='utf-8') as f:
+            template = engines['django'].from_string(f.read())
+        template.origin.name = path
+        _template = (file_version(path), template)
+        _fragments.clear()
+    return template
+
+def get_confirmation_fragments(ebook):
+    """(html parts, text parts) of the ebook's confirmation, to be joined with the first name"""
+    template = get_confirmation_template()
+    has_logo = get_logo_path() is not None
+    key = (ebook.updated_at, file_version(template.origin.name), has_logo)
+    cached = _fragments.get(ebook.pk)
+    if cached is not None and cached[:3] == key:
+        return cached[3], cached[4]
+
+    html = template.render({
+        'first_name': FIRST_NAME_MARKER,
+        'ebook_title': ebook.title,
+        'logo_cid': LOGO_CID if has_logo else None,  # Only pass CID if logo exists
+    })
+    text = CONFIRMATION_TEXT.format(first_name=FIRST_NAME_MARKER, ebook_title=ebook.title)
+    fragments = (tuple(html.split(FIRST_NAME_MARKER)), tuple(text.split(FIRST_NAME_MARKER)))
+    _fragments[ebook.pk] = key + fragments
+    return fragments
+
+def render_confirmation(ebook, first_name):
+    """
+    Returns:
+        tuple: (text body, HTML body, whether the logo is attached)
+    """
+    html_parts, text_parts = get_confirmation_fragments(ebook)
+    # The template autoescapes, so does the join
+    return first_name.join(text_parts), escape(first_name).join(html_parts), get_logo_path() is not None
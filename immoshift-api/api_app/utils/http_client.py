@@ -0,0 +1,230 @@
+"""
+Shared HTTP client for outgoing requests (the LinkedIn import).
+
+One `requests.Session` per process keeps the connections to a host alive
+between requests, its pool being sized for HTTP_MAX_WORKERS concurrent
+downloads. Every request has a connect and a read timeout, and idempotent
+requests are retried HTTP_RETRIES times with an exponential backoff on
+connection errors and 429/5xx answers (Retry-After is honoured).
+
+Bodies are streamed in 64 KB chunks to an on-disk cache under
+HTTP_CACHE_DIR, keyed by URL. A response's ETag and Last-Modified are kept
+next to it and sent back as If-None-Match / If-Modified-Since: a 304 serves
+the stored body, which is never downloaded twice. The cache directory is
+disposable, deleting it only costs full downloads.
+
+`prune_cache()`, run after the imports, keeps it bounded: entries unused for
+HTTP_CACHE_MAX_AGE_DAYS go, then the least recently used ones until the
+bodies fit in HTTP_CACHE_MAX_MB. Most images are fetched once, their entries
+age out.
+"""
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/91.0.4472.124 Safari/537.36'
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+class HTTPClientError(Exception):
+    """The resource couldn't be fetched"""
+
+class CachedResponse(NamedTuple):
+    url: str
+    status: int
+    content_type: str
+    # Body in the cache, replaced atomically: an open file stays readable
+    path: str
+    from_cache: bool
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def text(self):
+        charset = 'utf-8'
+        for part in self.content_type.split(';')[1:]:
+            name, _, value = part.strip().partition('=')
+            if name.lower() == 'charset' and value:
+                charset = value.strip('"')
+        return self.read().decode(charset, errors='replace')
+
+def get_session():
+    """The process' session, created on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=settings.HTTP_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({'GET', 'HEAD'}), respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                max_retries=retry, pool_connections=4, pool_maxsize=settings.HTTP_MAX_WORKERS, pool_block=True,
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'User-Agent': USER_AGENT, 'Accept-Language': 'en-US,en;q=0.9'})
+            _session = session
+    return _session
+
+def cache_paths(url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    directory = os.path.join(settings.HTTP_CACHE_DIR, key[:2])
+    return os.path.join(directory, f"{key}.body"), os.path.join(directory, f"{key}.json")
+
+def read_metadata(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_atomically(path, write):
+    """Calls `write(file)` on a temporary file then renames it to `path`"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def fetch(url, headers=None, max_bytes=None):
+    """
+    GETs `url` through the cache, revalidating a stored copy.
+
+    Returns:
+        CachedResponse: the 200 (or revalidated) response, its body on disk
+
+    Raises:
+        HTTPClientError: network error, error status, or a body over `max_bytes`
+            (HTTP_MAX_DOWNLOAD_MB by default)
+    """
+    max_bytes = max_bytes or settings.HTTP_MAX_DOWNLOAD_MB * 1024 * 1024
+    body_path, metadata_path = cache_paths(url)
+    metadata = read_metadata(metadata_path) if os.path.exists(body_path) else None
+    headers = dict(headers or {})
+    if metadata and metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if metadata and metadata.get('last_modified'):
+        headers['If-Modified-Since'] = metadata['last_modified']
+
+    timeout = (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+    try:
+        with get_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and metadata:
+                # Last use, for prune_cache()
+                os.utime(metadata_path)
+                return CachedResponse(url, 200, metadata['content_type'], body_path, True)
+            response.raise_for_status()
+
+            length = int(response.headers.get('Content-Length') or 0)
+            if length > max_bytes:
+                raise HTTPClientError(f"{url} is too large ({length} bytes)")
+
+            def write(f):
+                size = 0
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise HTTPClientError(f"{url} is too large (over {max_bytes} bytes)")
+                    f.write(chunk)
+
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            write_atomically(body_path, write)
+            metadata = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_type': response.headers.get('Content-Type', ''),
+            }
+            write_atomically(metadata_path, lambda f: f.write(json.dumps(metadata).encode('utf-8')))
+            return CachedResponse(url, response.status_code, metadata['content_type'], body_path, False)
+    except requests.RequestException as e:
+        raise HTTPClientError(str(e)) from e
+
+def fetch_all(urls, headers=None, max_bytes=None):
+    """
+    Fetches `urls` concurrently (HTTP_MAX_WORKERS at a time).
+
+    Returns:
+        list: a CachedResponse or the HTTPClientError raised, per URL
+    """
+    def fetch_one(url):
+        try:
+            return fetch(url, headers=headers, max_bytes=max_bytes)
+        except HTTPClientError as e:
+            return e
+
+    if len(urls) <= 1:
+        return [fetch_one(url) for url in urls]
+    with ThreadPoolExecutor(max_workers=min(len(urls), settings.HTTP_MAX_WORKERS)) as executor:
+        return list(executor.map(fetch_one, urls))
+
+def prune_cache(max_bytes=None, max_age=None):
+    """
+    Removes the cache entries unused for `max_age` (HTTP_CACHE_MAX_AGE_DAYS),
+    then the least recently used ones until the bodies fit in `max_bytes`
+    (HTTP_CACHE_MAX_MB). Temporary files left by killed downloads go with
+    the expired entries.
+
+    Returns:
+        int: number of entries removed
+    """
+    max_bytes = settings.HTTP_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    max_age = datetime.timedelta(days=settings.HTTP_CACHE_MAX_AGE_DAYS) if max_age is None else max_age
+    expired_before = time.time() - max_age.total_seconds()
+    if not os.path.isdir(settings.HTTP_CACHE_DIR):
+        return 0
+
+    entries = []  # (last use, body size, body path)
+    for directory in os.scandir(settings.HTTP_CACHE_DIR):
+        if not directory.is_dir():
+            continue
+        for entry in os.scandir(directory.path):
+            try:
+                if entry.name.startswith('.tmp'):
+                    if entry.stat().st_mtime < expired_before:
+                        os.remove(entry.path)
+                elif entry.name.endswith('.body'):
+                    body = entry.stat()
+                    try:
+                        used = max(body.st_mtime, os.stat(entry.path[:-len('.body')] + '.json').st_mtime)
+                    except FileNotFoundError:
+                        used = body.st_mtime
+                    entries.append((used, body.st_size, entry.path))
+            except FileNotFoundError:
+                pass  # Replaced or removed meanwhile
+
+    entries.sort(reverse=True)
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    while entries and (entries[-1][0] < expired_before or total > max_bytes):
+        _, size, body_path = entries.pop()
+        for path in (body_path, body_path[:-len('.body')] + '.json'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,161 @@
+"""
+Responsive image derivatives.
+
+Every uploaded image is re-encoded into width buckets (WebP plus a JPEG
+fallback by default), stored next to the original under `derivatives/`:
+
+    articles/photo.jpg -> articles/derivatives/photo.jpg.640w.webp
+
+What was generated is recorded in the model's `<field>_variants` JSON column,
+so serializers can build a srcset without touching the storage:
+
+    {"name": "articles/photo.jpg", "width": 1920, "height": 1280,
+     "formats": {"webp": [[320, "articles/derivatives/photo.jpg.320w.webp"], ...], ...}}
+
+Derivatives are generated after the commit of the save that changed the
+image (see signals.py) and in bulk by `manage.py generate_image_derivatives`.
+"""
+import io
+import posixpath
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+import logging
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+DEFAULT_WIDTHS = (320, 640, 960, 1280, 1920)
+DEFAULT_FORMATS = ('webp', 'jpeg')
+EXIF_ORIENTATION = 0x0112
+
+# Pillow format name, file extension and save() options
+ENCODERS = {
+    'avif': ('AVIF', 'avif', {'quality': 60}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS)))
+
+def get_formats():
+    """Configured formats the installed Pillow can encode"""
+    Image.init()  # Registers the encoders in Image.SAVE
+    formats = []
+    for fmt in getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', DEFAULT_FORMATS):
+        if fmt in ENCODERS and ENCODERS[fmt][0] in Image.SAVE:
+            formats.append(fmt)
+        else:
+            logger.warning(f"Image derivative format {fmt} is not supported, skipped")
+    return tuple(formats)
+
+def get_image_fields():
+    """(model, image field name, variants field name) for every image with derivatives"""
+    from api_app.models import Article, Author, Ebook, Paragraph, Testimonial, Training
+    return (
+        (Article, 'image', 'image_variants'),
+        (Author, 'picture', 'picture_variants'),
+        (Ebook, 'cover_image', 'cover_image_variants'),
+        (Paragraph, 'image', 'image_variants'),
+        (Testimonial, 'avatar', 'avatar_variants'),
+        (Training, 'image', 'image_variants'),
+    )
+
+def derivative_name(name, width, fmt):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, DERIVATIVES_DIR, f'{filename}.{width}w.{ENCODERS[fmt][1]}')
+
+def bucket_widths(original_width, widths):
+    """Buckets narrower than the original, plus the original width itself if it is inside the range"""
+    selected = [width for width in widths if width < original_width]
+    if original_width <= widths[-1]:
+        selected.append(original_width)
+    return selected or [original_width]
+
+def _encode(image, fmt):
+    pil_format, _, options = ENCODERS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # No alpha in JPEG, flatten on white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+def build_variants(name, widths=None, formats=None):
+    """
+    Generates the derivatives of the stored image `name`.
+
+    Runs without database access so it can be used from worker processes.
+
+    Returns:
+        dict: the variants record, or {} if the file can't be read as an image
+    """
+    widths = widths or get_widths()
+    formats = formats or get_formats()
+    try:
+        with default_storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            # JPEG can decode straight at 1/2, 1/4 or 1/8 of the size, much faster
+            # for big photos. Only the width (the height once rotated) is bounded.
+            rotated = image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+            image.draft('RGB', (1, widths[-1]) if rotated else (widths[-1], 1))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not generate derivatives of {name}: {e}")
+        return {}
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    record = {'name': name, 'formats': {}}
+    for width in bucket_widths(image.width, widths):
+        height = max(1, round(image.height * width / image.width))
+        # Size of the largest variant, for the width/height attributes of <img>
+        record['width'], record['height'] = width, height
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            path = derivative_name(name, width, fmt)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            path = default_storage.save(path, ContentFile(_encode(resized, fmt)))
+            record['formats'].setdefault(fmt, []).append([width, path])
+    return record
+
+def variant_paths(record):
+    return {path for variants in (record or {}).get('formats', {}).values() for _, path in variants}
+
+def delete_stale_files(old_record, new_record):
+    """Removes the derivative files of `old_record` that `new_record` doesn't reuse"""
+    for path in variant_paths(old_record) - variant_paths(new_record):
+        try:
+            default_storage.delete(path)
+        except OSError as e:
+            logger.warning(f"Could not delete derivative {path}: {e}")
+
+def is_up_to_date(image_name, record):
+    return (record or {}).get('name') == (image_name or None)
+
+def update_derivatives(model, pk, image_field, variants_field, force=False):
+    """
+    Brings the derivatives of one row in line with its current image.
+
+    Returns:
+        bool: True if the variants record changed
+    """
+    row = model._default_manager.filter(pk=pk).values(image_field, variants_field).first()
+    if row is None:
+        return False
+    image_name, old_record = row[image_field], row[variants_field]
+    if not force and is_up_to_date(image_name, old_record):
+        return False
+
+    new_record = build_variants(image_name) if image_name else {}
+    # update() so the post_save handlers don't run again for our own write
+    model._default_manager.filter(pk=pk).update(**{variants_field: new_record})
+    delete_stale_files(old_record, new_record)
+    return True
@@ -0,0 +1,233 @@
+"""
+Import of LinkedIn posts as articles, one at a time from the admin form or
+in bulk as a background job.
+
+A bulk import is a LinkedInImportJob with one LinkedInImportItem per URL
+(`enqueue_import()`), processed by `manage.py run_linkedin_imports`:
+
+- pending items are claimed in one conditional UPDATE setting a lease, so
+  two workers never take the same item, and an item left running by a
+  killed worker is taken again once its lease is over;
+- the URLs already imported as an Article.source_url (indexed) are skipped
+  with a single query per claim, and again before each insert for the
+  posts imported meanwhile;
+- the network part (page, avatar and image through utils/http_client.py)
+  runs on a pool of LINKEDIN_IMPORT_WORKERS threads which never touch the
+  database;
+- the articles are created by the worker's thread as the posts come in,
+  LINKEDIN_IMPORT_BATCH_SIZE per transaction, with a savepoint per post so
+  that a failing one doesn't take the others down;
+- the HTTP cache is pruned once the pending items are done.
+
+The admin page polls `job_progress()` for the status of each URL.
+"""
+import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from api_app.models import Article, Author, LinkedInImportItem, LinkedInImportJob, Paragraph
+from .http_client import prune_cache
+from .linkedin_scraper import download_images, scrape_linkedin_post
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed item stays invisible to the other workers
+CLAIM_LEASE = datetime.timedelta(minutes=10)
+CLAIM_SIZE = 50
+UNFINISHED = (LinkedInImportItem.STATUS_PENDING, LinkedInImportItem.STATUS_RUNNING)
+
+def clean_post_url(url):
+    """The URL without its tracking parameters, as stored in Article.source_url"""
+    return url.split('?')[0] if '?' in url else url
+
+def unique_slug(title):
+    """Slug of `title` truncated to 50 characters, numbered if already taken"""
+    base = slugify(title)[:50].rstrip('-') or 'post-linkedin'
+    slug, number = base, 1
+    while Article.objects.filter(slug=slug).exists():
+        number += 1
+        suffix = f"-{number}"
+        slug = base[:50 - len(suffix)].rstrip('-') + suffix
+    return slug
+
+def create_article(scraped_data, source_url, author_image=None, image=None):
+    """
+    Creates the article of a scraped post, its author if unknown and its
+    paragraph. To be called inside a transaction.
+    """
+    # Use the LinkedIn author information if available
+    author_name = scraped_data.get('author_name', 'Unknown Author')
+    if author_name == 'Unknown Author':
+        # Fallback to ImmoShift if no author found
+        author_name, bio, author_image = "ImmoShift", "Contenu importé de LinkedIn", None
+    else:
+        bio = scraped_data.get('author_headline', "Auteur importé depuis LinkedIn")
+    author = Author.objects.filter(name=author_name).first()
+    if author is None:
+        # Create new author with LinkedIn data
+        author = Author(name=author_name, bio=bio)
+        if author_image:
+            author.picture = author_image
+        author.save()
+
+    article = Article(
+        title=scraped_data['title'],
+        slug=unique_slug(scraped_data['title']),
+        excerpt=scraped_data['excerpt'],
+        author=author,
+        is_published=True,
+        source_url=source_url,
+        published_at=scraped_data['published_at'],
+    )
+    if image:
+        article.image = image
+    article.save()
+
+    # Create paragraph with the full content
+    Paragraph.objects.create(
+        article=article,
+        position=1,
+        title=None,  # No title for the first paragraph
+        content=scraped_data['content'],
+        media_type='none',  # No media in the paragraph as we already have the main image
+    )
+    return article
+
+def enqueue_import(urls, user=None):
+    """Records a bulk import of `urls` (duplicates dropped), returns the job"""
+    with transaction.atomic():
+        job = LinkedInImportJob.objects.create(created_by=user)
+        LinkedInImportItem.objects.bulk_create([
+            LinkedInImportItem(job=job, url=url) for url in dict.fromkeys(map(clean_post_url, urls))
+        ])
+    return job
+
+def claim_items(limit=CLAIM_SIZE):
+    """Claims up to `limit` pending (or abandoned) items for this worker"""
+    now = timezone.now()
+    due = Q(status=LinkedInImportItem.STATUS_PENDING) | Q(status=LinkedInImportItem.STATUS_RUNNING, lease_until__lt=now)
+    candidates = list(LinkedInImportItem.objects.filter(due).order_by('id').values_list('pk', flat=True)[:limit])
+    if not candidates:
+        return []
+    # One statement: the items another worker claimed meanwhile no longer match `due`
+    lease_until = now + CLAIM_LEASE
+    LinkedInImportItem.objects.filter(due, pk__in=candidates).update(
+        status=LinkedInImportItem.STATUS_RUNNING, lease_until=lease_until
+    )
+    return list(LinkedInImportItem.objects.filter(
+        pk__in=candidates, status=LinkedInImportItem.STATUS_RUNNING, lease_until=lease_until
+    ).order_by('id'))
+
+def fetch_post(url):
+    """
+    Network part of an import, run on the pool: scrapes the post and downloads its images.
+
+    Returns:
+        tuple: (scraped data, with an 'error' key on failure, author image File, image File)
+    """
+    try:
+        data = scrape_linkedin_post(url)
+        if 'error' in data:
+            return data, None, None
+        author_image, image = download_images([data.get('author_image_url'), data.get('image_url')])
+        return data, author_image, image
+    except Exception as e:
+        logger.exception(f"LinkedIn import of {url} failed")
+        return {'error': str(e)}, None, None
+
+def finish_item(item, status, article_id=None, error=''):
+    LinkedInImportItem.objects.filter(pk=item.pk).update(
+        status=status, article_id=article_id, error=error[:2000], lease_until=None, finished_at=timezone.now()
+    )
+
+def save_batch(results, stats):
+    """Creates the articles of `results` ([(item, fetch_post() result)]) in one transaction"""
+    if not results:
+        return
+    with transaction.atomic():
+        for item, (data, author_image, image) in results:
+            try:
+                with transaction.atomic():
+                    # Indexed, and catches the posts imported since the claim
+                    article_id = Article.objects.filter(source_url=item.url).values_list('pk', flat=True).first()
+                    if article_id:
+                        status = LinkedInImportItem.STATUS_SKIPPED
+                        finish_item(item, status, article_id)
+                    elif 'error' in data:
+                        status = LinkedInImportItem.STATUS_FAILED
+                        finish_item(item, status, error=data['error'])
+                    else:
+                        article = create_article(data, item.url, author_image, image)
+                        status = LinkedInImportItem.STATUS_IMPORTED
+                        finish_item(item, status, article.pk)
+            except Exception as e:
+                logger.exception(f"LinkedIn import of {item.url} failed")
+                status = LinkedInImportItem.STATUS_FAILED
+                finish_item(item, status, error=f"{type(e).__name__}: {e}")
+            finally:
+                for downloaded in (author_image, image):
+                    if downloaded:
+                        downloaded.close()
+            stats[status] += 1
+        finish_jobs({item.job_id for item, _ in results})
+
+def finish_jobs(job_ids):
+    LinkedInImportJob.objects.filter(pk__in=job_ids, finished_at=None).exclude(
+        items__status__in=UNFINISHED
+    ).update(finished_at=timezone.now())
+
+def run_imports(workers=None, batch_size=None):
+    """
+    Processes every pending item.
+
+    Returns:
+        Counter: number of items per final status
+    """
+    workers = workers or settings.LINKEDIN_IMPORT_WORKERS
+    batch_size = batch_size or settings.LINKEDIN_IMPORT_BATCH_SIZE
+    stats = Counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while items := claim_items():
+            imported = dict(
+                Article.objects.filter(source_url__in={item.url for item in items}).order_by().values_list('source_url', 'pk')
+            )
+            with transaction.atomic():
+                for item in items:
+                    if item.url in imported:
+                        finish_item(item, LinkedInImportItem.STATUS_SKIPPED, imported[item.url])
+                        stats[LinkedInImportItem.STATUS_SKIPPED] += 1
+                finish_jobs({item.job_id for item in items})
+
+            futures = {executor.submit(fetch_post, item.url): item for item in items if item.url not in imported}
+            results = []
+            for future in as_completed(futures):
+                results.append((futures[future], future.result()))
+                if len(results) >= batch_size:
+                    save_batch(results, stats)
+                    results = []
+            save_batch(results, stats)
+    if stats:
+        prune_cache()
+    return stats
+
+def job_progress(job):
+    """Status of a job and of each of its URLs, for the admin page to poll"""
+    items = list(job.items.order_by('id').values('id', 'url', 'status', 'article_id', 'error'))
+    for item in items:
+        item['article_url'] = (
+            reverse('admin:api_app_article_change', args=[item['article_id']]) if item['article_id'] else None
+        )
+    counts = Counter(item['status'] for item in items)
+    return {
+        'id': job.pk,
+        'finished': job.finished_at is not None,
+        'total': len(items),
+        'counts': {status: counts[status] for status, _ in LinkedInImportItem.STATUS_CHOICES},
+        'items': items,
+    }
@@ -1,12 +1,30 @@
-import requests
 from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
 from datetime import datetime
 import re
 import json
-import tempfile
 import os
+import soupsieve
+from django.conf import settings
 from django.core.files import File
 from urllib.parse import urlparse, urlencode, parse_qs
+from .http_client import HTTPClientError, fetch, fetch_all
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_CLASS = 'attributed-text-segment-list__content'
+IMAGES_CLASS = 'feed-images-content'
+AUTHOR_CLASS = 'base-main-feed-card__entity-lockup'
+LOW_EMPHASIS_CLASS = 'text-color-text-low-emphasis'
+RELATIVE_TIME_CLASS = 'comment__duration-since'
+
+# Selectors depending on an ancestor, only tried on the tags they could match
+POST_IMAGE = soupsieve.compile(f'.{IMAGES_CLASS} img')
+AUTHOR_NAME = soupsieve.compile(f'.{AUTHOR_CLASS} a.link-styled')
+AUTHOR_HEADLINE = soupsieve.compile(f'.{AUTHOR_CLASS} p.{LOW_EMPHASIS_CLASS}')
+AUTHOR_IMAGE = soupsieve.compile(f'.{AUTHOR_CLASS} img')
+RELATIVE_TIME = soupsieve.compile(f'.{RELATIVE_TIME_CLASS}, span.{LOW_EMPHASIS_CLASS} time')
 
 def is_linkedin_post_url(url):
     """Check if the URL is a valid LinkedIn post URL."""
@@ -14,6 +32,161 @@ def is_linkedin_post_url(url):
     return (parsed_url.netloc == 'www.linkedin.com' or parsed_url.netloc == 'linkedin.com' or 
             parsed_url.netloc.endswith('.linkedin.com')) and '/posts/' in url
 
+class PostElements(ElementFilter):
+    """
+    Builds only the subtrees extract_post() reads (post text, images, author
+    card, structured data, og:image and dates), the rest of the page is
+    tokenized and dropped.
+    """
+    KEPT_CLASSES = {CONTENT_CLASS, IMAGES_CLASS, AUTHOR_CLASS, RELATIVE_TIME_CLASS}
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        attrs = attrs or {}
+        if name == 'script':
+            return attrs.get('type') == 'application/ld+json'
+        if name == 'meta':
+            return attrs.get('property') == 'og:image'
+        if name == 'time':
+            return True
+        classes = attrs.get('class') or ()
+        classes = set(classes.split() if isinstance(classes, str) else classes)
+        return bool(classes & self.KEPT_CLASSES) or (name == 'span' and LOW_EMPHASIS_CLASS in classes)
+
+    def allow_string_creation(self, string):
+        return False
+
+def parse_date(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+def structured_data(script):
+    """The JSON object of an ld+json script, empty if it holds something else"""
+    try:
+        data = json.loads(script.string)
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def extract_post(html, source_url, parser=None, strained=True):
+    """
+    Extracts the fields returned by scrape_linkedin_post() from the HTML of a
+    post, walking the tree once. With `strained`, only the elements read are
+    parsed into the tree. `parser` defaults to LINKEDIN_HTML_PARSER.
+    """
+    soup = BeautifulSoup(html, parser or settings.LINKEDIN_HTML_PARSER, parse_only=PostElements() if strained else None)
+
+    content_element = image_element = meta_image = relative_time = None
+    author_element = headline_element = author_img = None
+    article_body = published_at = None
+    time_published_at = None
+    # First match of each field in document order, as select_one() would find it
+    for tag in soup.find_all(True):
+        name = tag.name
+        classes = tag.get('class') or ()
+        if content_element is None and CONTENT_CLASS in classes:
+            content_element = tag
+        if relative_time is None and RELATIVE_TIME_CLASS in classes:
+            relative_time = tag
+
+        if name == 'script':
+            if tag.get('type') == 'application/ld+json' and (article_body is None or published_at is None):
+                # Each script is decoded once, for both fields
+                data = structured_data(tag)
+                if article_body is None and 'articleBody' in data:
+                    article_body = data['articleBody']
+                if published_at is None and 'datePublished' in data:
+                    published_at = parse_date(data['datePublished'])
+        elif name == 'meta':
+            if meta_image is None and tag.get('property') == 'og:image':
+                meta_image = tag
+        elif name == 'time':
+            if time_published_at is None and tag.get('datetime'):
+                time_published_at = parse_date(tag['datetime'])
+            if relative_time is None and RELATIVE_TIME.match(tag):
+                relative_time = tag
+        elif name == 'img':
+            if image_element is None and POST_IMAGE.match(tag):
+                image_element = tag
+            if author_img is None and AUTHOR_IMAGE.match(tag):
+                author_img = tag
+        elif name == 'a':
+            if author_element is None and 'link-styled' in classes and AUTHOR_NAME.match(tag):
+                author_element = tag
+        elif name == 'p':
+            if headline_element is None and LOW_EMPHASIS_CLASS in classes and AUTHOR_HEADLINE.match(tag):
+                headline_element = tag
+
+    # Extract post content from the attributed-text-segment-list__content element
+    post_content = None
+    if content_element:
+        post_content = content_element.get_text(separator="\n").strip()
+    if not post_content:
+        # Try the article body of the structured data
+        post_content = article_body
+
+    if not post_content:
+        return {
+            'error': 'Could not extract content from the LinkedIn post.',
+            'source_url': source_url
+        }
+
+    # Split content into lines
+    lines = post_content.split('\n')
+    lines = [line.strip() for line in lines if line.strip()]
+
+    # First line is the title
+    title = lines[0] if lines else 'LinkedIn Post'
+
+    # Second line is the excerpt (or first line if only one line exists)
+    excerpt = lines[1] if len(lines) > 1 else title
+
+    # The post image, from the feed-images-content list items
+    image_url = None
+    if image_element:
+        image_url = image_element.get('data-delayed-url') or image_element.get('src')
+
+    # If not found, try meta og:image
+    if not image_url and meta_image:
+        image_url = meta_image.get('content')
+
+    # The ld+json datePublished first, then the time elements
+    if not published_at:
+        published_at = time_published_at
+
+    # If no exact date is found, look for relative date
+    if not published_at and relative_time:
+        relative_text = relative_time.text.strip()
+        # Handle simple relative dates (approximate)
+        if 'd' in relative_text:  # days like "1d"
+            days = int(relative_text.replace('d', ''))
+            published_at = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            # No need for timedelta as we use current date
+
+    # If no date found, set to current time
+    if not published_at:
+        published_at = datetime.now()
+
+    # Extract author information
+    author_name = author_element.text.strip() if author_element else "Unknown Author"
+    author_headline = headline_element.text.strip() if headline_element else ""
+    author_image_url = None
+    if author_img:
+        author_image_url = author_img.get('data-delayed-url') or author_img.get('src')
+
+    return {
+        'title': title[:197] + '...' if len(title) > 200 else title,  # Truncate title if too long
+        'excerpt': excerpt[:497] + '...' if len(excerpt) > 500 else excerpt,  # Truncate excerpt if too long
+        'content': post_content,
+        'image_url': image_url,
+        'published_at': published_at,
+        'source_url': source_url,  # Use the cleaned URL without tracking parameters
+        'author_name': author_name,
+        'author_headline': author_headline,
+        'author_image_url': author_image_url
+    }
+
 def scrape_linkedin_post(url):
     """
     Scrape content from a LinkedIn post.
@@ -29,142 +202,19 @@ def scrape_linkedin_post(url):
     - author_headline: Headline/description of the author
     - author_image_url: URL of the author's profile image
     """
-    print("Scraping LinkedIn post:", url)
+    logger.info(f"Scraping LinkedIn post: {url}")
     # Clean the URL by removing tracking parameters
     clean_url = url.split('?')[0] if '?' in url else url
     
-    # Headers to mimic a browser request
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
-    
     try:
-        response = requests.get(clean_url, headers=headers)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        # Save the soup to a file for debugging
-        with open('linkedin_post_debug.html', 'w', encoding='utf-8') as f:
-            f.write(soup.prettify())
-        
-        # Extract post content by finding the attributed-text-segment-list__content
-        post_content = None
-        content_element = soup.select_one('.attributed-text-segment-list__content')
-        if content_element:
-            post_content = content_element.get_text(separator="\n").strip()
-        
-        if not post_content:
-            # Try looking for article body in a script tag (structured data)
-            for script in soup.find_all('script', type='application/ld+json'):
-                try:
-                    data = json.loads(script.string)
-                    if 'articleBody' in data:
-                        post_content = data['articleBody']
-                        break
-                except (json.JSONDecodeError, AttributeError):
-                    continue
-        
-        if not post_content:
-            return {
-                'error': 'Could not extract content from the LinkedIn post.',
-                'source_url': clean_url
-            }
-        
-        # Split content into lines
-        lines = post_content.split('\n')
-        lines = [line.strip() for line in lines if line.strip()]
-        
-        # First line is the title
-        title = lines[0] if lines else 'LinkedIn Post'
-        
-        # Second line is the excerpt (or first line if only one line exists)
-        excerpt = lines[1] if len(lines) > 1 else title
-        
-        # Find the post image - look for feed-images-content list items
-        image_url = None
-        image_container = soup.select_one('.feed-images-content img')
-        if image_container:
-            image_url = image_container.get('data-delayed-url') or image_container.get('src')
-        
-        # If not found, try meta og:image
-        if not image_url:
-            meta_image = soup.select_one('meta[property="og:image"]')
-            if meta_image:
-                image_url = meta_image.get('content')
-        
-        # Try to find the date
-        published_at = None
-        
-        # First, check ld+json data for datePublished
-        for script in soup.find_all('script', type='application/ld+json'):
-            try:
-                data = json.loads(script.string)
-                if 'datePublished' in data:
-                    published_at = datetime.fromisoformat(data['datePublished'].replace('Z', '+00:00'))
-                    break
-            except (json.JSONDecodeError, AttributeError, ValueError):
-                continue
-        
-        if not published_at:
-            # Try to extract from time elements
-            time_elements = soup.find_all('time')
-            for time_element in time_elements:
-                if time_element.get('datetime'):
-                    try:
-                        published_at = datetime.fromisoformat(time_element['datetime'].replace('Z', '+00:00'))
-                        break
-                    except ValueError:
-                        pass
-        
-        # If no exact date is found, look for relative date
-        if not published_at:
-            relative_time = soup.select_one('.comment__duration-since, span.text-color-text-low-emphasis time')
-            if relative_time:
-                relative_text = relative_time.text.strip()
-                # Handle simple relative dates (approximate)
-                if 'd' in relative_text:  # days like "1d"
-                    days = int(relative_text.replace('d', ''))
-                    published_at = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                    # No need for timedelta as we use current date
-        
-        # If no date found, set to current time
-        if not published_at:
-            published_at = datetime.now()
+        # Browser-like headers are set on the shared session
+        response = fetch(clean_url)
+        # The page stays in the HTTP cache, for debugging
+        logger.debug(f"LinkedIn post HTML: {response.path} (from cache: {response.from_cache})")
         
-        # Extract author information
-        author_name = "Unknown Author"
-        author_headline = ""
-        author_image_url = None
-        
-        # Get author name
-        author_element = soup.select_one('.base-main-feed-card__entity-lockup a.link-styled')
-        if author_element:
-            author_name = author_element.text.strip()
-        
-        # Get author headline
-        headline_element = soup.select_one('.base-main-feed-card__entity-lockup p.text-color-text-low-emphasis')
-        if headline_element:
-            author_headline = headline_element.text.strip()
-        
-        # Get author image
-        author_img = soup.select_one('.base-main-feed-card__entity-lockup img')
-        if author_img:
-            author_image_url = author_img.get('data-delayed-url') or author_img.get('src')
-        
-        return {
-            'title': title[:197] + '...' if len(title) > 200 else title,  # Truncate title if too long
-            'excerpt': excerpt[:497] + '...' if len(excerpt) > 500 else excerpt,  # Truncate excerpt if too long
-            'content': post_content,
-            'image_url': image_url,
-            'published_at': published_at,
-            'source_url': clean_url,  # Use the cleaned URL without tracking parameters
-            'author_name': author_name,
-            'author_headline': author_headline,
-            'author_image_url': author_image_url
-        }
+        return extract_post(response.text(), clean_url)
     
-    except requests.RequestException as e:
+    except HTTPClientError as e:
         return {
             'error': f'Failed to fetch LinkedIn post: {str(e)}',
             'source_url': clean_url
@@ -178,26 +228,36 @@ def scrape_linkedin_post(url):
             'source_url': clean_url
         }
 
+def image_file(response):
+    """Django File reading a fetched image, named after its URL"""
+    file_name = os.path.basename(urlparse(response.url).path)
+    if not file_name or '.' not in file_name:
+        file_name = 'linkedin_image.jpg'
+    return File(open(response.path, 'rb'), name=file_name)
+
 def download_image_from_url(url):
     """Download image from URL and return a Django File object."""
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # Create a temporary file to store the image
-        img_temp = tempfile.NamedTemporaryFile(delete=True)
-        for chunk in response.iter_content(chunk_size=1024):
-            if chunk:
-                img_temp.write(chunk)
-        img_temp.flush()
-        
-        # Get file name from URL
-        url_path = urlparse(url).path
-        file_name = os.path.basename(url_path)
-        if not file_name or '.' not in file_name:
-            file_name = 'linkedin_image.jpg'
-        
-        return File(img_temp, name=file_name)
-    
-    except Exception as e:
+        return image_file(fetch(url))
+    except HTTPClientError as e:
+        logger.warning(f"Image download failed for {url}: {e}")
         return None
+
+def download_images(urls):
+    """
+    Downloads the images of `urls` concurrently.
+
+    Returns:
+        list: a Django File, or None when the URL is empty or failed, per URL
+    """
+    wanted = [url for url in urls if url]
+    results = iter(fetch_all(wanted))
+    files = []
+    for url in urls:
+        result = next(results) if url else None
+        if isinstance(result, HTTPClientError):
+            logger.warning(f"Image download failed for {url}: {result}")
+            result = None
+        # One File per URL given, even for the same image twice
+        files.append(image_file(result) if result else None)
+    return files
@@ -0,0 +1,142 @@
+"""
+Transactional email outbox.
+
+Request code never talks to SMTP: `enqueue_email()` inserts an EmailOutbox
+row in the current transaction, so the email exists if and only if the row
+that triggered it was committed. `manage.py send_outbox` then drains the
+due rows over one SMTP connection.
+
+A row is claimed by pushing its `next_attempt_at` past a lease and counting
+the attempt, with a conditional UPDATE so two workers never send the same
+row. A worker killed mid-send leaves the row pending, it is picked up again
+once the lease is over. Failures are retried with an exponential backoff
+and dead-lettered after EMAIL_OUTBOX_MAX_ATTEMPTS (or at once for errors
+the server reports as permanent).
+"""
+import datetime
+import smtplib
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+from api_app.models import EmailOutbox
+from .email_cache import get_logo_part
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_DELAY = 60  # Seconds before the first retry, doubled after each failure
+MAX_RETRY_DELAY = 6 * 3600
+# How long a claimed row stays invisible to the other workers
+CLAIM_LEASE = datetime.timedelta(minutes=5)
+BATCH_SIZE = 50
+
+def enqueue_email(kind, subject, body, to, html_body='', inline_logo=False, from_email=None):
+    """Queues an email, to be called inside the transaction that caused it"""
+    return EmailOutbox.objects.create(
+        kind=kind,
+        subject=subject,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        body=body,
+        html_body=html_body,
+        inline_logo=inline_logo,
+    )
+
+def retry_delay(attempts):
+    """Backoff after the `attempts`-th failed attempt"""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return datetime.timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+
+def is_permanent_error(error):
+    """5xx replies mean retrying the same message can't succeed"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+def build_message(entry, connection=None):
+    msg = EmailMultiAlternatives(entry.subject, entry.body, entry.from_email, entry.to, connection=connection)
+    if entry.html_body:
+        msg.attach_alternative(entry.html_body, "text/html")
+    # Encoded once and shared by all the messages
+    logo = get_logo_part() if entry.inline_logo else None
+    if logo is not None:
+        msg.attach(logo)
+    return msg
+
+def claim_due(limit=BATCH_SIZE):
+    """Claims up to `limit` due pending emails for this worker"""
+    now = timezone.now()
+    candidates = EmailOutbox.objects.filter(
+        status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'id').values_list('pk', 'next_attempt_at')[:limit]
+
+    claimed = []
+    for pk, next_attempt_at in candidates:
+        count = EmailOutbox.objects.filter(
+            pk=pk, status=EmailOutbox.STATUS_PENDING, next_attempt_at=next_attempt_at
+        ).update(next_attempt_at=now + CLAIM_LEASE, attempts=F('attempts') + 1)
+        if count:
+            claimed.append(pk)
+    return list(EmailOutbox.objects.filter(pk__in=claimed).order_by('id'))
+
+def record_failure(entry, error):
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    update = {'last_error': f"{type(error).__name__}: {error}"[:2000]}
+    if entry.attempts >= max_attempts or is_permanent_error(error):
+        update['status'] = EmailOutbox.STATUS_DEAD
+        logger.error(f"Outbox email {entry.pk} dead-lettered after {entry.attempts} attempt(s): {error}")
+    else:
+        update['next_attempt_at'] = timezone.now() + retry_delay(entry.attempts)
+        logger.warning(f"Outbox email {entry.pk} failed (attempt {entry.attempts}), will retry: {error}")
+    EmailOutbox.objects.filter(pk=entry.pk).update(**update)
+    return update.get('status', EmailOutbox.STATUS_PENDING)
+
+def drain_outbox(batch_size=BATCH_SIZE, connection=None):
+    """
+    Sends every due email over a single SMTP connection.
+
+    Returns:
+        dict: number of emails sent, retried later and dead-lettered
+    """
+    stats = {'sent': 0, 'retried': 0, 'dead': 0}
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        while True:
+            entries = claim_due(batch_size)
+            if not entries:
+                break
+            for entry in entries:
+                try:
+                    # Open it ourselves: send_messages() closes the connections it had to
+                    # open. No-op while the session is up.
+                    connection.open()
+                    connection.send_messages([build_message(entry, connection)])
+                except Exception as e:
+                    status = record_failure(entry, e)
+                    stats['dead' if status == EmailOutbox.STATUS_DEAD else 'retried'] += 1
+                    # The session may be broken, start a fresh one for the next email
+                    close_quietly(connection)
+                    continue
+                EmailOutbox.objects.filter(pk=entry.pk).update(
+                    status=EmailOutbox.STATUS_SENT, sent_at=timezone.now(), last_error=''
+                )
+                stats['sent'] += 1
+    finally:
+        close_quietly(connection)
+    return stats
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception as e:
+        logger.warning(f"Error closing the SMTP connection: {e}")
+
+def purge_sent(days):
+    """Deletes the sent emails older than `days` days"""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_SENT, sent_at__lt=cutoff).delete()
+    return deleted
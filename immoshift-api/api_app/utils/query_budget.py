@@ -0,0 +1,51 @@
+import time
+
+# Transaction control statements are not counted against a budget
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'ROLLBACK')
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised instead of logging when QUERY_BUDGET_STRICT is enabled (tests)"""
+
+class QueryStats:
+    """connection.execute_wrapper callable counting queries and their SQL time"""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+                self.count += 1
+
+def query_budget(max_queries):
+    """
+    Declares the maximum number of SQL queries a function view may run.
+
+    ViewSets and ModelAdmins set a `query_budget` attribute instead, either an
+    int or a dict keyed by action ('list', 'retrieve') / admin view name
+    ('changelist_view', 'change_view').
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+def get_view_query_budget(view_func, request):
+    """Returns the budget declared for the view handling `request`, or None"""
+    key = None
+    if hasattr(view_func, 'model_admin'):
+        budget = getattr(view_func.model_admin, 'query_budget', None)
+        key = view_func.__name__
+    elif hasattr(view_func, 'cls') and hasattr(view_func, 'actions'):
+        budget = getattr(view_func.cls, 'query_budget', None)
+        key = (view_func.actions or {}).get(request.method.lower())
+    else:
+        budget = getattr(view_func, 'query_budget', None)
+
+    if isinstance(budget, dict):
+        return budget.get(key)
+    return budget
@@ -0,0 +1,119 @@
+"""
+HTTP byte ranges (RFC 9110 section 14) for the media view.
+
+Only what serving files needs: parsing `Range: bytes=...`, evaluating
+`If-Range`, and streaming one range or a multipart/byteranges body from an
+open file with bounded memory. The bodies don't close the file: a client can
+go away before iterating them, the view registers file.close() with the
+response, which closes it in every case.
+"""
+import re
+from django.utils.http import parse_http_date_safe
+
+BYTE_RANGE_RE = re.compile(r'^(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+# Past this many ranges the header is ignored and the whole file is sent
+MAX_RANGES = 16
+
+def parse_range_header(header, size):
+    """
+    Parses a Range header against a file of `size` bytes.
+
+    Overlapping and adjacent ranges are merged, so a client can't make us
+    send the same bytes many times.
+
+    Returns:
+        None if the header must be ignored (missing, malformed, not bytes or
+        too many ranges), [] if no range is satisfiable (416), otherwise a
+        sorted list of inclusive (start, end) offsets
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+    specs = [spec.strip() for spec in specs.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = BYTE_RANGE_RE.match(spec)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first == '':
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(0, size - length), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(int(last), size - 1) if last else size - 1))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def if_range_matches(header, etag, last_modified):
+    """
+    True if the Range header may be honoured given the If-Range validator.
+
+    `etag` must be a strong ETag and `last_modified` a timestamp in seconds.
+    """
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith('W/'):
+        return False  # Weak tags never match for ranges
+    if header.startswith('"'):
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+def iter_file_range(file, start, length, chunk_size=CHUNK_SIZE):
+    """Yields `length` bytes of `file` from `start`, `chunk_size` at a time"""
+    file.seek(start)
+    while length > 0:
+        chunk = file.read(min(chunk_size, length))
+        if not chunk:
+            break
+        length -= len(chunk)
+        yield chunk
+
+def multipart_byteranges(file, ranges, size, content_type, boundary):
+    """
+    Builds a multipart/byteranges body.
+
+    Returns:
+        tuple: (iterator over the body, exact Content-Length)
+    """
+    parts = [
+        (
+            (
+                f'\r\n--{boundary}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode('latin-1'),
+            start,
+            end,
+        )
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    length = sum(len(header) + end - start + 1 for header, start, end in parts) + len(closing)
+
+    def body():
+        for header, start, end in parts:
+            yield header
+            yield from iter_file_range(file, start, end - start + 1)
+        yield closing
+    return body(), length
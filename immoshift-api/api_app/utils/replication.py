@@ -0,0 +1,412 @@
+"""
+Continuous replication of the SQLite database by WAL shipping.
+
+In WAL mode every commit appends the pages it changed to the -wal file as
+frames, each one salted with the salts of the current WAL and checksummed
+together with all the frames before it. `WALShipper` (run by
+`manage.py replicate_database`) reads the new frames every
+SQLITE_REPLICA_INTERVAL seconds and uploads those up to the last commit
+frame, gzipped, to the `replica` storage of the STORAGES setting: a
+directory, or an S3 compatible bucket through django-storages. Frames are
+read from the file without taking any lock, requests don't see it.
+
+After a checkpoint SQLite rewrites the WAL from its start with new salts,
+so the shipper runs the checkpoints itself once SQLITE_REPLICA_CHECKPOINT_PAGES
+frames are shipped, well before the application's automatic checkpoint
+(`wal_autocheckpoint` of SQLITE_PRAGMAS). It ships and checkpoints while
+holding a read transaction, which keeps the WAL from being restarted, or the
+write lock for a few milliseconds if commits came in meanwhile: no frame can
+be lost when the next writer restarts the WAL. When the chain is broken
+anyway (WAL restarted by the automatic checkpoint or another process) the
+shipper starts a new generation: a new snapshot followed by its own WALs,
+the time in between can't be restored. A new generation is also started
+every SQLITE_REPLICA_SNAPSHOT_HOURS, and the generations that can't serve a
+restore within BACKUP_RETENTION_DAYS are pruned.
+
+Layout of the storage:
+
+    <generation>/snapshot.db.gz     online copy (utils/backup.py)
+    <generation>/snapshot.json      checksum, and from when it can be restored
+    <generation>/wal/<index>-<offset>-<shipped at>.wal.gz
+                                    bytes of the index-th WAL of the generation
+                                    from `offset`, the WAL header at offset 0
+
+Restoring to a point in time takes the last snapshot usable then and
+replays over it, one WAL after the other, the frames shipped until then,
+which SQLite recovers as it would after a crash. The precision is the
+shipping interval.
+"""
+import datetime
+import gzip
+import json
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from itertools import groupby
+from typing import NamedTuple
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from .backup import COMPRESSIONS, backup_database, compression_of, decompress_file, integrity_check
+
+WAL_HEADER = struct.Struct('>8I')
+FRAME_HEADER = struct.Struct('>6I')
+WAL_MAGIC = (0x377f0682, 0x377f0683)  # Checksums in little / big endian words
+TIME_FORMAT = '%Y%m%dT%H%M%S%fZ'
+SNAPSHOT_MANIFEST = 'snapshot.json'
+
+class ReplicationError(Exception):
+    """The replica can't be written or restored"""
+
+class GenerationBroken(ReplicationError):
+    """WAL frames were lost before being shipped, a new snapshot is needed"""
+
+class WALHeader(NamedTuple):
+    magic: int
+    version: int
+    page_size: int
+    checkpoint_seq: int
+    salt1: int
+    salt2: int
+    checksum1: int
+    checksum2: int
+
+    @property
+    def big_endian(self):
+        return self.magic == WAL_MAGIC[1]
+
+    @property
+    def frame_size(self):
+        return FRAME_HEADER.size + self.page_size
+
+def format_time(moment):
+    return moment.astimezone(datetime.timezone.utc).strftime(TIME_FORMAT)
+
+def parse_time(value):
+    return datetime.datetime.strptime(value, TIME_FORMAT).replace(tzinfo=datetime.timezone.utc)
+
+def wal_checksum(data, checksum, big_endian):
+    """SQLite's cumulative WAL checksum of `data` (a multiple of 8 bytes) from `checksum`"""
+    words = array('I')
+    words.frombytes(data)
+    if big_endian != (sys.byteorder == 'big'):
+        words.byteswap()
+    s0, s1 = checksum
+    it = iter(words)
+    for x0, x1 in zip(it, it):
+        s0 = (s0 + x0 + s1) & 0xFFFFFFFF
+        s1 = (s1 + x1 + s0) & 0xFFFFFFFF
+    return s0, s1
+
+def parse_wal_header(data):
+    """The WALHeader of a -wal file's first bytes, None unless it is a complete, valid header"""
+    if len(data) < WAL_HEADER.size:
+        return None
+    header = WALHeader(*WAL_HEADER.unpack_from(data))
+    if header.magic not in WAL_MAGIC:
+        return None
+    if wal_checksum(data[:24], (0, 0), header.big_endian) != (header.checksum1, header.checksum2):
+        return None
+    return header
+
+def scan_frames(data, header, checksum):
+    """
+    Walks the frames at the start of `data` that belong to the WAL of
+    `header` and chain with `checksum`.
+
+    Returns:
+        tuple: (length up to the end of the last commit frame, checksum there)
+    """
+    view = memoryview(data)
+    frame_size = header.frame_size
+    position = end = 0
+    committed = checksum
+    while position + frame_size <= len(data):
+        _, commit_size, salt1, salt2, checksum1, checksum2 = FRAME_HEADER.unpack_from(data, position)
+        if (salt1, salt2) != (header.salt1, header.salt2):
+            break  # Left over from the previous WAL
+        checksum = wal_checksum(view[position:position + 8], checksum, header.big_endian)
+        checksum = wal_checksum(view[position + FRAME_HEADER.size:position + frame_size], checksum, header.big_endian)
+        if checksum != (checksum1, checksum2):
+            break  # Being written, or rolled back
+        position += frame_size
+        if commit_size:
+            end, committed = position, checksum
+    return end, committed
+
+def get_storage():
+    return storages['replica']
+
+class WALShipper:
+    """Ships the WAL of the database at `db_path` to `storage`, see the module docstring"""
+
+    def __init__(self, db_path, storage=None, checkpoint_pages=None, compression=None):
+        self.db_path = str(db_path)
+        self.wal_path = f"{self.db_path}-wal"
+        self.storage = storage or get_storage()
+        self.checkpoint_pages = checkpoint_pages or settings.SQLITE_REPLICA_CHECKPOINT_PAGES
+        self.compression = compression or settings.SQLITE_BACKUP_COMPRESSION
+        # Also keeps the database open, so that the last application connection
+        # closing doesn't checkpoint and delete the WAL behind our back
+        timeout = settings.DATABASES['default']['OPTIONS'].get('timeout', 5)
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout, isolation_level=None)
+        # Holds the writers off while a checkpoint is prepared
+        self.lock = sqlite3.connect(self.db_path, timeout=timeout, isolation_level=None)
+        if self.conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+            self.close()
+            raise ReplicationError(f"{self.db_path} is not in WAL mode (SQLITE_JOURNAL_MODE)")
+        self.generation = None
+        self.snapshot_at = None
+
+    def close(self):
+        self.conn.close()
+        self.lock.close()
+
+    def start_generation(self):
+        """
+        Starts shipping from a new snapshot. Returns the generation's name.
+        If it fails, there is no current generation until the next one starts.
+        """
+        try:
+            return self._start_generation()
+        except BaseException:
+            self.generation = None
+            raise
+
+    def _start_generation(self):
+        self.generation = format_time(datetime.datetime.now(datetime.timezone.utc))
+        self.index = 0
+        self.header = self.wal = self.checksum = None
+        self.offset = 0
+        self.checkpointed = False
+        # The current WAL from its start (its frames are replayed over the snapshot),
+        # checkpointed for the next writer to restart it
+        self.checkpoint()
+
+        with tempfile.TemporaryDirectory(dir=settings.SQLITE_BACKUP_DIR) as temp_dir:
+            result = backup_database(self.db_path, os.path.join(temp_dir, 'snapshot.db'), self.compression)
+            name = f"{self.generation}/snapshot.db{COMPRESSIONS[self.compression]}"
+            with open(result['path'], 'rb') as f:
+                name = self.storage.save(name, File(f))
+
+        # Whatever the snapshot contains is shipped by then
+        shipped_at = self.sync()
+        manifest = {
+            'snapshot': name,
+            'restorable_from': format_time(shipped_at),
+            'sha256': result['sha256'],
+            'size': result['size'],
+        }
+        self.storage.save(f"{self.generation}/{SNAPSHOT_MANIFEST}", ContentFile(json.dumps(manifest, indent=2)))
+        self.snapshot_at = time.monotonic()
+        return self.generation
+
+    def shipped_frames(self):
+        if self.wal is None or self.offset < WAL_HEADER.size:
+            return 0
+        return (self.offset - WAL_HEADER.size) // self.wal.frame_size
+
+    def sync(self):
+        """
+        Ships the frames committed since the last sync.
+
+        Returns:
+            datetime: when the WAL was read, everything committed before is shipped
+        """
+        try:
+            with open(self.wal_path, 'rb') as f:
+                header = f.read(WAL_HEADER.size)
+                if header != self.header:
+                    wal = parse_wal_header(header)
+                    if wal is None:
+                        # Empty (truncated by the checkpoint) or not fully written yet
+                        return datetime.datetime.now(datetime.timezone.utc)
+                    if self.header is not None:
+                        # Restarted once, by the first writer after our checkpoint
+                        if not self.checkpointed or wal.checkpoint_seq != self.wal.checkpoint_seq + 1:
+                            raise GenerationBroken("The WAL was restarted before all its frames were shipped")
+                        self.index += 1
+                    self.header, self.wal, self.checksum = header, wal, (wal.checksum1, wal.checksum2)
+                    self.offset = 0
+                    self.checkpointed = False
+                start = max(self.offset, WAL_HEADER.size)
+                f.seek(start)
+                data = f.read()
+        except FileNotFoundError:
+            return datetime.datetime.now(datetime.timezone.utc)
+        shipped_at = datetime.datetime.now(datetime.timezone.utc)
+
+        end, checksum = scan_frames(data, self.wal, self.checksum)
+        if end:
+            payload = (self.header if self.offset == 0 else b'') + data[:end]
+            name = f"{self.generation}/wal/{self.index:08d}-{self.offset:012d}-{format_time(shipped_at)}.wal.gz"
+            self.storage.save(name, ContentFile(gzip.compress(payload, compresslevel=6)))
+            self.offset, self.checksum = start + end, checksum
+            # Written after the checkpoint, instead of restarting the WAL (readers prevented it)
+            self.checkpointed = False
+        return shipped_at
+
+    def checkpoint(self):
+        """
+        Checkpoints the WAL once everything in it is shipped, so that the next
+        writer restarts it.
+
+        Returns:
+            bool: whether all the frames were checkpointed (not while readers need them)
+        """
+        # A reader at the last commit: the WAL can't be restarted while we ship and checkpoint
+        self.lock.execute("BEGIN")
+        self.lock.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+        try:
+            self.checkpointed = self.ship_and_checkpoint()
+        finally:
+            self.lock.execute("ROLLBACK")
+        if not self.checkpointed:
+            # Committed meanwhile, the checkpoint stopped at our snapshot: hold the
+            # writers off for the few frames left
+            self.lock.execute("BEGIN IMMEDIATE")
+            try:
+                self.checkpointed = self.ship_and_checkpoint()
+            finally:
+                self.lock.execute("ROLLBACK")
+        return self.checkpointed
+
+    def ship_and_checkpoint(self):
+        self.sync()
+        busy, frames, checkpointed = self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        return not busy and frames == checkpointed == self.shipped_frames()
+
+    def step(self, snapshot_interval=None):
+        """One iteration of the replication loop. Returns the new generation's name if one was started"""
+        if self.generation is None:
+            return self.start_generation()
+        try:
+            self.sync()
+            # Once checkpointed, the next writer restarts the WAL
+            if not self.checkpointed and self.shipped_frames() >= self.checkpoint_pages:
+                self.checkpoint()
+        except GenerationBroken:
+            return self.start_generation()
+        if snapshot_interval and time.monotonic() - self.snapshot_at >= snapshot_interval:
+            return self.start_generation()
+        return None
+
+def list_generations(storage=None):
+    """
+    Returns:
+        list: (generation, manifest or None when the snapshot isn't complete), oldest first
+    """
+    storage = storage or get_storage()
+    if not storage.exists(''):
+        return []
+    generations = []
+    for generation in sorted(storage.listdir('')[0]):
+        manifest = None
+        if storage.exists(f"{generation}/{SNAPSHOT_MANIFEST}"):
+            with storage.open(f"{generation}/{SNAPSHOT_MANIFEST}") as f:
+                manifest = json.loads(f.read())
+            manifest['restorable_from'] = parse_time(manifest['restorable_from'])
+        generations.append((generation, manifest))
+    return generations
+
+def list_segments(storage, generation):
+    """(WAL index, offset, shipped at, name) of a generation's WAL segments, in order"""
+    if not storage.exists(f"{generation}/wal"):
+        return []
+    segments = []
+    for filename in storage.listdir(f"{generation}/wal")[1]:
+        index, offset, shipped_at = filename.split('.')[0].split('-')
+        segments.append((int(index), int(offset), parse_time(shipped_at), f"{generation}/wal/{filename}"))
+    return sorted(segments)
+
+def delete_generation(storage, generation):
+    for _, _, _, name in list_segments(storage, generation):
+        storage.delete(name)
+    for filename in storage.listdir(generation)[1]:
+        storage.delete(f"{generation}/{filename}")
+    for path in (f"{generation}/wal", generation):
+        # Directories are left behind by FileSystemStorage, S3 has none
+        if hasattr(storage, 'path') and os.path.isdir(storage.path(path)):
+            os.rmdir(storage.path(path))
+
+def prune_generations(days, current=None, storage=None):
+    """
+    Deletes the generations no restore within the last `days` days would use:
+    those followed by a generation restorable from before that, and the
+    incomplete ones. Returns the names deleted.
+    """
+    storage = storage or get_storage()
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    generations = list_generations(storage)
+    deleted = []
+    for position, (generation, manifest) in enumerate(generations):
+        if generation == current:
+            continue
+        later = [m for _, m in generations[position + 1:] if m is not None]
+        if manifest is None or (later and later[0]['restorable_from'] <= cutoff):
+            delete_generation(storage, generation)
+            deleted.append(generation)
+    return deleted
+
+def restore_database(destination, at=None, storage=None):
+    """
+    Rebuilds at `destination` the database as it was at the datetime `at`
+    (now by default), within the shipping interval.
+
+    Returns:
+        dict: generation used, frames replayed, time of the last WAL segment applied
+    """
+    storage = storage or get_storage()
+    at = at or datetime.datetime.now(datetime.timezone.utc)
+    usable = [(g, m) for g, m in list_generations(storage) if m is not None and m['restorable_from'] <= at]
+    if not usable:
+        raise ReplicationError(f"No snapshot to restore {at.isoformat()} from")
+    generation, manifest = usable[-1]
+
+    for path in (destination, f"{destination}-wal", f"{destination}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    with storage.open(manifest['snapshot'], 'rb') as f:
+        sha256 = decompress_file(f, destination, compression_of(manifest['snapshot']))
+    if sha256 != manifest['sha256']:
+        raise ReplicationError(f"Checksum mismatch on {manifest['snapshot']}")
+    conn = sqlite3.connect(destination)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    replayed, last_applied = 0, manifest['restorable_from']
+    segments = [segment for segment in list_segments(storage, generation) if segment[2] <= at]
+    for index, wal_segments in groupby(segments, key=lambda segment: segment[0]):
+        data = bytearray()
+        for _, offset, shipped_at, name in wal_segments:
+            if offset != len(data):
+                raise ReplicationError(f"WAL segment missing before {name}")
+            with storage.open(name, 'rb') as f:
+                data += gzip.decompress(f.read())
+            last_applied = max(last_applied, shipped_at)
+        header = parse_wal_header(data)
+        if header is None:
+            raise ReplicationError(f"Invalid header on WAL {index} of {generation}")
+
+        with open(f"{destination}-wal", 'wb') as f:
+            f.write(data)
+        # Opening the database recovers the WAL, the checkpoint writes it into the file
+        conn = sqlite3.connect(destination)
+        try:
+            busy, frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            # Empties it for the next one (TRUNCATE reports 0 frames, hence the PASSIVE first)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+        expected = (len(data) - WAL_HEADER.size) // header.frame_size
+        if busy or not frames == checkpointed == expected:
+            raise ReplicationError(f"WAL {index} of {generation}: {checkpointed} of {expected} frames replayed")
+        replayed += frames
+
+    integrity_check(destination)
+    return {'generation': generation, 'frames': replayed, 'restored_to': last_applied}
@@ -0,0 +1,216 @@
+"""
+Full-text search over articles, trainings and paragraphs (SQLite FTS5).
+
+The `api_app_search_index` virtual table is created by migration 0009 and
+kept in sync by SQL triggers, so bulk_create(), queryset.update() and raw
+writes are indexed too (signals.py re-creates them after each migrate).
+Each row has a rowid derived from the source row (id * 4 + kind code),
+which keeps trigger updates a single rowid lookup. Paragraph rows carry
+their parent article/training so hits can be grouped without joining back
+to the paragraph table.
+
+Query words are matched as prefixes, whole: words of up to 6 characters
+are served by a prefix index, longer ones by a range scan of the few terms
+they start. Every match is ranked by BM25 through FTS5's `rank` column,
+SQLite keeping only the best `limit` rows while it scores them.
+"""
+import re
+from django.db import connection
+from django.utils.html import escape
+
+INDEX_TABLE = 'api_app_search_index'
+
+# rowid = id * KIND_STRIDE + code
+KIND_STRIDE = 4
+KIND_CODES = {'article': 1, 'paragraph': 2, 'training': 3}
+
+# Title matches weigh more than body matches in the BM25 score
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+# `rank` of the queries, one weight per column (kind, parent_kind, parent_id, title, body)
+RANK_FUNCTION = f'bm25(0, 0, 0, {TITLE_WEIGHT}, {BODY_WEIGHT})'
+
+# snippet() markers, swapped for <mark> once the text has been escaped
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+SNIPPET_TOKENS = 16
+
+TOKEN_RE = re.compile(r'\w+')
+PREFIX_LENGTHS = (2, 3, 4, 5, 6)
+
+CREATE_INDEX_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5(
+        kind UNINDEXED, parent_kind UNINDEXED, parent_id UNINDEXED, title, body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '{' '.join(str(length) for length in PREFIX_LENGTHS)}'
+    )
+    """,
+]
+
+# (table, kind, parent_kind expression, parent_id expression, title, body, watched columns)
+SOURCES = [
+    ('api_app_article', 'article', "'article'", '{row}.id', '{row}.title', '{row}.excerpt', 'title, excerpt'),
+    ('api_app_training', 'training', "'training'", '{row}.id', '{row}.title', '{row}.short_description',
+     'title, short_description'),
+    ('api_app_paragraph', 'paragraph',
+     "CASE WHEN {row}.article_id IS NOT NULL THEN 'article' ELSE 'training' END",
+     'COALESCE({row}.article_id, {row}.training_id)', '{row}.title', '{row}.content',
+     'title, content, article_id, training_id'),
+]
+
+def _source_select(kind, parent_kind, parent_id, title, body, row):
+    """SELECT list producing one index row from the source row alias `row`"""
+    code = KIND_CODES[kind]
+    return (
+        f"{row}.id * {KIND_STRIDE} + {code}, '{kind}', {parent_kind.format(row=row)}, "
+        f"{parent_id.format(row=row)}, {title.format(row=row)}, {body.format(row=row)}"
+    )
+
+def _trigger_sql():
+    statements = []
+    columns = '(rowid, kind, parent_kind, parent_id, title, body)'
+    for table, kind, parent_kind, parent_id, title, body, watched in SOURCES:
+        code = KIND_CODES[kind]
+        insert = f"INSERT INTO {INDEX_TABLE} {columns} VALUES ({_source_select(kind, parent_kind, parent_id, title, body, 'new')});"
+        delete = f"DELETE FROM {INDEX_TABLE} WHERE rowid = old.id * {KIND_STRIDE} + {code};"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {watched} ON {table} "
+            f"BEGIN {delete} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        ]
+    return statements
+
+def create_index_sql():
+    """Statements creating the index table and its sync triggers"""
+    return CREATE_INDEX_SQL + _trigger_sql()
+
+def drop_index_sql():
+    statements = []
+    for table, *_ in SOURCES:
+        statements += [f"DROP TRIGGER IF EXISTS {table}_search_{suffix}" for suffix in ('ai', 'au', 'ad')]
+    return statements + [f"DROP TABLE IF EXISTS {INDEX_TABLE}"]
+
+def ensure_triggers(using):
+    """
+    Re-creates missing sync triggers. SQLite migrations that rebuild a table
+    (most AddField/AlterField) drop its triggers, so this runs after migrate.
+    """
+    if using.vendor != 'sqlite' or INDEX_TABLE not in using.introspection.table_names():
+        return
+    with using.cursor() as cursor:
+        for statement in _trigger_sql():
+            cursor.execute(statement)
+
+def is_available():
+    """FTS5 search only exists on SQLite, other backends keep the LIKE search"""
+    return connection.vendor == 'sqlite'
+
+def rebuild_index(using=None):
+    """
+    Empties the index and fills it again from the source tables.
+
+    Returns:
+        int: number of indexed rows
+    """
+    with (using or connection).cursor() as cursor:
+        for statement in create_index_sql():
+            cursor.execute(statement)
+        cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+        for table, kind, parent_kind, parent_id, title, body, _ in SOURCES:
+            cursor.execute(
+                f"INSERT INTO {INDEX_TABLE} (rowid, kind, parent_kind, parent_id, title, body) "
+                f"SELECT {_source_select(kind, parent_kind, parent_id, title, body, 's')} FROM {table} s"
+            )
+        # Merge the b-tree segments left by the bulk insert
+        cursor.execute(f"INSERT INTO {INDEX_TABLE} ({INDEX_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {INDEX_TABLE}")
+        return cursor.fetchone()[0]
+
+def build_match_expression(query):
+    """
+    Turns free text into an FTS5 query: every word must match, as a prefix.
+
+    "négociation immo a" -> '"négociation"* "immo"* "a"'. Single letters have no
+    prefix index and are matched as whole words. Returns '' when there is
+    nothing to search.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(query):
+        if len(token) < PREFIX_LENGTHS[0]:
+            terms.append(f'"{token}"')
+        else:
+            terms.append(f'"{token}"*')
+    return ' '.join(terms)
+
+def highlight(snippet):
+    """Escapes a snippet and turns the match markers into <mark> tags"""
+    return escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+def search_index(query, limit=50):
+    """
+    Best matching index rows, best first.
+
+    Returns:
+        list: dicts with rowid, kind, object_id, parent_kind, parent_id and score
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    sql = (
+        f"SELECT rowid, kind, parent_kind, parent_id, rank FROM {INDEX_TABLE} "
+        f"WHERE {INDEX_TABLE} MATCH %s AND rank MATCH %s ORDER BY rank LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [expression, RANK_FUNCTION, limit])
+        rows = cursor.fetchall()
+    return [
+        {
+            'rowid': rowid,
+            'kind': kind,
+            'object_id': rowid // KIND_STRIDE,
+            'parent_kind': parent_kind,
+            'parent_id': parent_id,
+            # bm25() is negative, lower is better
+            'score': -score,
+        }
+        for rowid, kind, parent_kind, parent_id, score in rows
+    ]
+
+def get_snippets(query, rowids):
+    """
+    Highlighted extracts of the given index rows.
+
+    Returns:
+        dict: rowid -> snippet HTML, matches wrapped in <mark>
+    """
+    expression = build_match_expression(query)
+    if not expression or not rowids:
+        return {}
+    sql = (
+        f"SELECT rowid, snippet({INDEX_TABLE}, -1, %s, %s, '…', %s) FROM {INDEX_TABLE} "
+        f"WHERE {INDEX_TABLE} MATCH %s AND rowid IN ({', '.join(['%s'] * len(rowids))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS, expression, *rowids])
+        return {rowid: highlight(snippet) for rowid, snippet in cursor.fetchall()}
+
+def matching_ids_sql(query, kind=None, parent_kind=None):
+    """
+    Subquery selecting the ids matching `query`, to use as `pk__in=RawSQL(...)`.
+
+    With `kind`, ids of that kind of row; with `parent_kind`, ids of the
+    articles/trainings whose own text or paragraphs match.
+
+    Returns:
+        tuple: (sql, params), or None if the query has no searchable words
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return None
+    if kind is not None:
+        sql = f"SELECT rowid / {KIND_STRIDE} FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND kind = %s"
+        return sql, (expression, kind)
+    sql = f"SELECT parent_id FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND parent_kind = %s"
+    return sql, (expression, parent_kind)
@@ -0,0 +1,176 @@
+"""
+Sitemaps rendered to files, regenerated when the listed content changes.
+
+Crawlers fetch the sitemaps all day while the content changes a few times a
+week, so the XML is written once to SITEMAP_DIR and served from there:
+
+    sitemap.xml                 index of the section pages
+    sitemap-<section>.xml       first page of a section (api_app/urls.py `sitemaps`)
+    sitemap-<section>-<n>.xml   n-th page, served as sitemap-<section>.xml?p=<n>
+
+A section is read with values_list('slug', 'updated_at') and cut in pages
+of SITEMAP_MAX_URLS URLs (the protocol's limit is 50,000). Saving or
+deleting a listed object regenerates its section and the index once the
+transaction commits, a single time however many objects it touched. A page
+whose XML didn't change isn't rewritten: the modification time of a file is
+when its content last changed, served as Last-Modified and given as the
+lastmod of the index entries. The index stores paths only, the host it is
+served from is added to them in the response.
+"""
+import datetime
+import os
+import re
+import tempfile
+import threading
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+PAGE_NAME = re.compile(r'^sitemap-(?P<section>[\w-]+?)(?:-(?P<page>\d+))?\.xml$')
+
+# Sections to regenerate at the end of the current transaction, per thread
+_pending = threading.local()
+
+def get_sitemaps():
+    from ..urls import sitemaps
+    return sitemaps
+
+def page_name(section, page=1):
+    return f"sitemap-{section}.xml" if page == 1 else f"sitemap-{section}-{page}.xml"
+
+def page_url(section, page=1):
+    return f"/sitemap-{section}.xml" if page == 1 else f"/sitemap-{section}.xml?p={page}"
+
+def format_lastmod(value):
+    if isinstance(value, datetime.datetime):
+        return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    return value.isoformat()
+
+def render_urlset(sitemap, items):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<urlset xmlns="{SITEMAP_NAMESPACE}">']
+    for item in items:
+        lines.append(f"<url><loc>{escape(sitemap.location(item))}</loc>")
+        lastmod = sitemap.lastmod(item)
+        if lastmod:
+            lines.append(f"<lastmod>{format_lastmod(lastmod)}</lastmod>")
+        lines.append(f"<changefreq>{sitemap.changefreq}</changefreq><priority>{sitemap.priority}</priority></url>")
+    lines.append('</urlset>\n')
+    return '\n'.join(lines).encode('utf-8')
+
+def write_file(name, content):
+    """Writes `content` to the file `name` of SITEMAP_DIR unless it holds it already, returns whether it did"""
+    path = os.path.join(settings.SITEMAP_DIR, name)
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    # Renamed over the old file: requests never read a half-written one
+    fd, temp_path = tempfile.mkstemp(dir=settings.SITEMAP_DIR, prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+def section_pages(section):
+    """Page numbers of the files of `section` in SITEMAP_DIR, sorted"""
+    pages = []
+    for name in os.listdir(settings.SITEMAP_DIR):
+        match = PAGE_NAME.match(name)
+        if match and match['section'] == section:
+            pages.append(int(match['page'] or 1))
+    return sorted(pages)
+
+def write_section(section, sitemap):
+    """
+    Renders the pages of `section`.
+
+    Returns:
+        int: number of files written (unchanged pages aren't)
+    """
+    limit = settings.SITEMAP_MAX_URLS
+    items = list(sitemap.items())
+    pages = [items[start:start + limit] for start in range(0, len(items), limit)] or [[]]
+    written = 0
+    for number, page_items in enumerate(pages, 1):
+        written += write_file(page_name(section, number), render_urlset(sitemap, page_items))
+    # The section shrank
+    for number in section_pages(section):
+        if number > len(pages):
+            os.remove(os.path.join(settings.SITEMAP_DIR, page_name(section, number)))
+            written += 1
+    return written
+
+def write_index():
+    """Renders the index from the section pages on disk, no query"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">']
+    for section in get_sitemaps():
+        for number in section_pages(section):
+            mtime = os.path.getmtime(os.path.join(settings.SITEMAP_DIR, page_name(section, number)))
+            lastmod = datetime.datetime.fromtimestamp(int(mtime), datetime.timezone.utc)
+            lines.append(f"<sitemap><loc>{escape(page_url(section, number))}</loc><lastmod>{format_lastmod(lastmod)}</lastmod></sitemap>")
+    lines.append('</sitemapindex>\n')
+    return write_file('sitemap.xml', '\n'.join(lines).encode('utf-8'))
+
+def regenerate(sections=None):
+    """
+    Renders `sections` (all by default) then the index.
+
+    Returns:
+        int: number of files written
+    """
+    os.makedirs(settings.SITEMAP_DIR, exist_ok=True)
+    sitemaps = get_sitemaps()
+    written = 0
+    for section in sections if sections is not None else sitemaps:
+        written += write_section(section, sitemaps[section])
+    return written + write_index()
+
+def sections_of(model):
+    return [section for section, sitemap in get_sitemaps().items() if getattr(sitemap, 'model', None) is model]
+
+def schedule_regeneration(sections):
+    """Regenerates `sections` once the current transaction commits"""
+    if not hasattr(_pending, 'sections'):
+        _pending.sections = set()
+    _pending.sections.update(sections)
+    # The first callback to run renders for all the saves of the transaction, the
+    # others find nothing left. After a rollback the sections wait for the next commit.
+    transaction.on_commit(regenerate_pending)
+
+def regenerate_pending():
+    sections, _pending.sections = getattr(_pending, 'sections', set()), set()
+    if not sections:
+        return
+    try:
+        regenerate(sorted(sections))
+    except Exception:
+        # The content is saved, the next change or generate_sitemaps catches up
+        logger.exception(f"Sitemap regeneration failed for {sorted(sections)}")
+
+def get_sitemap_path(section=None, page=1):
+    """
+    Path of a sitemap file, the files being rendered first if there are none
+    (first request after a deploy).
+
+    Returns:
+        str: the path, None if there is no such section or page
+    """
+    if section is not None and section not in get_sitemaps():
+        return None
+    name = 'sitemap.xml' if section is None else page_name(section, page)
+    path = os.path.join(settings.SITEMAP_DIR, name)
+    if not os.path.exists(os.path.join(settings.SITEMAP_DIR, 'sitemap.xml')):
+        regenerate()
+    return path if os.path.exists(path) else None
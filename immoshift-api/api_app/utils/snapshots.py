@@ -0,0 +1,306 @@
+"""
+Deduplicated, incremental backups of the database and the media files.
+
+`backup_database` writes a full copy of the database file on every run and
+MEDIA_ROOT (videos, PDFs, images) is not saved at all. A snapshot
+(`manage.py backup_snapshot`) saves both to a content addressed store: every
+file is cut in BACKUP_CHUNK_SIZE chunks named after their SHA-256, a chunk is
+written once whatever the number of files and runs it appears in, and each
+run writes a manifest listing its files and their chunks.
+
+The database is read through an online copy (utils/backup.py), whose pages
+stay in place from one run to the next: only the chunks holding changed
+pages are new. A media file whose size and modification time are those of
+the previous manifest is taken from it without being read, the others are
+hashed by a pool of BACKUP_WORKERS threads, large files in segments
+(hashlib and zlib release the GIL on large buffers). Chunks are zlib
+compressed, except for the formats that already are.
+
+Manifests older than BACKUP_RETENTION_DAYS are deleted, the latest one is
+always kept, then the chunks no manifest refers to anymore. A lock file
+keeps a snapshot and a prune from running at the same time, a chunk being
+reused by one while the other deletes it.
+
+Layout of BACKUP_STORE_DIR:
+
+    chunks/<sha256[:2]>/<sha256>    a chunk, after a one byte header: z (zlib) or r (raw)
+    manifests/<created at>.json     the files of a snapshot and their chunks
+    lock
+"""
+import datetime
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from .backup import BackupError, copy_database, integrity_check
+from .replication import format_time, parse_time
+
+# Chunks per task, for the pool to hash a large file on several threads
+SEGMENT_CHUNKS = 16
+# Not worth compressing again
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.mp4', '.webm', '.mov', '.m4v', '.mp3', '.zip', '.gz', '.zst',
+}
+
+class SnapshotError(BackupError):
+    """The store is damaged or the snapshot can't be found"""
+
+class ChunkStore:
+    """Chunks and manifests under `root`"""
+
+    def __init__(self, root, chunk_size=1024 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.chunks_dir = os.path.join(root, 'chunks')
+        self.manifests_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    @contextmanager
+    def lock(self):
+        with open(os.path.join(self.root, 'lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def put(self, data, compress=True):
+        """
+        Stores the chunk `data` unless it already is.
+
+        Returns:
+            tuple: (SHA-256 of `data`, bytes written, 0 when it was known)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        payload = b'r' + data
+        if compress:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data) * 0.9:
+                payload = b'z' + compressed
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside then renamed: a chunk under its name is always complete,
+        # two threads storing the same chunk both succeed
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return digest, len(payload)
+
+    def get(self, digest):
+        """The chunk `digest`, checked against its name"""
+        try:
+            with open(self.chunk_path(digest), 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            raise SnapshotError(f"Missing chunk {digest}")
+        data = zlib.decompress(payload[1:]) if payload[:1] == b'z' else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise SnapshotError(f"Corrupted chunk {digest}")
+        return data
+
+    def store_segment(self, path, start, end, compress=True):
+        """
+        Stores the bytes `start` to `end` of the file `path`.
+
+        Returns:
+            tuple: (list of chunk digests, bytes written)
+        """
+        chunks, written = [], 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            position = start
+            while position < end and (data := f.read(min(self.chunk_size, end - position))):
+                digest, size = self.put(data, compress)
+                chunks.append(digest)
+                written += size
+                position += len(data)
+        return chunks, written
+
+    def restore_file(self, chunks, destination):
+        with open(destination, 'wb') as f:
+            for digest in chunks:
+                f.write(self.get(digest))
+
+    def manifest_names(self):
+        """Names of the manifests, oldest first"""
+        return sorted(name[:-5] for name in os.listdir(self.manifests_dir) if name.endswith('.json'))
+
+    def read_manifest(self, name):
+        try:
+            with open(os.path.join(self.manifests_dir, f"{name}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SnapshotError(f"No snapshot {name}")
+
+    def write_manifest(self, manifest):
+        path = os.path.join(self.manifests_dir, f"{manifest['name']}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
+
+    def prune(self, days):
+        """
+        Deletes the manifests older than `days` but the latest, then the
+        chunks none of the remaining manifests refers to.
+
+        Returns:
+            dict: manifests and chunks deleted, bytes freed
+        """
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+        result = {'manifests': [], 'chunks': 0, 'bytes': 0}
+        with self.lock():
+            names = self.manifest_names()
+            for name in names[:-1]:
+                if parse_time(name) < cutoff:
+                    os.remove(os.path.join(self.manifests_dir, f"{name}.json"))
+                    result['manifests'].append(name)
+
+            references = Counter()
+            for name in self.manifest_names():
+                for entry in manifest_files(self.read_manifest(name)):
+                    references.update(entry['chunks'])
+            for prefix in os.listdir(self.chunks_dir):
+                directory = os.path.join(self.chunks_dir, prefix)
+                for digest in os.listdir(directory):
+                    # Left over temporary files (killed during put()) go too
+                    if references[digest] == 0:
+                        path = os.path.join(directory, digest)
+                        result['bytes'] += os.path.getsize(path)
+                        os.remove(path)
+                        result['chunks'] += 1
+        return result
+
+def manifest_files(manifest):
+    """The database entry then the media entries of a manifest"""
+    yield manifest['database']
+    yield from manifest['media'].values()
+
+def walk_files(root):
+    """Relative paths and os.stat() results of the regular files under `root`"""
+    if not os.path.isdir(root):
+        return
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            if os.path.islink(path):
+                continue
+            yield os.path.relpath(path, root).replace(os.sep, '/'), os.stat(path)
+
+def store_files(store, files, workers):
+    """
+    Stores the files of `files` ({key: (path, size, compress)}) with a pool of `workers` threads.
+
+    Returns:
+        tuple: ({key: list of chunk digests}, bytes written)
+    """
+    segment_size = store.chunk_size * SEGMENT_CHUNKS
+    chunks, written = {}, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            key: [
+                executor.submit(store.store_segment, path, start, min(start + segment_size, size), compress)
+                for start in range(0, max(size, 1), segment_size)
+            ]
+            for key, (path, size, compress) in files.items()
+        }
+        for key, segments in futures.items():
+            chunks[key] = []
+            for future in segments:
+                segment_chunks, segment_written = future.result()
+                chunks[key] += segment_chunks
+                written += segment_written
+    return chunks, written
+
+def create_snapshot(db_path, media_root, store, workers=4, full=False, pages=256, pause=0.01):
+    """
+    Saves the database `db_path` (a path or a file: URI) and the files under
+    `media_root` to `store`. Unless `full`, media files unchanged since the
+    previous snapshot by size and modification time aren't read.
+
+    Returns:
+        dict: the manifest written
+    """
+    start = time.perf_counter()
+    with store.lock(), tempfile.TemporaryDirectory(dir=store.root) as temp_dir:
+        names = store.manifest_names()
+        previous = store.read_manifest(names[-1])['media'] if names and not full else {}
+
+        db_copy = os.path.join(temp_dir, 'database.sqlite3')
+        page_count = copy_database(db_path, db_copy, pages=pages, pause=pause)
+        integrity_check(db_copy)
+        files = {None: (db_copy, os.path.getsize(db_copy), True)}
+
+        media = {}
+        for relpath, stat in walk_files(media_root):
+            entry = previous.get(relpath)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                media[relpath] = entry
+                continue
+            media[relpath] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            compress = os.path.splitext(relpath)[1].lower() not in COMPRESSED_EXTENSIONS
+            files[relpath] = (os.path.join(media_root, relpath), stat.st_size, compress)
+
+        chunks, written = store_files(store, files, workers)
+        for relpath, file_chunks in chunks.items():
+            if relpath is not None:
+                media[relpath]['chunks'] = file_chunks
+
+        name = format_time(datetime.datetime.now(datetime.timezone.utc))
+        manifest = {
+            'name': name,
+            'chunk_size': store.chunk_size,
+            'database': {'size': files[None][1], 'pages': page_count, 'chunks': chunks.pop(None)},
+            'media': media,
+            'stats': {
+                'files': len(media),
+                'hashed_files': len(chunks),
+                'size': files[None][1] + sum(entry['size'] for entry in media.values()),
+                'written': written,
+                'duration': round(time.perf_counter() - start, 3),
+            },
+        }
+        store.write_manifest(manifest)
+    return manifest
+
+def restore_snapshot(name, db_destination, media_destination=None, store=None):
+    """
+    Writes the database of the snapshot `name` to `db_destination`, and its
+    media files under `media_destination` if given. Every chunk is checked
+    against its hash, the database with PRAGMA integrity_check.
+
+    Returns:
+        dict: the manifest restored
+    """
+    manifest = store.read_manifest(name)
+    store.restore_file(manifest['database']['chunks'], db_destination)
+    integrity_check(db_destination)
+    if media_destination is not None:
+        for relpath, entry in manifest['media'].items():
+            path = os.path.join(media_destination, *relpath.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            store.restore_file(entry['chunks'], path)
+            os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    return manifest
+
+def get_store():
+    return ChunkStore(settings.BACKUP_STORE_DIR, settings.BACKUP_CHUNK_SIZE)
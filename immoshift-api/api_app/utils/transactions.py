@@ -0,0 +1,88 @@
+"""
+Transactions for writes only, despite ATOMIC_REQUESTS.
+
+ATOMIC_REQUESTS wraps every view in a transaction, GETs included. On SQLite
+a reading transaction holds its SHARED lock (rollback journal) or its WAL
+snapshot until it ends, which makes the ebook download writes wait behind
+the page views and, in WAL mode, keeps checkpoints from completing.
+
+`atomic_writes` marks a view non-atomic for Django's request handler and
+opens the transaction itself for the unsafe methods only: GET, HEAD and
+OPTIONS run in autocommit, every query being its own deferred read, while
+POST & co keep the all-or-nothing view. `atomic_writes_urls` applies it to
+all the views of a URLconf, so new routes need nothing. The queries of a
+read view no longer share a snapshot, and a safe-method view that writes
+must open its own transaction.atomic().
+
+The write transactions begin IMMEDIATE on SQLite (`write_transaction()`,
+SQLITE_WRITE_TRANSACTION_MODE): the write lock is taken at BEGIN, waiting up
+to the busy timeout, rather than failing with "database is locked" when a
+deferred reader upgrades. Only there: the other transactions, like the
+admin's changeform_view() and delete_view() which run GETs in one too, stay
+DEFERRED and don't queue behind the writers.
+"""
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import connections, transaction
+from django.urls import URLResolver
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULT_WRITE_TRANSACTION_MODE = 'IMMEDIATE'
+
+@contextmanager
+def write_transaction(using=None):
+    """transaction.atomic() taking the SQLite write lock at BEGIN if it is the outermost one"""
+    connection = transaction.get_connection(using)
+    mode = getattr(settings, 'SQLITE_WRITE_TRANSACTION_MODE', DEFAULT_WRITE_TRANSACTION_MODE)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block or not mode:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # Read from the OPTIONS on connect, used by the BEGIN of the outermost atomic()
+    connection.ensure_connection()
+    configured = connection.transaction_mode
+    connection.transaction_mode = mode.upper()
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        connection.transaction_mode = configured
+
+def atomic_writes(view):
+    """Runs `view` in ATOMIC_REQUESTS' transaction for unsafe methods only"""
+    if hasattr(view, 'atomic_writes'):
+        return view
+    non_atomic = getattr(view, '_non_atomic_requests', set())
+    aliases = [
+        alias for alias, settings_dict in connections.settings.items()
+        if settings_dict['ATOMIC_REQUESTS'] and alias not in non_atomic
+    ]
+    if not aliases:
+        return view
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with ExitStack() as stack:
+            for alias in aliases:
+                # Within a transaction already (TestCase), a savepoint keeps DRF's
+                # set_rollback() on errors from breaking the outer one
+                if request.method not in SAFE_METHODS:
+                    stack.enter_context(write_transaction(using=alias))
+                elif connections[alias].in_atomic_block:
+                    stack.enter_context(transaction.atomic(using=alias))
+            return view(request, *args, **kwargs)
+
+    # Read by BaseHandler.make_view_atomic()
+    wrapper._non_atomic_requests = non_atomic | set(aliases)
+    wrapper.atomic_writes = True
+    return wrapper
+
+def atomic_writes_urls(patterns):
+    """Applies atomic_writes to every view of `patterns`, included URLconfs too"""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            atomic_writes_urls(pattern.url_patterns)
+        else:
+            pattern.callback = atomic_writes(pattern.callback)
+    return patterns
@@ -1,12 +1,27 @@
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
 from django.conf import settings
 from django.db.models import Q
-from django.http import FileResponse
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.encoding import escape_uri_path
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+import mimetypes
 import os
+import stat
+import uuid
+from datetime import date, timedelta
 from .models import Testimonial, Article, Training, Paragraph, Ebook, EbookDownload, RGPDContent
 from .serializers import (
     TestimonialSerializer, ArticleListSerializer, ArticleDetailSerializer,
@@ -15,62 +30,157 @@ from .serializers import (
     RGPDContentSerializer
 )
 from .utils.email_utils import send_ebook_confirmation_email, send_admin_ebook_download_notification
+from .fast_serializers import get_fast_serializer
+from .pagination import ArticleCursorPagination, ParagraphCursorPagination, TestimonialCursorPagination
+from .utils.content_cache import get_snapshot
+from .utils.conditional import content_condition, content_validators, object_condition
+from .utils.query_budget import query_budget
+from .utils.download_stats import download_series
+from .utils import search, sitemap_files
+from .utils.ranges import (
+    parse_range_header, if_range_matches, iter_file_range, multipart_byteranges
+)
+
+class SparseFieldsViewMixin:
+    """
+    Narrows the queryset to the fields requested with ?fields= / ?omit= and
+    serves reads through the compiled serializers when FAST_SERIALIZATION is on
+    """
+    def get_ordering_fields(self):
+        # The paginator reads its ordering key from each row, keep it loaded
+        return [name.lstrip('-') for name in getattr(self.paginator, 'ordering', ())]
+    
+    def get_queryset(self):
+        return self.get_serializer().optimize_queryset(super().get_queryset(), extra_fields=self.get_ordering_fields())
+    
+    def list(self, request, *args, **kwargs):
+        fast = get_fast_serializer(self.get_serializer())
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+        
+        queryset = fast.values_queryset(self.filter_queryset(self.get_queryset()), self.get_ordering_fields())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize_rows(page, request))
+        return Response(fast.serialize_rows(queryset, request))
+    
+    def retrieve(self, request, *args, **kwargs):
+        fast = get_fast_serializer(self.get_serializer())
+        if fast is None:
+            return super().retrieve(request, *args, **kwargs)
+        
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return Response(get_single_row(fast, queryset, request))
+
+def get_single_row(fast, queryset, request=None):
+    """Serializes the only row of `queryset` with a compiled serializer, 404 if missing"""
+    data = fast.serialize_rows(fast.values_queryset(queryset)[:1], request)
+    if not data:
+        raise Http404
+    return data[0]
+
+def serialize_list(serializer_class, queryset):
+    """`serializer_class(queryset, many=True).data`, through the fast path when enabled"""
+    serializer = serializer_class(queryset, many=True)
+    fast = get_fast_serializer(serializer)
+    if fast is None:
+        return serializer.data
+    return fast.serialize_rows(fast.values_queryset(queryset))
+
+def get_sparse_data(request, serializer_class, queryset, **lookup):
+    """
+    Looks up one object and returns its serialized data, narrowed to the
+    fields requested with ?fields= / ?omit=
+    """
+    serializer = serializer_class(fields=request.GET.get('fields'), omit=request.GET.get('omit'))
+    queryset = serializer.optimize_queryset(queryset)
+    
+    fast = get_fast_serializer(serializer)
+    if fast is not None:
+        return get_single_row(fast, queryset.filter(**lookup))
+    
+    serializer.instance = get_object_or_404(queryset, **lookup)
+    return serializer.data
 
 # ViewSets for models
-class TestimonialViewSet(viewsets.ReadOnlyModelViewSet):
+class TestimonialViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for listing testimonials"""
     queryset = Testimonial.objects.all()
     serializer_class = TestimonialSerializer
     permission_classes = [AllowAny]
+    query_budget = {'list': 1, 'retrieve': 1}
+    pagination_class = TestimonialCursorPagination
 
-class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(content_condition, name='list')
+@method_decorator(object_condition(Article.objects.filter(is_published=True)), name='retrieve')
+class ArticleViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for listing and retrieving articles"""
-    queryset = Article.objects.filter(is_published=True).order_by('-published_at')
+    queryset = Article.objects.filter(is_published=True).order_by('-published_at', 'id')
     permission_classes = [AllowAny]
+    query_budget = {'list': 1, 'retrieve': 3}
+    pagination_class = ArticleCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
             return ArticleListSerializer
         return ArticleDetailSerializer
 
-class TrainingViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(content_condition, name='list')
+@method_decorator(object_condition(Training.objects.filter(is_active=True)), name='retrieve')
+class TrainingViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for listing and retrieving trainings"""
     queryset = Training.objects.filter(is_active=True).order_by('position', 'id')
     permission_classes = [AllowAny]
+    query_budget = {'list': 1, 'retrieve': 3}
     
     def get_serializer_class(self):
         if self.action == 'list':
             return TrainingListSerializer
         return TrainingDetailSerializer
 
-class EbookViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(content_condition, name='list')
+@method_decorator(object_condition(Ebook.objects.filter(is_active=True)), name='retrieve')
+class EbookViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for listing and retrieving ebooks"""
     queryset = Ebook.objects.filter(is_active=True).order_by('position', 'id')
     permission_classes = [AllowAny]
+    query_budget = {'list': 1, 'retrieve': 2}
     
     def get_serializer_class(self):
         if self.action == 'list':
             return EbookSerializer
         return EbookDetailSerializer
 
-class ParagraphViewSet(viewsets.ReadOnlyModelViewSet):
+class ParagraphViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for retrieving paragraphs (not typically used directly)"""
-    queryset = Paragraph.objects.all().order_by('position')
+    queryset = Paragraph.objects.all().order_by('position', 'id')
     serializer_class = ParagraphSerializer
     permission_classes = [AllowAny]
+    query_budget = {'list': 1, 'retrieve': 1}
+    pagination_class = ParagraphCursorPagination
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def get_home_page_data(request):
+def build_home_page_payload(article_limit=None, articles_url=None):
     """
-    API endpoint for retrieving all home page content:
-    - Articles
-    - Testimonials
-    - Trainings
-    - Ebooks
+    Runs the home page queries and returns the rendered JSON bytes.
+    
+    With `article_limit`, only the first page of articles is included, plus an
+    `articles_next` link to the following page of `articles_url`.
     """
     # Get all published articles
-    published_articles = Article.objects.filter(is_published=True).order_by('-published_at')
+    published_articles = Article.objects.filter(is_published=True).select_related('author').order_by('-published_at', 'id')
+    fast_articles = get_fast_serializer(ArticleListSerializer())
+    if fast_articles is not None:
+        published_articles = fast_articles.values_queryset(published_articles, ['published_at', 'id'])
+    articles_next = None
+    if article_limit:
+        paginator = ArticleCursorPagination()
+        published_articles, next_cursor, _ = paginator.get_page(published_articles, article_limit)
+        if next_cursor:
+            articles_next = paginator.get_cursor_link(
+                replace_query_param(articles_url, paginator.page_size_query_param, article_limit),
+                next_cursor
+            )
     
     # Get all active testimonials
     testimonials = Testimonial.objects.all()
@@ -82,43 +192,91 @@ def get_home_page_data(request):
     ebooks = Ebook.objects.filter(is_active=True).order_by('position', 'id')
     
     # Serialize the data
-    articles_data = ArticleListSerializer(published_articles, many=True).data
-    testimonials_data = TestimonialSerializer(testimonials, many=True).data
-    trainings_data = TrainingListSerializer(trainings, many=True).data
-    ebooks_data = EbookSerializer(ebooks, many=True).data
+    if fast_articles is not None:
+        articles_data = fast_articles.serialize_rows(published_articles)
+    else:
+        articles_data = ArticleListSerializer(published_articles, many=True).data
+    testimonials_data = serialize_list(TestimonialSerializer, testimonials)
+    trainings_data = serialize_list(TrainingListSerializer, trainings)
+    ebooks_data = serialize_list(EbookSerializer, ebooks)
     
-    # Return the combined data
-    return Response({
+    data = {
         'articles': articles_data,
         'testimonials': testimonials_data,
         'trainings': trainings_data,
         'ebooks': ebooks_data,
-    })
+    }
+    if article_limit:
+        data['articles_next'] = articles_next
+    
+    # Render the combined data once, it is reused until the content changes
+    return JSONRenderer().render(data)
+
+@query_budget(4)
+@content_condition
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_home_page_data(request):
+    """
+    API endpoint for retrieving all home page content:
+    - Articles
+    - Testimonials
+    - Trainings
+    - Ebooks
+    
+    `?limit=N` returns only the first N articles and an `articles_next` cursor
+    link into /articles/.
+    
+    The payload is served from a snapshot invalidated by the content version
+    (see signals.py), so most requests never touch the database.
+    """
+    article_limit = None
+    articles_url = None
+    paginator = ArticleCursorPagination()
+    if paginator.page_size_query_param in request.query_params:
+        article_limit = paginator.get_page_size(request)
+        articles_url = request.build_absolute_uri(reverse('article-list'))
+    
+    payload = get_snapshot(
+        f'home:{article_limit}:{articles_url}',
+        lambda: build_home_page_payload(article_limit, articles_url)
+    )
+    return HttpResponse(payload, content_type='application/json')
 
+@query_budget(3)
+@object_condition(Article.objects.filter(is_published=True), 'slug')
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def article_detail(request, slug):
     """API endpoint for retrieving a specific article by its slug"""
-    article = get_object_or_404(Article, slug=slug, is_published=True)
-    serializer = ArticleDetailSerializer(article)
-    return Response(serializer.data)
+    data = get_sparse_data(
+        request, ArticleDetailSerializer, Article.objects.all(), slug=slug, is_published=True
+    )
+    return Response(data)
 
+@query_budget(3)
+@object_condition(Training.objects.filter(is_active=True), 'slug')
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def training_detail(request, slug):
     """API endpoint for retrieving a specific training by its slug"""
-    training = get_object_or_404(Training, slug=slug, is_active=True)
-    serializer = TrainingDetailSerializer(training)
-    return Response(serializer.data)
+    data = get_sparse_data(
+        request, TrainingDetailSerializer, Training.objects.all(), slug=slug, is_active=True
+    )
+    return Response(data)
 
+@query_budget(2)
+@object_condition(Ebook.objects.filter(is_active=True), 'slug')
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def ebook_detail(request, slug):
     """API endpoint for retrieving a specific ebook by its slug"""
-    ebook = get_object_or_404(Ebook, slug=slug, is_active=True)
-    serializer = EbookDetailSerializer(ebook)
-    return Response(serializer.data)
+    data = get_sparse_data(
+        request, EbookDetailSerializer, Ebook.objects.all(), slug=slug, is_active=True
+    )
+    return Response(data)
 
+@query_budget(8)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def download_ebook(request):
@@ -126,7 +284,8 @@ def download_ebook(request):
     API endpoint for downloading an ebook.
     Requires form data with user information.
     Records download information and returns the file URL.
-    Sends a confirmation email to the user using a template.
+    Queues the confirmation and admin emails in the same transaction, they
+    are sent by `manage.py send_outbox`.
     """
     serializer = EbookDownloadCreateSerializer(data=request.data, context={'request': request})
     
@@ -135,14 +294,14 @@ def download_ebook(request):
         ebook_download = serializer.save()
         ebook = ebook_download.ebook
         
-        # Send admin notification
+        # Queue admin notification
         send_admin_ebook_download_notification(ebook_download)
         
-        # Send user confirmation email
+        # Queue user confirmation email
         send_ebook_confirmation_email(
             ebook_download.email,
             ebook_download.first_name,
-            ebook.title
+            ebook
         )
         
         # Prepare download URL response
@@ -167,7 +326,70 @@ def download_ebook(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+SEARCH_MAX_RESULTS = 50
+# Paragraph hits are grouped under their article/training, fetch extra rows
+SEARCH_HITS_PER_RESULT = 5
 
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_content(request):
+    """
+    API endpoint for full-text search over articles and trainings.
+    
+    `?q=` is matched word by word as prefixes against titles, excerpts and
+    paragraphs. Results are ranked by BM25, one per article/training, with a
+    snippet where the matches are wrapped in <mark>. `?limit=N` (default 20).
+    """
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), SEARCH_MAX_RESULTS)
+    except ValueError:
+        limit = 20
+    if not query or not search.is_available():
+        return Response({'query': query, 'results': []})
+    
+    # Best hit per parent, in score order
+    best_hits = {}
+    for hit in search.search_index(query, limit=limit * SEARCH_HITS_PER_RESULT):
+        best_hits.setdefault((hit['parent_kind'], hit['parent_id']), hit)
+    
+    parents = {}
+    for kind, queryset in (
+        ('article', Article.objects.filter(is_published=True)),
+        ('training', Training.objects.filter(is_active=True)),
+    ):
+        ids = [parent_id for parent_kind, parent_id in best_hits if parent_kind == kind]
+        if ids:
+            for row in queryset.filter(pk__in=ids).values('id', 'slug', 'title'):
+                parents[(kind, row['id'])] = row
+    
+    matches = [
+        (key, hit, parents[key]) for key, hit in best_hits.items()
+        if key in parents  # Skips unpublished articles and inactive trainings
+    ][:limit]
+    
+    # Snippets are the costly part, only build the ones we return
+    snippets = search.get_snippets(query, [hit['rowid'] for _, hit, _ in matches])
+    results = [
+        {
+            'type': kind,
+            'id': parent['id'],
+            'slug': parent['slug'],
+            'title': parent['title'],
+            'snippet': snippets.get(hit['rowid'], ''),
+            'score': round(hit['score'], 4),
+        }
+        for (kind, _), hit, parent in matches
+    ]
+    return Response({'query': query, 'results': results})
+
+def rgpd_last_modified(request):
+    """Last-Modified for the legal notice, read without loading the row"""
+    return RGPDContent.objects.filter(pk=1).values_list('updated_at', flat=True).first()
+
+@query_budget(4)
+@content_validators(rgpd_last_modified)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def rgpd_content(request):
@@ -180,5 +402,190 @@ def rgpd_content(request):
         content.host_contact = "https://www.o2switch.fr/support-hebergeur/"
         content.save(update_fields=['host_name', 'host_address', 'host_contact', 'updated_at'])
 
-    serializer = RGPDContentSerializer(content)
+    serializer = RGPDContentSerializer(content, fields=request.GET.get('fields'), omit=request.GET.get('omit'))
     return Response(serializer.data)
+
+
+def sendfile_response(full_path, path, content_type):
+    """Hands the file over to the front server, which then handles ranges itself"""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + escape_uri_path(path)
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves a file of MEDIA_ROOT with byte-range support.
+    
+    Handles `Range` (single and multipart), `If-Range`, ETag/Last-Modified
+    revalidation and streams the body in bounded chunks. With MEDIA_SENDFILE
+    set, the file is handed to the front server (X-Sendfile for Apache,
+    X-Accel-Redirect for nginx) instead.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+    
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if settings.MEDIA_SENDFILE:
+        return sendfile_response(full_path, path, content_type)
+    
+    size = file_stat.st_size
+    last_modified = int(file_stat.st_mtime)
+    etag = f'"{file_stat.st_mtime_ns:x}-{size:x}"'
+    headers = {'ETag': etag, 'Last-Modified': http_date(last_modified), 'Accept-Ranges': 'bytes'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    
+    def finish(response):
+        for name, value in headers.items():
+            response[name] = value
+        return response
+    
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finish(not_modified)
+    
+    ranges = None
+    if request.method == 'GET' and if_range_matches(request.headers.get('If-Range'), etag, last_modified):
+        ranges = parse_range_header(request.headers.get('Range'), size)
+    
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return finish(response)
+    
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+        return finish(response)
+    
+    if ranges is None:
+        # FileResponse goes through wsgi.file_wrapper (sendfile) when the server has it
+        return finish(FileResponse(open(full_path, 'rb'), content_type=content_type))
+    
+    file = open(full_path, 'rb')
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            iter_file_range(file, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        boundary = uuid.uuid4().hex
+        body, length = multipart_byteranges(file, ranges, size, content_type, boundary)
+        response = StreamingHttpResponse(body, status=206, content_type=f'multipart/byteranges; boundary={boundary}')
+        response['Content-Length'] = str(length)
+    # Closed with the response like FileResponse's file, iterated or not
+    response._resource_closers.append(file.close)
+    return finish(response)
+
+@require_safe
+def serve_sitemap(request, section=None):
+    """
+    Serves the pre-rendered sitemap files (utils/sitemap_files.py): the index
+    at /sitemap.xml, the pages of a section at /sitemap-<section>.xml?p=<n>.
+    No query unless the files have to be rendered first.
+    """
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404
+    path = sitemap_files.get_sitemap_path(section, page) if page >= 1 else None
+    if path is None:
+        raise Http404
+    
+    file_stat = os.stat(path)
+    last_modified = int(file_stat.st_mtime)
+    etag = f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+    headers = {'ETag': etag, 'Last-Modified': http_date(last_modified), 'X-Robots-Tag': 'noindex, noodp, noarchive'}
+    
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None and section is None:
+        # The index stores paths, made absolute for the host serving it
+        with open(path, 'rb') as f:
+            base_url = request.build_absolute_uri('/').rstrip('/')
+            response = HttpResponse(f.read().replace(b'<loc>/', f'<loc>{base_url}/'.encode()), content_type='application/xml')
+    elif response is None:
+        response = FileResponse(open(path, 'rb'), content_type='application/xml')
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def ebook_download_stats(request):
+    """
+    Admin-only API endpoint with the download counters of every ebook.
+
+    Reads the denormalized Ebook.download_total, nothing is counted per request.
+    """
+    ebooks = list(
+        Ebook.objects.order_by('-download_total', 'id').values('id', 'slug', 'title', 'is_active', 'download_total')
+    )
+    return Response({
+        'total': sum(ebook['download_total'] for ebook in ebooks),
+        'ebooks': ebooks,
+    })
+
+STATS_DEFAULT_DAYS = 30
+# Longest range per granularity, which bounds the size of the series
+STATS_MAX_DAYS = {'day': 366, 'week': 3 * 366, 'month': 10 * 366}
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def download_time_series(request):
+    """
+    Admin-only API endpoint with the ebook download time series.
+
+    `?start=YYYY-MM-DD&end=YYYY-MM-DD` (default: the last 30 days),
+    `?granularity=day|week|month` and `?ebook=<slug>` (repeatable). Served
+    from the EbookDownloadDaily rollup: downloads, consents, consent rate,
+    new leads per ebook and overall, in total, per period and per ebook. A
+    new lead is an email downloading for the first time, not a distinct
+    email of the period (see utils/download_stats.py).
+    """
+    try:
+        end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else timezone.localdate()
+        start = (
+            date.fromisoformat(request.query_params['start']) if 'start' in request.query_params
+            else end - timedelta(days=STATS_DEFAULT_DAYS - 1)
+        )
+    except ValueError:
+        return Response({'detail': "Dates attendues au format AAAA-MM-JJ."}, status=status.HTTP_400_BAD_REQUEST)
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in STATS_MAX_DAYS:
+        return Response({'detail': f"Granularité attendue parmi {', '.join(STATS_MAX_DAYS)}."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if start > end or (end - start).days >= STATS_MAX_DAYS[granularity]:
+        return Response({'detail': f"Période invalide (au plus {STATS_MAX_DAYS[granularity]} jours par {granularity})."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    ebooks = {ebook['id']: ebook for ebook in Ebook.objects.values('id', 'slug', 'title')}
+    slugs = request.query_params.getlist('ebook')
+    ebook_ids = [ebook_id for ebook_id, ebook in ebooks.items() if ebook['slug'] in slugs] if slugs else None
+
+    series = download_series(start, end, granularity, ebook_ids)
+    return Response({
+        'start': start,
+        'end': end,
+        'granularity': granularity,
+        'totals': series['totals'],
+        'periods': series['periods'],
+        'ebooks': [
+            {**ebooks[ebook_id], 'series': ebook_series}
+            for ebook_id, ebook_series in sorted(series['ebooks'].items())
+            if ebook_id in ebooks
+        ],
+    })
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
@@ -29,6 +30,7 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.environ.get("DEBUG", "False") == "True"
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",")
 CORS_ORIGIN_WHITELIST = tuple(os.environ.get("CORS_ORIGIN_WHITELIST", "http://localhost:5173,http://127.0.0.1:5173").split(","))
@@ -63,6 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api_app.middleware.QueryBudgetMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -105,13 +108,37 @@ if DB_FILE_DIR:
 else:
     DB_FILE_PATH = BASE_DIR / DB_FILE_NAME
 
+# Applied to every new SQLite connection. WAL lets readers run while a write is
+# in progress, synchronous=NORMAL is durable across app crashes in WAL mode
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -20000)),  # Negative: in KiB
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 128 * 1024 * 1024)),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+    # Pages in the WAL before a commit checkpoints it, replicate_database checkpoints well before
+    "wal_autocheckpoint": int(os.environ.get("SQLITE_WAL_AUTOCHECKPOINT", 4000)),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": DB_FILE_PATH,
         "ATOMIC_REQUESTS": True,
+        # Keep the connection (and its page cache) across the requests of a Passenger worker
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+            # Seconds a writer waits for the lock (busy_timeout) before "database is locked"
+            "timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)) / 1000,
+        },
     }
 }
+# BEGIN mode of the unsafe-method requests (api_app/utils/transactions.py): IMMEDIATE takes the write
+# lock at BEGIN, waiting up to the timeout, rather than failing at the first write. Other transactions,
+# the admin's GETs included, stay DEFERRED
+SQLITE_WRITE_TRANSACTION_MODE = os.environ.get("SQLITE_TRANSACTION_MODE", "IMMEDIATE")
 
 # Ensure SQLite database directory has proper permissions
 import stat
@@ -125,6 +152,51 @@ SQLITE_BACKUP_DIR = os.path.join(BASE_DIR, os.environ.get('SQLITE_BACKUP_DIR', '
 os.makedirs(SQLITE_BACKUP_DIR, exist_ok=True)
 os.chmod(SQLITE_BACKUP_DIR, stat.S_IRWXU)  # 700 permissions for backup dir
 BACKUP_RETENTION_DAYS = int(os.environ.get('BACKUP_RETENTION_DAYS', 30))
+# Online backups (api_app/utils/backup.py): pages copied per step and pause between steps
+SQLITE_BACKUP_PAGES = int(os.environ.get('SQLITE_BACKUP_PAGES', 256))
+SQLITE_BACKUP_PAUSE_MS = float(os.environ.get('SQLITE_BACKUP_PAUSE_MS', 10))
+SQLITE_BACKUP_COMPRESSION = os.environ.get('SQLITE_BACKUP_COMPRESSION', 'gzip')  # gzip, zstd (zstandard package) or none
+# WAL shipping (api_app/utils/replication.py, manage.py replicate_database) to the "replica" storage
+SQLITE_REPLICA_DIR = os.path.join(SQLITE_BACKUP_DIR, 'replica')
+SQLITE_REPLICA_INTERVAL = float(os.environ.get('SQLITE_REPLICA_INTERVAL', 1))  # Seconds, the restore precision
+SQLITE_REPLICA_CHECKPOINT_PAGES = int(os.environ.get('SQLITE_REPLICA_CHECKPOINT_PAGES', 1000))
+SQLITE_REPLICA_SNAPSHOT_HOURS = float(os.environ.get('SQLITE_REPLICA_SNAPSHOT_HOURS', 24))
+# Deduplicated backups of the database and MEDIA_ROOT (api_app/utils/snapshots.py, manage.py backup_snapshot)
+BACKUP_STORE_DIR = os.path.join(SQLITE_BACKUP_DIR, 'store')
+BACKUP_CHUNK_SIZE = int(os.environ.get('BACKUP_CHUNK_SIZE', 1024 * 1024))  # Smaller: finer deduplication, more files
+BACKUP_WORKERS = int(os.environ.get('BACKUP_WORKERS', 4))  # Hashing threads
+
+# Cache shared by all Passenger workers (holds the content version and payload snapshots)
+CACHE_DIR = os.path.join(BASE_DIR, os.environ.get('CACHE_DIR', 'cache'))
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", CACHE_DIR),
+    }
+}
+
+# Pre-rendered sitemaps (api_app/utils/sitemap_files.py), regenerated when listed content changes
+SITEMAP_DIR = os.path.join(BASE_DIR, os.environ.get('SITEMAP_DIR', 'sitemaps'))
+SITEMAP_MAX_URLS = 50000  # Per file, the sitemap protocol's limit
+
+# Outgoing HTTP (api_app/utils/http_client.py, used by the LinkedIn import)
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))  # Seconds
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 20))  # Seconds between two bytes, not for the whole body
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+HTTP_MAX_WORKERS = int(os.environ.get('HTTP_MAX_WORKERS', 4))  # Concurrent downloads, and pooled connections per host
+HTTP_MAX_DOWNLOAD_MB = int(os.environ.get('HTTP_MAX_DOWNLOAD_MB', 25))
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, 'http')  # Responses revalidated with their ETag / Last-Modified
+HTTP_CACHE_MAX_MB = int(os.environ.get('HTTP_CACHE_MAX_MB', 200))  # Pruned after the imports, least recently used first
+HTTP_CACHE_MAX_AGE_DAYS = int(os.environ.get('HTTP_CACHE_MAX_AGE_DAYS', 30))
+# Bulk LinkedIn imports (api_app/utils/linkedin_import.py, manage.py run_linkedin_imports)
+LINKEDIN_IMPORT_WORKERS = int(os.environ.get('LINKEDIN_IMPORT_WORKERS', HTTP_MAX_WORKERS))  # Posts fetched concurrently
+LINKEDIN_IMPORT_BATCH_SIZE = int(os.environ.get('LINKEDIN_IMPORT_BATCH_SIZE', 10))  # Articles per transaction
+# BeautifulSoup parser of the post pages: 'html.parser', or 'lxml' if installed (see benchmark_linkedin_extraction)
+LINKEDIN_HTML_PARSER = os.environ.get('LINKEDIN_HTML_PARSER', 'html.parser')
+
+
+# Per-view SQL query budgets: raise instead of logging a warning (always on in tests)
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", str(TESTING)) == "True"
 
 
 # Password validation
@@ -171,8 +243,32 @@ STATICFILES_DIRS = [
 
 MEDIA_URL = "media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Where the WAL is shipped. For an S3 compatible store (MinIO...) install django-storages and set
+    # SQLITE_REPLICA_STORAGE=storages.backends.s3.S3Storage with its AWS_* settings in the environment
+    "replica": {
+        "BACKEND": os.environ.get("SQLITE_REPLICA_STORAGE", "django.core.files.storage.FileSystemStorage"),
+        "OPTIONS": {"location": SQLITE_REPLICA_DIR} if "SQLITE_REPLICA_STORAGE" not in os.environ else {
+            "bucket_name": os.environ.get("SQLITE_REPLICA_BUCKET", "immoshift-replica"),
+            "endpoint_url": os.environ.get("SQLITE_REPLICA_ENDPOINT_URL"),
+            "location": os.environ.get("SQLITE_REPLICA_PREFIX", ""),
+        },
+    },
+}
 MEDIA_FULL_URL = SITE_URL.rstrip("/") + "/" + MEDIA_URL.rstrip("/") + "/"
 
+# Hand media files to the front server instead of streaming them from Django:
+# "x-sendfile" (Apache mod_xsendfile) or "x-accel-redirect" (nginx internal location)
+MEDIA_SENDFILE = os.environ.get("MEDIA_SENDFILE", "")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get("MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+
+# Responsive image derivatives generated on upload (see api_app/utils/images.py)
+IMAGE_DERIVATIVE_WIDTHS = [int(w) for w in os.environ.get("IMAGE_DERIVATIVE_WIDTHS", "320,640,960,1280,1920").split(",")]
+IMAGE_DERIVATIVE_FORMATS = os.environ.get("IMAGE_DERIVATIVE_FORMATS", "webp,jpeg").split(",")
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -184,6 +280,9 @@ REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
 }
 
+# Serve the read-only endpoints through the compiled serializers of fast_serializers.py
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "False") == "True"
+
 CORS_URLS_REGEX = r"^/.*$"
 
 # Default primary key field type
@@ -203,5 +302,13 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', 'password')
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", 'ImmoShift<no-reply@immoshift.fr>')
 ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", 'jeremy.guerin34@yahoo.com')
 
+# Emails are queued in the EmailOutbox table and sent by `manage.py send_outbox`
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 8))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.environ.get("EMAIL_OUTBOX_RETRY_DELAY", 60))  # Seconds, doubled after each failure
+EMAIL_OUTBOX_KEEP_SENT_DAYS = int(os.environ.get("EMAIL_OUTBOX_KEEP_SENT_DAYS", 30))
+# "immediate": one admin email per ebook download, "digest": one summary every ADMIN_DIGEST_INTERVAL_MINUTES
+ADMIN_NOTIFICATION_MODE = os.environ.get("ADMIN_NOTIFICATION_MODE", "immediate")
+ADMIN_DIGEST_INTERVAL_MINUTES = int(os.environ.get("ADMIN_DIGEST_INTERVAL_MINUTES", 15))
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = os.environ.get("CORS_ALLOW_ALL_ORIGINS", "False") == "True"
\ No newline at end of file
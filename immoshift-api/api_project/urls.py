@@ -19,7 +19,10 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+from api_app.views import serve_media
+from api_app.utils.transactions import atomic_writes_urls
+import re
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -28,5 +31,10 @@ urlpatterns = [
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media files with byte-range support (video seeking, resumable ebook downloads)
+urlpatterns += [
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$', serve_media, name='media'),
+]
 
+# Only unsafe methods run in the ATOMIC_REQUESTS transaction, reads stay in autocommit
+atomic_writes_urls(urlpatterns)